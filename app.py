@@ -2,6 +2,14 @@ import os
 from flask import Flask, render_template, redirect, url_for
 from config import Config
 from models import db, login_manager
+from models.sale import Sale, SaleDailyRollup, SaleUserDailyCounter
+from utils.cache import barcode_cache, dashboard_cache, report_cache, filter_options_cache
+from utils.catalog import catalog_snapshot
+from utils.alternatives import alternatives_graph
+from utils.group_commit import group_committer
+from utils.insights import insights_snapshot
+from utils.parallel import analytics_runner
+from utils.export_jobs import export_jobs
 
 def create_app(config_class=Config):
     """Application factory pattern"""
@@ -15,6 +23,24 @@ def create_app(config_class=Config):
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
 
+    # Configure in-process caches
+    barcode_cache.configure(
+        maxsize=app.config.get('BARCODE_CACHE_SIZE'),
+        ttl=app.config.get('BARCODE_CACHE_TTL')
+    )
+    catalog_snapshot.configure(max_age=app.config.get('CATALOG_SNAPSHOT_MAX_AGE'))
+    alternatives_graph.configure(max_age=app.config.get('CATALOG_SNAPSHOT_MAX_AGE'))
+    dashboard_cache.configure(ttl=app.config.get('DASHBOARD_CACHE_TTL'))
+    report_cache.configure(
+        maxsize=app.config.get('REPORT_CACHE_SIZE'),
+        ttl=app.config.get('REPORT_CACHE_TTL')
+    )
+    filter_options_cache.configure(ttl=app.config.get('REPORT_OPTIONS_CACHE_TTL'))
+    group_committer.init_app(app)
+    analytics_runner.init_app(app)
+    export_jobs.init_app(app)
+    insights_snapshot.init_app(app)
+
     # Register blueprints
     from routes.auth import auth_bp
     from routes.admin import admin_bp
@@ -26,9 +52,14 @@ def create_app(config_class=Config):
     app.register_blueprint(medicine_bp, url_prefix='/medicines')
     app.register_blueprint(sales_bp)
 
-    # Create database tables
+    # Create database tables, filling the rollups for sales recorded before they existed
     with app.app_context():
         db.create_all()
+        # create_all() leaves existing tables alone, so add sale indexes introduced since
+        for index in Sale.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        if SaleDailyRollup.backfill() + SaleUserDailyCounter.backfill():
+            db.session.commit()
 
     # Home route
     @app.route('/')
@@ -46,6 +77,21 @@ def create_app(config_class=Config):
         db.session.rollback()
         return render_template('errors/500.html'), 500
 
+    # CLI commands
+    @app.cli.command('rebuild-sales-rollup')
+    def rebuild_sales_rollup():
+        """Recompute the daily sales rollup and per-user counters from the sale table"""
+        rows = SaleDailyRollup.rebuild()
+        counters = SaleUserDailyCounter.rebuild()
+        db.session.commit()
+        print(f"✓ Rebuilt {rows} daily rollup rows and {counters} per-user counters")
+
+    @app.cli.command('cleanup-exports')
+    def cleanup_exports():
+        """Delete background export files older than EXPORT_RETENTION"""
+        removed = export_jobs.cleanup()
+        print(f"✓ Removed {removed} expired exports")
+
     return app
 
 
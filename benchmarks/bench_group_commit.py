@@ -0,0 +1,121 @@
+"""
+Benchmark sale throughput with and without group commit on a SQLite file
+
+Usage:
+    python benchmarks/bench_group_commit.py [--threads 16] [--sales 20] [--window-ms 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from config import Config
+from models import db
+from models.user import User
+from models.medicine import Medicine
+from models.sale import Sale
+from utils.group_commit import group_committer
+
+BARCODE = '8901234999999'
+
+
+def build_app(database_path, group_commit, window_ms):
+    """Create an application backed by a fresh SQLite file"""
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database_path}'
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 60}}
+        WTF_CSRF_ENABLED = False
+        SALE_GROUP_COMMIT = group_commit
+        SALE_GROUP_COMMIT_WINDOW_MS = window_ms
+        INSIGHTS_SNAPSHOT_PATH = None
+        INSIGHTS_REFRESH_AFTER_SALES = 0
+        INSIGHTS_SCHEDULER = False
+
+    app = create_app(BenchmarkConfig)
+
+    with app.app_context():
+        db.session.add(User(username='bench', email='bench@warehouse.com', password='bench123', role='Staff'))
+        db.session.add(Medicine(
+            name='Benchmark Medicine',
+            manufacturer='Benchmark Labs',
+            category='Fever',
+            quantity=10 ** 9,
+            price=Decimal('10.00'),
+            expiry_date=date.today() + timedelta(days=365),
+            stock=10 ** 9,
+            reorder_level=10,
+            barcode=BARCODE
+        ))
+        db.session.commit()
+
+    return app
+
+
+def run(app, threads, sales_per_thread):
+    """Sell from several tills at once and return (sales per second, failed requests)"""
+    with app.app_context():
+        user_id = User.query.filter_by(username='bench').first().user_id
+
+    failures = []
+
+    def till():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        for _ in range(sales_per_thread):
+            response = client.post('/sell/barcode', json={'barcode': BARCODE, 'quantity': 1})
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+    workers = [threading.Thread(target=till) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        recorded = Sale.query.count()
+
+    return recorded / elapsed, len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--sales', type=int, default=20, help='Sales per thread')
+    parser.add_argument('--window-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"Selling {args.threads} x {args.sales} units on a SQLite file...\n")
+
+    results = {}
+    for label, group_commit in (('per-request commit', False), ('group commit', True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = build_app(os.path.join(tmp, 'bench.db'), group_commit, args.window_ms)
+            try:
+                rate, failures = run(app, args.threads, args.sales)
+            finally:
+                group_committer.stop()
+                with app.app_context():
+                    db.engine.dispose()
+
+        results[label] = rate
+        extra = f" ({group_committer.operations / max(group_committer.batches, 1):.1f} sales per commit)" if group_commit else ''
+        print(f"  {label:<20} {rate:8.1f} sales/sec, {failures} failed{extra}")
+
+    speedup = results['group commit'] / results['per-request commit']
+    print(f"\n✓ Group commit speedup: {speedup:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
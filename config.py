@@ -25,6 +25,50 @@ class Config:
     MEDICINES_PER_PAGE = 20
     SALES_PER_PAGE = 50
 
+    # Cart checkout settings
+    CART_MAX_LINES = 100
+
+    # Idempotency keys for till retries on /sell/barcode
+    IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+    IDEMPOTENCY_PURGE_INTERVAL = 300  # Seconds between purges of expired keys
+
+    # Group commit: merge sales arriving within a few milliseconds into one transaction
+    SALE_GROUP_COMMIT = os.environ.get('SALE_GROUP_COMMIT', '').lower() in ('1', 'true', 'yes')
+    SALE_GROUP_COMMIT_WINDOW_MS = 5
+    SALE_GROUP_COMMIT_MAX_BATCH = 64
+    SALE_GROUP_COMMIT_TIMEOUT = 10  # Seconds a request waits for its batch
+
+    # Barcode lookup cache settings
+    BARCODE_CACHE_SIZE = 2048
+    BARCODE_CACHE_TTL = 60  # Seconds
+
+    # Sellable catalog snapshot and alternatives graph settings
+    CATALOG_SNAPSHOT_MAX_AGE = 30  # Seconds
+
+    # Admin dashboard block cache settings
+    DASHBOARD_CACHE_TTL = 60  # Seconds
+
+    # Predictive insights snapshot settings (relative paths are in the instance folder)
+    INSIGHTS_SNAPSHOT_PATH = os.environ.get('INSIGHTS_SNAPSHOT_PATH') or 'predictive_insights.json'
+    INSIGHTS_REFRESH_INTERVAL = 900  # Seconds between background recomputes
+    INSIGHTS_REFRESH_AFTER_SALES = 50  # Recompute early after this many new sales (0 disables)
+    INSIGHTS_SCHEDULER = True  # Refresh periodically once the app serves its first request
+
+    # Parallel analytics settings
+    ANALYTICS_WORKERS = 4  # Threads running independent analytics computations
+    ANALYTICS_TASK_TIMEOUT = 60  # Seconds each analytics task may run
+
+    # Sales report result cache settings
+    REPORT_CACHE_SIZE = 64  # Filter sets kept
+    REPORT_CACHE_TTL = 300  # Seconds
+    REPORT_OPTIONS_CACHE_TTL = 600  # Seconds filter dropdown options are cached
+
+    # Sales report export settings
+    EXPORT_BATCH_SIZE = 1000  # Rows fetched and written per chunk
+    EXPORT_DIR = os.environ.get('EXPORT_DIR') or 'exports'  # Background export files (relative to the instance folder)
+    EXPORT_WORKERS = 2  # Threads running background exports
+    EXPORT_RETENTION = 24 * 3600  # Seconds finished export files are kept
+
     # Low stock threshold
     LOW_STOCK_THRESHOLD = 10
 
@@ -38,3 +82,7 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # In-memory database for testing
     WTF_CSRF_ENABLED = False  # Disable CSRF for testing
     SECRET_KEY = 'test-secret-key'
+    INSIGHTS_SNAPSHOT_PATH = None  # Keep the snapshot in memory only
+    INSIGHTS_REFRESH_AFTER_SALES = 0
+    INSIGHTS_SCHEDULER = False
+    ANALYTICS_WORKERS = 1  # The in-memory database is a single shared connection
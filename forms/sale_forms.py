@@ -1,33 +1,28 @@
 from flask_wtf import FlaskForm
-from wtforms import IntegerField, SelectField, StringField, SubmitField
+from wtforms import IntegerField, StringField, SubmitField
+from wtforms.widgets import HiddenInput
 from wtforms.validators import DataRequired, NumberRange, ValidationError, Length
 from models.medicine import Medicine
-from datetime import date
+from utils.catalog import catalog_snapshot
 
 class SaleForm(FlaskForm):
     """Form for recording medicine sales"""
-    medicine_id = SelectField('Medicine', coerce=int, validators=[DataRequired()])
+    # Filled in by the typeahead search on the sell page
+    medicine_id = IntegerField('Medicine', widget=HiddenInput(), validators=[
+        DataRequired(message='Please select a medicine.')
+    ])
     quantity = IntegerField('Quantity', validators=[
         DataRequired(),
         NumberRange(min=1, message='Quantity must be at least 1')
     ])
     submit = SubmitField('Record Sale')
 
-    def __init__(self, *args, **kwargs):
-        super(SaleForm, self).__init__(*args, **kwargs)
-        # Populate medicine choices with available medicines only
-        self.medicine_id.choices = [(0, 'Select a medicine')] + [
-            (m.medicine_id, f'{m.name} - {m.manufacturer} (Stock: {m.stock})')
-            for m in Medicine.query.filter(Medicine.stock > 0, Medicine.expiry_date > date.today())
-            .order_by(Medicine.name).all()
-        ]
-
     def validate_medicine_id(self, field):
         """Validate that a medicine is selected"""
         if field.data == 0:
             raise ValidationError('Please select a medicine.')
 
-        medicine = Medicine.query.get(field.data)
+        medicine = catalog_snapshot.get(field.data)
         if not medicine:
             raise ValidationError('Selected medicine not found.')
 
@@ -38,7 +33,7 @@ class SaleForm(FlaskForm):
     def validate_quantity(self, field):
         """Validate that sufficient stock is available"""
         if hasattr(self, 'medicine_id') and self.medicine_id.data:
-            medicine = Medicine.query.get(self.medicine_id.data)
+            medicine = catalog_snapshot.get(self.medicine_id.data)
             if medicine and field.data > medicine.stock:
                 raise ValidationError(
                     f'Insufficient stock. Only {medicine.stock} units available.'
@@ -8,6 +8,6 @@ login_manager = LoginManager()
 # Import models after db is initialized
 from models.user import User
 from models.medicine import Medicine, AlternativeMedicine
-from models.sale import Sale
+from models.sale import Sale, SaleIdempotencyKey, SaleDailyRollup, SaleUserDailyCounter
 
-__all__ = ['db', 'login_manager', 'User', 'Medicine', 'AlternativeMedicine', 'Sale']
+__all__ = ['db', 'login_manager', 'User', 'Medicine', 'AlternativeMedicine', 'Sale', 'SaleIdempotencyKey', 'SaleDailyRollup', 'SaleUserDailyCounter']
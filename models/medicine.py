@@ -1,4 +1,5 @@
 from datetime import datetime, date
+from sqlalchemy import update
 from models import db
 
 class Medicine(db.Model):
@@ -64,6 +65,34 @@ class Medicine(db.Model):
         from datetime import timedelta
         return self.expiry_date <= date.today() + timedelta(days=days)
 
+    def decrement_stock(self, quantity):
+        """Atomically take units out of this medicine's stock (see decrement_stock_by_id)"""
+        decremented = Medicine.decrement_stock_by_id(self.medicine_id, quantity)
+
+        # Reload stock from the database on next access
+        db.session.expire(self, ['stock', 'updated_at'])
+
+        return decremented
+
+    @staticmethod
+    def decrement_stock_by_id(medicine_id, quantity):
+        """Atomically take units out of stock if enough sellable stock remains
+
+        Runs a single conditional UPDATE so the stock check and the write cannot
+        be interleaved by another till. Returns True if the stock was decremented.
+        """
+        result = db.session.execute(
+            update(Medicine)
+            .where(
+                Medicine.medicine_id == medicine_id,
+                Medicine.stock >= quantity,
+                Medicine.expiry_date >= date.today()
+            )
+            .values(stock=Medicine.stock - quantity, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
     def get_alternatives(self):
         """Get list of alternative medicines"""
         return AlternativeMedicine.query.filter_by(
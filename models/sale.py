@@ -1,4 +1,7 @@
 from datetime import datetime
+from sqlalchemy import insert, update, select, func, case, extract
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from models import db
 
 class Sale(db.Model):
@@ -17,6 +20,9 @@ class Sale(db.Model):
     __table_args__ = (
         db.CheckConstraint('quantity_sold > 0', name='check_quantity_sold_positive'),
         db.CheckConstraint('total_price >= 0', name='check_total_price_non_negative'),
+        # Keyset pagination order (newest first), overall and per seller
+        db.Index('ix_sale_sale_date_sale_id', 'sale_date', 'sale_id'),
+        db.Index('ix_sale_user_id_sale_date_sale_id', 'user_id', 'sale_date', 'sale_id'),
     )
 
     def __init__(self, medicine_id, user_id, quantity_sold, total_price):
@@ -49,5 +55,259 @@ class Sale(db.Model):
         else:  # 9, 10, 11
             return 'Monsoon'
 
+    @staticmethod
+    def season_case(date_column):
+        """SQL expression mapping a date column to its season, matching get_season_for_month"""
+        month = extract('month', date_column)
+        return case(
+            (month.in_([12, 1, 2]), 'Winter'),
+            (month.in_([3, 4, 5]), 'Spring'),
+            (month.in_([6, 7, 8]), 'Summer'),
+            else_='Monsoon'
+        )
+
     def __repr__(self):
         return f'<Sale {self.sale_id}: Medicine {self.medicine_id} x{self.quantity_sold}>'
+
+
+class SaleIdempotencyKey(db.Model):
+    """Maps a client-supplied idempotency key to the sale it produced"""
+
+    __tablename__ = 'sale_idempotency_key'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sale.sale_id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    MAX_KEY_LENGTH = 64
+
+    def is_expired(self, ttl):
+        """Check if this key is older than the given timedelta"""
+        return self.created_at < datetime.utcnow() - ttl
+
+    @staticmethod
+    def purge_expired(ttl):
+        """Delete keys older than the given timedelta (caller commits)"""
+        return SaleIdempotencyKey.query.filter(
+            SaleIdempotencyKey.created_at < datetime.utcnow() - ttl
+        ).delete(synchronize_session=False)
+
+    def __repr__(self):
+        return f'<SaleIdempotencyKey {self.key} -> Sale {self.sale_id}>'
+
+
+def upsert_totals(model, key, totals):
+    """
+    Insert a totals row, or add totals to the row that already has its key, in one statement
+
+    The database does the insert-or-increment atomically, so two sales
+    creating the same row at once cannot collide on the primary key. Other
+    databases fall back to increment_totals().
+
+    Args:
+        model: Totals model whose primary key is the columns of key
+        key: Dictionary of primary key column values
+        totals: Dictionary of column name to the amount to add
+    """
+    dialect = db.engine.dialect.name
+    values = dict(key, **totals)
+    if dialect == 'mysql':
+        statement = mysql.insert(model).values(**values)
+        statement = statement.on_duplicate_key_update({
+            name: getattr(model, name) + statement.inserted[name] for name in totals
+        })
+    elif dialect in ('sqlite', 'postgresql'):
+        statement = (sqlite if dialect == 'sqlite' else postgresql).insert(model).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={name: getattr(model, name) + statement.excluded[name] for name in totals}
+        )
+    else:
+        increment_totals(model, key, totals)
+        return
+    db.session.execute(statement)
+
+
+def increment_totals(model, key, totals):
+    """
+    Portable upsert: add totals to the row with key, inserting it if there is none
+
+    The insert runs in a savepoint, so if another transaction inserts the
+    same row between the update and the insert, only the insert is rolled
+    back and the totals are added to that row instead.
+    """
+    increment = (
+        update(model)
+        .where(*(getattr(model, name) == value for name, value in key.items()))
+        .values({name: getattr(model, name) + amount for name, amount in totals.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(increment).rowcount:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**dict(key, **totals)))
+    except IntegrityError:
+        if not db.session.execute(increment).rowcount:
+            raise
+
+
+class SaleDailyRollup(db.Model):
+    """Per-day sales totals for each medicine and seller, maintained alongside the sale table"""
+
+    __tablename__ = 'sale_daily_rollup'
+
+    day = db.Column(db.Date, primary_key=True)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.medicine_id'), primary_key=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True, index=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def add_sale(sale):
+        """
+        Add a flushed sale to its day's rollup row (caller commits)
+
+        Runs in the sale's transaction as a single upsert, which creates the
+        row for the first sale of the day and increments it after that.
+        """
+        upsert_totals(
+            SaleDailyRollup,
+            {'day': sale.sale_date.date(), 'medicine_id': sale.medicine_id, 'user_id': sale.user_id},
+            {'quantity': sale.quantity_sold, 'revenue': sale.total_price, 'transaction_count': 1}
+        )
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute every rollup row from the sale table (caller commits)
+
+        Returns:
+            Number of rollup rows written
+        """
+        db.session.query(SaleDailyRollup).delete(synchronize_session=False)
+
+        day = func.date(Sale.sale_date)
+        totals = select(
+            day,
+            Sale.medicine_id,
+            Sale.user_id,
+            func.sum(Sale.quantity_sold),
+            func.sum(Sale.total_price),
+            func.count(Sale.sale_id)
+        ).group_by(day, Sale.medicine_id, Sale.user_id)
+
+        db.session.execute(
+            insert(SaleDailyRollup).from_select(
+                ['day', 'medicine_id', 'user_id', 'quantity', 'revenue', 'transaction_count'],
+                totals
+            )
+        )
+        return db.session.query(SaleDailyRollup).count()
+
+    @staticmethod
+    def backfill():
+        """
+        Rebuild the rollup if it is empty but the sale table is not (caller commits)
+
+        Fills the table once for a database that recorded sales before the
+        rollup existed; create_app calls this at startup.
+
+        Returns:
+            Number of rollup rows written, or 0 if there was nothing to do
+        """
+        if db.session.query(SaleDailyRollup.day).first() is not None:
+            return 0
+        if db.session.query(Sale.sale_id).first() is None:
+            return 0
+        return SaleDailyRollup.rebuild()
+
+    def __repr__(self):
+        return f'<SaleDailyRollup {self.day}: Medicine {self.medicine_id} by User {self.user_id} x{self.quantity}>'
+
+
+class SaleUserDailyCounter(db.Model):
+    """Per-day sale count and revenue for each seller, maintained alongside the sale table"""
+
+    __tablename__ = 'sale_user_daily_counter'
+
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True, index=True)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    @staticmethod
+    def add_sale(sale):
+        """Add a flushed sale to its seller's counter for the day with one upsert (caller commits)"""
+        upsert_totals(
+            SaleUserDailyCounter,
+            {'day': sale.sale_date.date(), 'user_id': sale.user_id},
+            {'transaction_count': 1, 'revenue': sale.total_price}
+        )
+
+    @staticmethod
+    def totals_for(user_id, day):
+        """
+        Get a seller's sale count and revenue for one day by primary key
+
+        Returns:
+            (transaction_count, revenue), zeros if the seller has no sales that day
+        """
+        counter = db.session.get(SaleUserDailyCounter, (day, user_id))
+        if counter is None:
+            return 0, 0
+        return counter.transaction_count, counter.revenue
+
+    @staticmethod
+    def total_transactions(user_id=None):
+        """Count all sales, or one seller's, from the counters instead of the sale table"""
+        query = db.session.query(func.sum(SaleUserDailyCounter.transaction_count))
+        if user_id is not None:
+            query = query.filter(SaleUserDailyCounter.user_id == user_id)
+        return query.scalar() or 0
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute every counter from the sale table (caller commits)
+
+        Returns:
+            Number of counter rows written
+        """
+        db.session.query(SaleUserDailyCounter).delete(synchronize_session=False)
+
+        day = func.date(Sale.sale_date)
+        totals = select(
+            day,
+            Sale.user_id,
+            func.count(Sale.sale_id),
+            func.sum(Sale.total_price)
+        ).group_by(day, Sale.user_id)
+
+        db.session.execute(
+            insert(SaleUserDailyCounter).from_select(
+                ['day', 'user_id', 'transaction_count', 'revenue'],
+                totals
+            )
+        )
+        return db.session.query(SaleUserDailyCounter).count()
+
+    @staticmethod
+    def backfill():
+        """
+        Rebuild the counters if they are empty but the sale table is not (caller commits)
+
+        Returns:
+            Number of counter rows written, or 0 if there was nothing to do
+        """
+        if db.session.query(SaleUserDailyCounter.day).first() is not None:
+            return 0
+        if db.session.query(Sale.sale_id).first() is None:
+            return 0
+        return SaleUserDailyCounter.rebuild()
+
+    def __repr__(self):
+        return f'<SaleUserDailyCounter {self.day}: User {self.user_id} x{self.transaction_count}>'
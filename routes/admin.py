@@ -1,104 +1,163 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, make_response
+from flask import (Blueprint, render_template, request, flash, redirect, url_for, jsonify,
+                   Response, stream_with_context, current_app, send_file, abort)
 from flask_login import login_required, current_user
 from models import db
 from models.medicine import Medicine, AlternativeMedicine
-from models.sale import Sale
+from models.sale import Sale, SaleDailyRollup, SaleUserDailyCounter
 from models.user import User
 from routes.decorators import admin_required, staff_required
 from sqlalchemy import func, desc, or_, and_
 from datetime import datetime, timedelta
+import os
+import tempfile
 from collections import defaultdict
-import csv
-import io
 from utils import analytics
+from utils.alternatives import alternatives_graph
+from utils.cache import dashboard_cache, report_cache
+from utils.export_jobs import export_jobs
+from utils.catalog import CatalogItem
+from utils.insights import insights_snapshot
+from utils.forecasting import forecast_medicine
+from utils.pagination import keyset_paginate
+from utils.reports import (ReportFilters, report_query, report_summary, FILTER_OPTION_SOURCES, search_filter_options,
+                           filter_option_label)
+from utils.sales_export import export_query, resolve_format, stream_csv, stream_csv_gz, write_columnar
+from utils.time_buckets import month_buckets, bucket_label, range_filter
 
 admin_bp = Blueprint('admin', __name__)
 
-@admin_bp.route('/dashboard')
-@admin_required
-def dashboard():
-    """Admin dashboard with analytics"""
+def dashboard_sales_totals():
+    """Total revenue and transaction count from the daily rollup"""
+    return {
+        'total_sales': db.session.query(func.sum(SaleDailyRollup.revenue)).scalar() or 0,
+        'total_transactions': db.session.query(func.sum(SaleDailyRollup.transaction_count)).scalar() or 0
+    }
 
-    # Key metrics
-    total_sales = db.session.query(func.sum(Sale.total_price)).scalar() or 0
-    total_medicines = Medicine.query.count()
-    low_stock_count = Medicine.query.filter(Medicine.stock <= Medicine.reorder_level).count()
-    total_transactions = Sale.query.count()
 
-    # Top selling medicines (pie chart data)
+def dashboard_stock_counts():
+    """Catalog size and low stock, out of stock and expiring counts"""
+    return {
+        'total_medicines': Medicine.query.count(),
+        'low_stock_count': Medicine.query.filter(Medicine.stock <= Medicine.reorder_level).count(),
+        'out_of_stock_count': Medicine.query.filter(Medicine.stock == 0).count(),
+        'expiring_soon_count': Medicine.query.filter(
+            Medicine.expiry_date <= (datetime.now().date() + timedelta(days=30))
+        ).count()
+    }
+
+
+def dashboard_top_selling():
+    """Top selling medicines (pie chart data)"""
     top_selling = db.session.query(
         Medicine.name,
-        func.sum(Sale.quantity_sold).label('total_quantity')
-    ).join(Sale).group_by(Medicine.medicine_id).order_by(
+        func.sum(SaleDailyRollup.quantity).label('total_quantity')
+    ).join(SaleDailyRollup).group_by(Medicine.medicine_id).order_by(
         desc('total_quantity')
     ).limit(5).all()
+    return {'top_selling': [(name, int(quantity)) for name, quantity in top_selling]}
+
+
+def dashboard_seasonal_sales():
+    """Seasonal sales, grouped in the database"""
+    return {'seasonal_sales': {
+        season: totals['total_sales']
+        for season, totals in analytics.get_seasonal_totals().items()
+    }}
 
-    # Seasonal sales
-    sales_data = Sale.query.all()
-    seasonal_sales = defaultdict(float)
-    for sale in sales_data:
-        season = sale.get_season()
-        seasonal_sales[season] += float(sale.total_price)
 
-    # Category-wise sales
+def dashboard_category_sales():
+    """Category-wise sales"""
     category_sales = db.session.query(
         Medicine.category,
-        func.sum(Sale.total_price).label('total_sales')
-    ).join(Sale).group_by(Medicine.category).order_by(
+        func.sum(SaleDailyRollup.revenue).label('total_sales')
+    ).join(SaleDailyRollup).group_by(Medicine.category).order_by(
         desc('total_sales')
     ).all()
+    return {'category_sales': [(category, float(total)) for category, total in category_sales]}
 
-    # Monthly sales trend (last 6 months)
-    six_months_ago = datetime.now() - timedelta(days=180)
+
+def dashboard_monthly_sales():
+    """Monthly sales trend (last 6 calendar months)"""
+    buckets = month_buckets(6)
     monthly_sales = db.session.query(
-        func.strftime('%Y-%m', Sale.sale_date).label('month'),
-        func.sum(Sale.total_price).label('total')
-    ).filter(Sale.sale_date >= six_months_ago).group_by('month').order_by('month').all()
+        bucket_label(SaleDailyRollup.day, buckets).label('month'),
+        func.sum(SaleDailyRollup.revenue).label('total')
+    ).filter(range_filter(SaleDailyRollup.day, buckets)).group_by('month').order_by('month').all()
+    return {'monthly_sales': [(month, float(total)) for month, total in monthly_sales]}
 
-    # Recent transactions
-    recent_sales = Sale.query.order_by(Sale.sale_date.desc()).limit(10).all()
 
-    # Stock statistics
-    out_of_stock_count = Medicine.query.filter(Medicine.stock == 0).count()
-    expiring_soon_count = Medicine.query.filter(
-        Medicine.expiry_date <= (datetime.now().date() + timedelta(days=30))
-    ).count()
+def dashboard_recent_sales():
+    """Ten most recent transactions as plain rows"""
+    recent_sales = db.session.query(
+        Sale.sale_id,
+        Medicine.name.label('medicine_name'),
+        Sale.quantity_sold,
+        Sale.total_price,
+        User.username.label('seller_name'),
+        Sale.sale_date
+    ).join(Medicine).join(User).order_by(Sale.sale_date.desc()).limit(10).all()
+    return {'recent_sales': recent_sales}
 
-    # Low stock medicines with alternatives
-    low_stock_medicines_query = Medicine.query.filter(
-        Medicine.stock <= Medicine.reorder_level
-    ).order_by(Medicine.stock).all()
 
-    # Add alternatives to each low stock medicine
+def dashboard_low_stock_medicines():
+    """Low stock medicines with up to three available alternatives from the in-memory graph"""
     low_stock_medicines = []
-    for medicine in low_stock_medicines_query:
-        alternatives = medicine.get_alternatives()
+    for medicine in Medicine.query.filter(
+        Medicine.stock <= Medicine.reorder_level
+    ).order_by(Medicine.stock).all():
         available_alternatives = []
-        for alt in alternatives[:3]:  # Limit to top 3 alternatives
-            alt_med = Medicine.query.get(alt.alternative_medicine_id)
-            if alt_med and alt_med.stock > 0 and not alt_med.is_expired():
+        for edge in alternatives_graph.alternatives(medicine.medicine_id)[:3]:  # Limit to top 3 alternatives
+            if edge.medicine.stock > 0 and not edge.medicine.is_expired():
                 available_alternatives.append({
-                    'medicine': alt_med,
-                    'reason': alt.reason
+                    'medicine': edge.medicine,
+                    'reason': edge.reason
                 })
         low_stock_medicines.append({
-            'medicine': medicine,
+            'medicine': CatalogItem(
+                medicine_id=medicine.medicine_id,
+                name=medicine.name,
+                manufacturer=medicine.manufacturer,
+                category=medicine.category,
+                price=medicine.price,
+                stock=medicine.stock,
+                reorder_level=medicine.reorder_level,
+                expiry_date=medicine.expiry_date,
+                barcode=medicine.barcode
+            ),
             'alternatives': available_alternatives
         })
+    return {'low_stock_medicines': low_stock_medicines}
+
+
+# Dashboard blocks: name -> (function returning template variables, tags that invalidate it)
+DASHBOARD_BLOCKS = {
+    'sales_totals': (dashboard_sales_totals, ('sales',)),
+    'stock_counts': (dashboard_stock_counts, ('catalog',)),
+    'top_selling': (dashboard_top_selling, ('sales', 'catalog')),
+    'seasonal_sales': (dashboard_seasonal_sales, ('sales',)),
+    'category_sales': (dashboard_category_sales, ('sales', 'catalog')),
+    'monthly_sales': (dashboard_monthly_sales, ('sales',)),
+    'recent_sales': (dashboard_recent_sales, ('sales', 'catalog')),
+    'low_stock_medicines': (dashboard_low_stock_medicines, ('catalog', 'alternatives'))
+}
+
+
+@admin_bp.route('/dashboard')
+@admin_required
+def dashboard():
+    """Admin dashboard with analytics, served from the dashboard block cache"""
+
+    context = {}
+    computed_at = {}
+    for name, (compute, tags) in DASHBOARD_BLOCKS.items():
+        block = dashboard_cache.get(name, compute, tags)
+        context.update(block.value)
+        computed_at[name] = block.computed_at
 
     return render_template('admin/admin_dashboard.html',
-                           total_sales=total_sales,
-                           total_medicines=total_medicines,
-                           low_stock_count=low_stock_count,
-                           total_transactions=total_transactions,
-                           top_selling=top_selling,
-                           seasonal_sales=seasonal_sales,
-                           category_sales=category_sales,
-                           monthly_sales=monthly_sales,
-                           recent_sales=recent_sales,
-                           out_of_stock_count=out_of_stock_count,
-                           expiring_soon_count=expiring_soon_count,
-                           low_stock_medicines=low_stock_medicines)
+                           computed_at=computed_at,
+                           oldest_block_at=min(computed_at.values()),
+                           **context)
 
 @admin_bp.route('/staff/dashboard')
 @staff_required
@@ -114,22 +173,15 @@ def staff_dashboard():
     # Top selling medicines
     top_selling = db.session.query(
         Medicine.name,
-        func.sum(Sale.quantity_sold).label('total_quantity')
-    ).join(Sale).group_by(Medicine.medicine_id).order_by(
+        func.sum(SaleDailyRollup.quantity).label('total_quantity')
+    ).join(SaleDailyRollup).group_by(Medicine.medicine_id).order_by(
         desc('total_quantity')
     ).limit(10).all()
 
-    # Today's sales (staff's own sales)
-    today = datetime.now().date()
-    my_today_sales = Sale.query.filter(
-        Sale.user_id == current_user.user_id,
-        func.date(Sale.sale_date) == today
-    ).count()
-
-    my_today_revenue = db.session.query(func.sum(Sale.total_price)).filter(
-        Sale.user_id == current_user.user_id,
-        func.date(Sale.sale_date) == today
-    ).scalar() or 0
+    # Today's sales (staff's own sales), from the per-user daily counter
+    my_today_sales, my_today_revenue = SaleUserDailyCounter.totals_for(
+        current_user.user_id, datetime.now().date()
+    )
 
     # Total medicines available
     available_medicines = Medicine.query.filter(
@@ -149,37 +201,46 @@ def staff_dashboard():
 @admin_bp.route('/predictive-insights')
 @admin_required
 def predictive_insights():
-    """Predictive insights page with forecasting and predictions"""
+    """Predictive insights page, served from the latest background snapshot"""
 
-    # Get seasonal trends
-    seasonal_data = analytics.get_seasonal_trends()
+    insights, computed_at = insights_snapshot.get()
 
-    # Get category trends
-    category_trends = analytics.get_category_trends()
+    return render_template('admin/predictive_insights.html',
+                           computed_at=computed_at,
+                           age_seconds=insights_snapshot.age_seconds(),
+                           **insights)
 
-    # Get sales forecast
-    forecast_data = analytics.generate_forecast_data(months_ahead=3)
 
-    # Get stock predictions (medicines that will run out soon)
-    stock_predictions = analytics.get_stock_predictions()
+@admin_bp.route('/predictive-insights/recompute', methods=['POST'])
+@admin_required
+def recompute_predictive_insights():
+    """Recompute the predictive insights snapshot now"""
 
-    # Get reorder recommendations
-    reorder_recommendations = analytics.get_reorder_recommendations()
+    try:
+        insights_snapshot.compute()
+        flash('Predictive insights recomputed.', 'success')
+    except Exception as e:
+        flash('An error occurred while recomputing predictive insights.', 'danger')
 
-    # Get top medicines by revenue
-    top_medicines = analytics.get_top_medicines_by_revenue(limit=10)
+    return redirect(url_for('admin.predictive_insights'))
 
-    # Get monthly sales data for trend visualization
-    monthly_sales = analytics.get_monthly_sales_data(months=12)
 
-    return render_template('admin/predictive_insights.html',
-                           seasonal_data=seasonal_data,
-                           category_trends=category_trends,
-                           forecast_data=forecast_data,
-                           stock_predictions=stock_predictions,
-                           reorder_recommendations=reorder_recommendations,
-                           top_medicines=top_medicines,
-                           monthly_sales=monthly_sales)
+@admin_bp.route('/api/forecast/<int:medicine_id>')
+@admin_required
+def medicine_forecast(medicine_id):
+    """API endpoint for a medicine's monthly demand history and forecast"""
+
+    medicine = Medicine.query.get_or_404(medicine_id)
+    months_ahead = min(max(request.args.get('months', 3, type=int), 1), 12)
+
+    forecast = forecast_medicine(medicine_id, months_ahead=months_ahead) or {'history': [], 'forecast': []}
+
+    return jsonify({
+        'medicine_id': medicine.medicine_id,
+        'name': medicine.name,
+        'history': forecast['history'],
+        'forecast': forecast['forecast']
+    })
 
 
 @admin_bp.route('/reports')
@@ -187,15 +248,18 @@ def predictive_insights():
 def reports():
     """Sales reports with filtering and export options"""
 
-    # Get filter parameters
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    category = request.args.get('category', '')
-    medicine_id = request.args.get('medicine_id', '')
-    user_id = request.args.get('user_id', '')
+    # Normalize filter parameters; equal filter sets share cached results
+    filters, errors = ReportFilters.from_args(request.args)
+    for error in errors:
+        flash(error, 'warning')
 
-    # Base query
-    query = db.session.query(
+    summary = report_cache.get(filters, 'summary', lambda: report_summary(filters))
+
+    # Keyset pagination, newest first; the summary already has the total
+    after = request.args.get('after')
+    before = request.args.get('before')
+    query = report_query(
+        filters,
         Sale.sale_id,
         Sale.sale_date,
         Medicine.name.label('medicine_name'),
@@ -203,236 +267,137 @@ def reports():
         Sale.quantity_sold,
         Sale.total_price,
         User.username.label('seller_name')
-    ).join(Medicine).join(User)
-
-    # Apply filters
-    if start_date:
-        try:
-            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(Sale.sale_date >= start_dt)
-        except ValueError:
-            flash('Invalid start date format', 'warning')
-
-    if end_date:
-        try:
-            end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-            # Add one day to include the end date
-            end_dt = end_dt + timedelta(days=1)
-            query = query.filter(Sale.sale_date < end_dt)
-        except ValueError:
-            flash('Invalid end date format', 'warning')
-
-    if category:
-        query = query.filter(Medicine.category == category)
-
-    if medicine_id:
-        try:
-            query = query.filter(Sale.medicine_id == int(medicine_id))
-        except ValueError:
-            pass
-
-    if user_id:
-        try:
-            query = query.filter(Sale.user_id == int(user_id))
-        except ValueError:
-            pass
-
-    # Order by date descending
-    query = query.order_by(Sale.sale_date.desc())
-
-    # Pagination
-    page = request.args.get('page', 1, type=int)
-    per_page = 50
-    sales_pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-
-    # Calculate summary statistics
-    summary_query = db.session.query(
-        func.count(Sale.sale_id).label('total_transactions'),
-        func.sum(Sale.quantity_sold).label('total_quantity'),
-        func.sum(Sale.total_price).label('total_revenue'),
-        func.avg(Sale.total_price).label('avg_transaction_value')
-    ).join(Medicine).join(User)
-
-    # Apply same filters to summary
-    if start_date:
-        try:
-            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-            summary_query = summary_query.filter(Sale.sale_date >= start_dt)
-        except ValueError:
-            pass
-
-    if end_date:
-        try:
-            end_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-            summary_query = summary_query.filter(Sale.sale_date < end_dt)
-        except ValueError:
-            pass
-
-    if category:
-        summary_query = summary_query.filter(Medicine.category == category)
-
-    if medicine_id:
-        try:
-            summary_query = summary_query.filter(Sale.medicine_id == int(medicine_id))
-        except ValueError:
-            pass
-
-    if user_id:
-        try:
-            summary_query = summary_query.filter(Sale.user_id == int(user_id))
-        except ValueError:
-            pass
-
-    summary_result = summary_query.first()
-    summary = {
-        'total_transactions': summary_result.total_transactions or 0,
-        'total_quantity': summary_result.total_quantity or 0,
-        'total_revenue': float(summary_result.total_revenue or 0),
-        'avg_transaction_value': float(summary_result.avg_transaction_value or 0)
+    )
+    try:
+        sales_pagination = report_cache.get(filters, ('page', after, before), lambda: keyset_paginate(
+            query, Sale.sale_date, Sale.sale_id, current_app.config.get('SALES_PER_PAGE', 50),
+            after=after,
+            before=before,
+            total=summary['total_transactions']
+        ))
+    except ValueError:
+        flash('Invalid page link; showing the latest sales.', 'warning')
+        return redirect(url_for('admin.reports', **filters.as_args()))
+
+    # Dropdown options are fetched on demand; only the selected ones are labelled here
+    filter_args = filters.as_args()
+    selected_options = {
+        'category': filter_args['category'] or None,
+        'medicine_id': filter_option_label('medicines', filter_args['medicine_id']),
+        'user_id': filter_option_label('users', filter_args['user_id'])
     }
 
-    # Get all categories for filter dropdown
-    categories = db.session.query(Medicine.category).distinct().order_by(Medicine.category).all()
-    categories = [cat[0] for cat in categories]
-
-    # Get all medicines for filter dropdown
-    medicines = Medicine.query.order_by(Medicine.name).all()
-
-    # Get all users for filter dropdown
-    users = User.query.order_by(User.username).all()
-
     return render_template('admin/reports.html',
                            sales=sales_pagination,
                            summary=summary,
-                           categories=categories,
-                           medicines=medicines,
-                           users=users,
-                           filters={
-                               'start_date': start_date,
-                               'end_date': end_date,
-                               'category': category,
-                               'medicine_id': medicine_id,
-                               'user_id': user_id
-                           })
+                           selected_options=selected_options,
+                           filters=filter_args)
+
+
+@admin_bp.route('/api/report-filters/<kind>')
+@admin_required
+def report_filter_options(kind):
+    """Searchable options for a reports page filter dropdown (medicines, users or categories)"""
+
+    if kind not in FILTER_OPTION_SOURCES:
+        return jsonify({'error': f'Unknown filter: {kind}'}), 404
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    options, has_more = search_filter_options(kind, request.args.get('q', ''), limit)
+    return jsonify({'options': options, 'has_more': has_more})
 
 
 @admin_bp.route('/reports/export')
 @admin_required
 def export_reports():
-    """Export sales reports to CSV"""
+    """
+    Export sales reports, streamed in batches
+
+    The format query parameter selects the report CSV (default), gzip CSV
+    of raw values ('csv.gz'), or a columnar file ('parquet', 'npz', or
+    'columnar' for the best one available).
+    """
+
+    try:
+        export_format = resolve_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    filters, _ = ReportFilters.from_args(request.args)
+    query = export_query(filters)
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    filename = f'sales_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{export_format.extension}'
+
+    if export_format.name == 'csv':
+        # Stream the CSV as rows are fetched
+        body = stream_with_context(stream_csv(query, batch_size))
+    elif export_format.name == 'csv.gz':
+        body = stream_with_context(stream_csv_gz(query, batch_size))
+    else:
+        # Columnar files are only readable once complete, so build them in a temporary file
+        body = tempfile.TemporaryFile()
+        write_columnar(query, body, export_format, batch_size)
+        body.seek(0)
+        return send_file(body, mimetype=export_format.mimetype, as_attachment=True, download_name=filename)
+
+    response = Response(body, mimetype=export_format.mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
 
-    # Get filter parameters (same as reports route)
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
-    category = request.args.get('category', '')
-    medicine_id = request.args.get('medicine_id', '')
-    user_id = request.args.get('user_id', '')
+    return response
 
-    # Base query
-    query = db.session.query(
-        Sale.sale_id,
-        Sale.sale_date,
-        Medicine.name.label('medicine_name'),
-        Medicine.category,
-        Medicine.manufacturer,
-        Sale.quantity_sold,
-        Medicine.price.label('unit_price'),
-        Sale.total_price,
-        User.username.label('seller_name')
-    ).join(Medicine).join(User)
-
-    # Apply filters (same logic as reports route)
-    if start_date:
-        try:
-            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(Sale.sale_date >= start_dt)
-        except ValueError:
-            pass
-
-    if end_date:
-        try:
-            end_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-            query = query.filter(Sale.sale_date < end_dt)
-        except ValueError:
-            pass
-
-    if category:
-        query = query.filter(Medicine.category == category)
-
-    if medicine_id:
-        try:
-            query = query.filter(Sale.medicine_id == int(medicine_id))
-        except ValueError:
-            pass
-
-    if user_id:
-        try:
-            query = query.filter(Sale.user_id == int(user_id))
-        except ValueError:
-            pass
-
-    # Order by date
-    query = query.order_by(Sale.sale_date.desc())
-
-    # Get all results
-    sales_data = query.all()
-
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Write header
-    writer.writerow([
-        'Sale ID',
-        'Date',
-        'Time',
-        'Medicine Name',
-        'Category',
-        'Manufacturer',
-        'Quantity Sold',
-        'Unit Price',
-        'Total Price',
-        'Seller',
-        'Season'
-    ])
-
-    # Write data rows
-    for sale in sales_data:
-        sale_obj = Sale.query.get(sale.sale_id)
-        season = sale_obj.get_season() if sale_obj else 'N/A'
-
-        writer.writerow([
-            sale.sale_id,
-            sale.sale_date.strftime('%Y-%m-%d'),
-            sale.sale_date.strftime('%H:%M:%S'),
-            sale.medicine_name,
-            sale.category,
-            sale.manufacturer,
-            sale.quantity_sold,
-            f'₹{float(sale.unit_price):.2f}',
-            f'₹{float(sale.total_price):.2f}',
-            sale.seller_name,
-            season
-        ])
-
-    # Write summary at the end
-    writer.writerow([])
-    writer.writerow(['SUMMARY'])
-    writer.writerow(['Total Transactions', len(sales_data)])
-    writer.writerow(['Total Quantity Sold', sum(sale.quantity_sold for sale in sales_data)])
-    writer.writerow(['Total Revenue', f'₹{sum(float(sale.total_price) for sale in sales_data):.2f}'])
-
-    if len(sales_data) > 0:
-        avg_transaction = sum(float(sale.total_price) for sale in sales_data) / len(sales_data)
-        writer.writerow(['Average Transaction Value', f'₹{avg_transaction:.2f}'])
-
-    # Create response
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = f'attachment; filename=sales_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    response.headers['Content-Type'] = 'text/csv'
 
-    return response
+@admin_bp.route('/reports/exports', methods=['POST'])
+@admin_required
+def start_export():
+    """Queue a background export of the filtered report"""
+
+    try:
+        export_format = resolve_format(request.values.get('format'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    filters, _ = ReportFilters.from_args(request.values)
+    job = export_jobs.submit(filters, current_user.user_id, export_format)
+    return jsonify(export_job_payload(job)), 202
+
+
+def export_job_payload(job):
+    """Job state with the URLs to poll and download it"""
+    payload = job.to_dict()
+    payload['status_url'] = url_for('admin.export_status', job_id=job.job_id)
+    payload['download_url'] = (
+        url_for('admin.download_export', job_id=job.job_id) if job.status == job.DONE else None
+    )
+    return payload
+
+
+def get_export_job_or_404(job_id):
+    """Return the current admin's export job, or abort with 404"""
+    job = export_jobs.get(job_id)
+    if job is None or job.user_id != current_user.user_id:
+        abort(404)
+    return job
+
+
+@admin_bp.route('/reports/exports/<job_id>')
+@admin_required
+def export_status(job_id):
+    """Progress of a background export"""
+
+    return jsonify(export_job_payload(get_export_job_or_404(job_id)))
+
+
+@admin_bp.route('/reports/exports/<job_id>/download')
+@admin_required
+def download_export(job_id):
+    """Download the file of a finished export"""
+
+    job = get_export_job_or_404(job_id)
+    path = export_jobs.file_path(job)
+    if job.status != job.DONE or not os.path.exists(path):
+        abort(404)
+    mimetype = 'application/gzip' if job.filename.endswith('.gz') else job.export_format.mimetype
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=job.filename)
 
 
 @admin_bp.route('/alternatives')
@@ -557,6 +522,8 @@ def add_alternative():
 
         db.session.add(alternative)
         db.session.commit()
+        alternatives_graph.bump()
+        dashboard_cache.invalidate('alternatives')
 
         primary_med = Medicine.query.get(primary_medicine_id)
         alt_med = Medicine.query.get(alternative_medicine_id)
@@ -585,6 +552,8 @@ def edit_alternative(alternative_id):
         alternative.priority = priority
 
         db.session.commit()
+        alternatives_graph.bump()
+        dashboard_cache.invalidate('alternatives')
 
         flash('Alternative mapping updated successfully', 'success')
         return redirect(url_for('admin.alternatives'))
@@ -611,6 +580,8 @@ def delete_alternative(alternative_id):
 
     db.session.delete(alternative)
     db.session.commit()
+    alternatives_graph.bump()
+    dashboard_cache.invalidate('alternatives')
 
     flash(f'Alternative mapping deleted: {primary_med.name} → {alt_med.name}', 'success')
     return redirect(url_for('admin.alternatives'))
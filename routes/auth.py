@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, current_user
 from werkzeug.urls import url_parse
 from models import db
 from models.user import User
+from utils.cache import filter_options_cache
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -99,6 +100,7 @@ def register():
             user = User(username=username, email=email, password=password, role=role)
             db.session.add(user)
             db.session.commit()
+            filter_options_cache.invalidate('users')
             flash(f'Registration successful! Welcome, {username}. Please log in.', 'success')
             return redirect(url_for('auth.login'))
         except Exception as e:
@@ -6,9 +6,25 @@ from models.sale import Sale
 from routes.decorators import admin_required, staff_required
 from datetime import datetime, date
 from sqlalchemy import or_
+from utils.cache import barcode_cache
+from utils.catalog import catalog_snapshot, catalog_changed, medicine_edited
 
 medicine_bp = Blueprint('medicine', __name__)
 
+def serialize_medicine(medicine):
+    """Get the JSON payload describing a medicine for the scanner APIs"""
+    return {
+        'medicine_id': medicine.medicine_id,
+        'name': medicine.name,
+        'manufacturer': medicine.manufacturer,
+        'category': medicine.category,
+        'price': float(medicine.price),
+        'stock': medicine.stock,
+        'expiry_date': medicine.expiry_date.isoformat(),
+        'is_expired': medicine.is_expired(),
+        'barcode': medicine.barcode
+    }
+
 @medicine_bp.route('/')
 @login_required
 def list_medicines():
@@ -137,6 +153,7 @@ def add_medicine():
             )
             db.session.add(medicine)
             db.session.commit()
+            catalog_changed(barcode)
             flash(f'Medicine "{name}" added successfully!', 'success')
             return redirect(url_for('medicine.list_medicines'))
         except Exception as e:
@@ -213,6 +230,7 @@ def edit_medicine(medicine_id):
             return render_template('admin/edit_medicine.html', medicine=medicine, categories=Medicine.CATEGORIES)
 
         # Update medicine
+        old_barcode = medicine.barcode
         try:
             medicine.name = name
             medicine.description = description
@@ -227,6 +245,7 @@ def edit_medicine(medicine_id):
             medicine.updated_at = datetime.utcnow()
 
             db.session.commit()
+            medicine_edited(medicine.medicine_id, old_barcode, barcode)
             flash(f'Medicine "{name}" updated successfully!', 'success')
             return redirect(url_for('medicine.list_medicines'))
         except Exception as e:
@@ -253,6 +272,7 @@ def delete_medicine(medicine_id):
     try:
         db.session.delete(medicine)
         db.session.commit()
+        medicine_edited(medicine_id, medicine.barcode)
         flash(f'Medicine "{medicine.name}" deleted successfully.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -265,19 +285,60 @@ def delete_medicine(medicine_id):
 def get_medicine_by_barcode(barcode):
     """API endpoint to get medicine by barcode"""
 
-    medicine = Medicine.query.filter_by(barcode=barcode).first()
+    payload = barcode_cache.get(barcode)
+
+    if payload is None:
+        medicine = Medicine.query.filter_by(barcode=barcode).first()
+
+        if not medicine:
+            return jsonify({'error': 'Medicine not found'}), 404
+
+        payload = serialize_medicine(medicine)
+        del payload['is_expired']
+        barcode_cache.set(barcode, payload)
+
+    # Expiry is evaluated per request so cached entries stay correct across midnight
+    return jsonify(dict(
+        payload,
+        is_expired=date.fromisoformat(payload['expiry_date']) < date.today()
+    ))
 
-    if not medicine:
-        return jsonify({'error': 'Medicine not found'}), 404
+@medicine_bp.route('/api/barcode-cache/stats')
+@admin_required
+def barcode_cache_stats():
+    """API endpoint reporting barcode cache hit/miss statistics (Admin only)"""
+    return jsonify(barcode_cache.stats())
+
+@medicine_bp.route('/api/search')
+@login_required
+def search_sellable_medicines():
+    """API endpoint for typeahead search over sellable medicines"""
+
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 50)
+
+    items, total = catalog_snapshot.search(query, page=page, per_page=per_page)
 
     return jsonify({
-        'medicine_id': medicine.medicine_id,
-        'name': medicine.name,
-        'manufacturer': medicine.manufacturer,
-        'category': medicine.category,
-        'price': float(medicine.price),
-        'stock': medicine.stock,
-        'expiry_date': medicine.expiry_date.isoformat(),
-        'is_expired': medicine.is_expired(),
-        'barcode': medicine.barcode
+        'results': [
+            {
+                'medicine_id': item.medicine_id,
+                'name': item.name,
+                'manufacturer': item.manufacturer,
+                'category': item.category,
+                'price': float(item.price),
+                'stock': item.stock,
+                'expiry_date': item.expiry_date.isoformat(),
+                'barcode': item.barcode,
+                'low_stock': item.is_low_stock(),
+                'expiring_soon': item.is_expiring_soon()
+            }
+            for item in items
+        ],
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'has_next': page * per_page < total
     })
@@ -1,30 +1,196 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from flask_login import login_required, current_user
 from models import db
 from models.medicine import Medicine, AlternativeMedicine
-from models.sale import Sale
+from models.sale import Sale, SaleIdempotencyKey, SaleDailyRollup, SaleUserDailyCounter
 from forms.sale_forms import SaleForm, BarcodeSaleForm, ManualBarcodeForm
 from routes.decorators import staff_required
+from routes.medicine import serialize_medicine
+from utils.catalog import catalog_snapshot, sales_changed
+from utils.alternatives import alternatives_graph
+from utils.group_commit import group_committer
+from utils.pagination import keyset_paginate
+from utils.reports import sale_stamp
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date
 from decimal import Decimal
+from functools import partial
+import time
 
 sales_bp = Blueprint('sales', __name__)
 
+# Monotonic time of the last purge of expired idempotency keys in this process
+_last_idempotency_purge = 0.0
+
+
 def get_available_alternatives(medicine):
     """Get list of available alternative medicines (in stock and not expired)"""
-    alternatives = medicine.get_alternatives()
-    available_alternatives = []
+    return [
+        {'medicine': edge.medicine, 'reason': edge.reason, 'priority': edge.priority}
+        for edge in alternatives_graph.available(medicine.medicine_id)
+    ]
+
+def get_idempotent_sale(key):
+    """Get the sale previously recorded by the current user under an idempotency key"""
+    if not key:
+        return None
+
+    record = SaleIdempotencyKey.query.get((current_user.user_id, key))
+    if record is None or record.is_expired(current_app.config['IDEMPOTENCY_KEY_TTL']):
+        return None
+
+    return Sale.query.get(record.sale_id)
+
+
+def purge_idempotency_keys():
+    """
+    Delete expired idempotency keys, at most once per configured interval
+
+    The interval only restarts once the transaction holding the purge commits,
+    so a purge rolled back with its sale is retried by the next sale.
+    """
+    now = time.monotonic()
+    if now - _last_idempotency_purge < current_app.config['IDEMPOTENCY_PURGE_INTERVAL']:
+        return
+
+    SaleIdempotencyKey.purge_expired(current_app.config['IDEMPOTENCY_KEY_TTL'])
+    event.listen(db.session(), 'after_commit', partial(_idempotency_purge_committed, now), once=True)
+
+
+def _idempotency_purge_committed(purged_at, session):
+    global _last_idempotency_purge
+    _last_idempotency_purge = max(_last_idempotency_purge, purged_at)
+
+
+def record_sale(medicine_id, unit_price, user_id, quantity, idempotency_key=None):
+    """
+    Decrement stock and add a sale (and its idempotency key) to the current transaction
+
+    Returns the new sale ID, or None if there was not enough sellable stock.
+    The caller commits or rolls back.
+    """
+    if not Medicine.decrement_stock_by_id(medicine_id, quantity):
+        return None
+
+    sale = Sale(
+        medicine_id=medicine_id,
+        user_id=user_id,
+        quantity_sold=quantity,
+        total_price=Decimal(str(unit_price)) * Decimal(str(quantity))
+    )
+    db.session.add(sale)
+    db.session.flush()
+    SaleDailyRollup.add_sale(sale)
+    SaleUserDailyCounter.add_sale(sale)
+
+    # Remember the key in the same transaction as the sale
+    if idempotency_key:
+        db.session.add(SaleIdempotencyKey(
+            user_id=user_id,
+            key=idempotency_key,
+            sale_id=sale.sale_id
+        ))
+        purge_idempotency_keys()
+        db.session.flush()
+
+    return sale.sale_id
+
+
+def commit_sale(medicine, quantity, idempotency_key=None):
+    """
+    Record and commit a single sale, through the group committer when enabled
+
+    Returns the committed Sale, or None if there was not enough sellable stock.
+    """
+    medicine_id = medicine.medicine_id
+    barcode = medicine.barcode
+    unit_price = medicine.price
+    user_id = current_user.user_id
+
+    def operation():
+        return record_sale(medicine_id, unit_price, user_id, quantity, idempotency_key)
+
+    if group_committer.enabled:
+        # Hand this request's connection back to the pool while the worker
+        # commits, otherwise busy tills can starve the worker of connections
+        db.session.rollback()
+        sale_id = group_committer.submit(operation)
+    else:
+        sale_id = operation()
+        if sale_id is None:
+            db.session.rollback()
+        else:
+            db.session.commit()
+
+    # Stock changed underneath this request's copy of the medicine
+    db.session.expire(medicine)
+
+    if sale_id is None:
+        return None
+
+    sale = Sale.query.get(sale_id)
+    sales_changed(barcode, sales=[sale])
+    return sale
+
+
+def barcode_sale_response(sale, medicine, replayed=False):
+    """Build the response for a recorded barcode sale"""
+    low_stock = medicine.is_low_stock()
+    message = f'Sale recorded successfully! {sale.quantity_sold} units of {medicine.name} sold.'
 
-    for alt in alternatives:
-        alt_medicine = Medicine.query.get(alt.alternative_medicine_id)
-        if alt_medicine and alt_medicine.stock > 0 and not alt_medicine.is_expired():
-            available_alternatives.append({
-                'medicine': alt_medicine,
-                'reason': alt.reason,
-                'priority': alt.priority
-            })
+    if request.is_json:
+        response = jsonify({
+            'success': True,
+            'message': message,
+            'sale_id': sale.sale_id,
+            'low_stock': low_stock,
+            'remaining_stock': medicine.stock,
+            'receipt_url': url_for('sales.receipt', sale_id=sale.sale_id)
+        })
+        if replayed:
+            response.headers['Idempotent-Replayed'] = 'true'
+        return response, 200
+
+    if not replayed:
+        flash(message, 'success')
+
+        if low_stock:
+            flash(f'Warning: {medicine.name} is now low on stock ({medicine.stock} units remaining).', 'warning')
+
+    return redirect(url_for('sales.receipt', sale_id=sale.sale_id))
+
+
+def serialize_alternatives(medicine, limit=3):
+    """Get the JSON payload for a medicine's available alternatives"""
+    return [
+        {
+            'id': alt['medicine'].medicine_id,
+            'name': alt['medicine'].name,
+            'barcode': alt['medicine'].barcode,
+            'stock': alt['medicine'].stock,
+            'price': float(alt['medicine'].price),
+            'reason': alt['reason']
+        }
+        for alt in get_available_alternatives(medicine)[:limit]
+    ]
+
+
+def scan_sale_payload(sale, medicine):
+    """Build the scan-and-sell payload for a recorded sale"""
+    return {
+        'success': True,
+        'message': f'Sale recorded successfully! {sale.quantity_sold} units of {medicine.name} sold.',
+        'sale_id': sale.sale_id,
+        'quantity': sale.quantity_sold,
+        'total_price': float(sale.total_price),
+        'medicine': serialize_medicine(medicine),
+        'remaining_stock': medicine.stock,
+        'low_stock': medicine.is_low_stock(),
+        'alternatives': serialize_alternatives(medicine),
+        'receipt_url': url_for('sales.receipt', sale_id=sale.sale_id)
+    }
 
-    return available_alternatives
 
 @sales_bp.route('/sell', methods=['GET', 'POST'])
 @login_required
@@ -67,24 +233,11 @@ def sell_medicines():
 
                 return redirect(url_for('sales.sell_medicines'))
 
-            # Calculate total price
-            total_price = Decimal(str(medicine.price)) * Decimal(str(form.quantity.data))
-
-            # Create sale record
-            sale = Sale(
-                medicine_id=medicine.medicine_id,
-                user_id=current_user.user_id,
-                quantity_sold=form.quantity.data,
-                total_price=total_price
-            )
-
-            # Update stock
-            medicine.stock -= form.quantity.data
-            medicine.updated_at = datetime.utcnow()
-
-            # Commit transaction
-            db.session.add(sale)
-            db.session.commit()
+            # Record the sale; stock is decremented atomically in case another till sold it meanwhile
+            sale = commit_sale(medicine, form.quantity.data)
+            if sale is None:
+                flash(f'Insufficient stock. Only {medicine.stock} units available.', 'danger')
+                return redirect(url_for('sales.sell_medicines'))
 
             flash(f'Sale recorded successfully! {form.quantity.data} units of {medicine.name} sold.', 'success')
 
@@ -99,13 +252,10 @@ def sell_medicines():
             flash('An error occurred while recording the sale. Please try again.', 'danger')
             return redirect(url_for('sales.sell_medicines'))
 
-    # Get available medicines for display
-    medicines = Medicine.query.filter(
-        Medicine.stock > 0,
-        Medicine.expiry_date > date.today()
-    ).order_by(Medicine.name).all()
+    # Selected medicine (if any) so a re-rendered form keeps its selection
+    selected = catalog_snapshot.get(form.medicine_id.data) if form.medicine_id.data else None
 
-    return render_template('shared/sell_medicines.html', form=form, medicines=medicines)
+    return render_template('shared/sell_medicines.html', form=form, selected=selected)
 
 
 @sales_bp.route('/scan', methods=['GET'])
@@ -121,7 +271,23 @@ def scan():
 @login_required
 @staff_required
 def sell_by_barcode():
-    """Record sale via barcode"""
+    """Record sale via barcode
+
+    Clients may send an Idempotency-Key header. A retry carrying a key that
+    already produced a sale returns the original result without selling again.
+    """
+
+    # Replay the original result for a retried request
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+    if len(idempotency_key) > SaleIdempotencyKey.MAX_KEY_LENGTH:
+        if request.is_json:
+            return jsonify({'error': 'Idempotency key is too long.'}), 400
+        flash('Idempotency key is too long.', 'danger')
+        return redirect(url_for('sales.scan'))
+
+    previous_sale = get_idempotent_sale(idempotency_key)
+    if previous_sale:
+        return barcode_sale_response(previous_sale, previous_sale.medicine, replayed=True)
 
     # Get data from JSON request or form data
     if request.is_json:
@@ -198,51 +364,267 @@ def sell_by_barcode():
         return redirect(url_for('sales.scan'))
 
     try:
-        # Calculate total price
-        total_price = Decimal(str(medicine.price)) * Decimal(str(quantity))
-
-        # Create sale record
-        sale = Sale(
-            medicine_id=medicine.medicine_id,
-            user_id=current_user.user_id,
-            quantity_sold=quantity,
-            total_price=total_price
-        )
+        # Record the sale; stock is decremented atomically in case another till sold it meanwhile
+        sale = commit_sale(medicine, quantity, idempotency_key)
+
+        if sale is None:
+            if request.is_json:
+                return jsonify({
+                    'error': f'Insufficient stock. Only {medicine.stock} units available.',
+                    'available_stock': medicine.stock
+                }), 400
+            flash(f'Insufficient stock. Only {medicine.stock} units available.', 'danger')
+            return redirect(url_for('sales.scan'))
+
+        return barcode_sale_response(sale, medicine)
+
+    except IntegrityError:
+        # A concurrent retry with the same key won; replay its result instead
+        db.session.rollback()
+        previous_sale = get_idempotent_sale(idempotency_key)
+        if previous_sale:
+            return barcode_sale_response(previous_sale, previous_sale.medicine, replayed=True)
+        if request.is_json:
+            return jsonify({'error': 'An error occurred while recording the sale.'}), 500
+        flash('An error occurred while recording the sale. Please try again.', 'danger')
+        return redirect(url_for('sales.scan'))
 
-        # Update stock
-        medicine.stock -= quantity
-        medicine.updated_at = datetime.utcnow()
+    except Exception as e:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify({'error': 'An error occurred while recording the sale.'}), 500
+        flash('An error occurred while recording the sale. Please try again.', 'danger')
+        return redirect(url_for('sales.scan'))
 
-        # Commit transaction
-        db.session.add(sale)
-        db.session.commit()
 
-        # Prepare response
-        low_stock = medicine.is_low_stock()
+@sales_bp.route('/scan/sell', methods=['POST'])
+@login_required
+@staff_required
+def scan_and_sell():
+    """Resolve a scanned barcode and record its sale in a single JSON request
 
-        if request.is_json:
+    Returns the medicine details, remaining stock and available alternatives
+    together, so the scanner does not need a separate lookup first. Honours
+    the same Idempotency-Key header as /sell/barcode.
+    """
+
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+    if len(idempotency_key) > SaleIdempotencyKey.MAX_KEY_LENGTH:
+        return jsonify({'error': 'Idempotency key is too long.'}), 400
+
+    previous_sale = get_idempotent_sale(idempotency_key)
+    if previous_sale:
+        response = jsonify(scan_sale_payload(previous_sale, previous_sale.medicine))
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response, 200
+
+    data = request.get_json(silent=True) or {}
+    barcode = str(data.get('barcode', '')).strip()
+    quantity = data.get('quantity', 1)
+
+    # Validate inputs
+    if not barcode or len(barcode) != 13 or not barcode.isdigit():
+        return jsonify({'error': 'Invalid barcode format. Must be 13 digits.'}), 400
+
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+        return jsonify({'error': 'Quantity must be at least 1.'}), 400
+
+    # Find medicine
+    medicine = Medicine.query.filter_by(barcode=barcode).first()
+
+    if not medicine:
+        return jsonify({'error': f'No medicine found with barcode {barcode}.'}), 404
+
+    # Validate expiry and stock
+    error = None
+    if medicine.is_expired():
+        error = f'{medicine.name} has expired and cannot be sold.'
+    elif medicine.stock < quantity:
+        error = f'Insufficient stock. Only {medicine.stock} units available.'
+
+    try:
+        # Record the sale; stock is decremented atomically in case another till sold it meanwhile
+        sale = None if error else commit_sale(medicine, quantity, idempotency_key)
+        if not error and sale is None:
+            error = f'Insufficient stock. Only {medicine.stock} units available.'
+
+        if error:
             return jsonify({
-                'success': True,
-                'message': f'Sale recorded successfully! {quantity} units of {medicine.name} sold.',
-                'sale_id': sale.sale_id,
-                'low_stock': low_stock,
+                'success': False,
+                'error': error,
+                'medicine': serialize_medicine(medicine),
                 'remaining_stock': medicine.stock,
-                'receipt_url': url_for('sales.receipt', sale_id=sale.sale_id)
-            }), 200
+                'alternatives': serialize_alternatives(medicine)
+            }), 400
 
-        flash(f'Sale recorded successfully! {quantity} units of {medicine.name} sold.', 'success')
+        return jsonify(scan_sale_payload(sale, medicine)), 200
 
-        if low_stock:
-            flash(f'Warning: {medicine.name} is now low on stock ({medicine.stock} units remaining).', 'warning')
+    except IntegrityError:
+        # A concurrent retry with the same key won; replay its result instead
+        db.session.rollback()
+        previous_sale = get_idempotent_sale(idempotency_key)
+        if previous_sale:
+            response = jsonify(scan_sale_payload(previous_sale, previous_sale.medicine))
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response, 200
+        return jsonify({'error': 'An error occurred while recording the sale.'}), 500
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'An error occurred while recording the sale.'}), 500
 
-        return redirect(url_for('sales.receipt', sale_id=sale.sale_id))
+
+@sales_bp.route('/sell/cart', methods=['POST'])
+@login_required
+@staff_required
+def sell_cart():
+    """Record a whole basket of barcode sales in a single transaction
+
+    Expects JSON of the form {"lines": [{"barcode": "...", "quantity": n}, ...]}.
+    Lines sharing a barcode are merged. Either every line is sold or none is.
+    """
+
+    data = request.get_json(silent=True) or {}
+    raw_lines = data.get('lines')
+
+    if not isinstance(raw_lines, list) or not raw_lines:
+        return jsonify({'error': 'Cart must contain at least one line.'}), 400
+
+    max_lines = current_app.config.get('CART_MAX_LINES', 100)
+    if len(raw_lines) > max_lines:
+        return jsonify({'error': f'Cart cannot contain more than {max_lines} lines.'}), 400
+
+    # Validate line format and merge duplicate barcodes, keeping first-seen order
+    requested = {}
+    for index, line in enumerate(raw_lines):
+        if not isinstance(line, dict):
+            return jsonify({'error': f'Line {index + 1} is not a valid cart line.'}), 400
+
+        barcode = str(line.get('barcode', '')).strip()
+        quantity = line.get('quantity', 1)
+
+        if not barcode or len(barcode) != 13 or not barcode.isdigit():
+            return jsonify({'error': f'Line {index + 1}: invalid barcode format. Must be 13 digits.'}), 400
+
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            return jsonify({'error': f'Line {index + 1}: quantity must be at least 1.'}), 400
+
+        requested[barcode] = requested.get(barcode, 0) + quantity
+
+    # Resolve every medicine in one query
+    medicines = {
+        medicine.barcode: medicine
+        for medicine in Medicine.query.filter(Medicine.barcode.in_(list(requested))).all()
+    }
+
+    # Validate stock and expiry for every line before touching anything
+    results = []
+    has_errors = False
+    for barcode, quantity in requested.items():
+        medicine = medicines.get(barcode)
+        result = {'barcode': barcode, 'quantity': quantity}
+
+        if not medicine:
+            result['error'] = f'No medicine found with barcode {barcode}.'
+        elif medicine.is_expired():
+            result['error'] = f'{medicine.name} has expired and cannot be sold.'
+        elif medicine.stock < quantity:
+            result['error'] = f'Insufficient stock. Only {medicine.stock} units available.'
+            result['available_stock'] = medicine.stock
+
+        if medicine:
+            result['medicine_id'] = medicine.medicine_id
+            result['name'] = medicine.name
+
+        if 'error' in result:
+            has_errors = True
+            result['success'] = False
+            if medicine:
+                alternatives = get_available_alternatives(medicine)
+                if alternatives:
+                    result['alternatives'] = [
+                        {'name': alt['medicine'].name, 'id': alt['medicine'].medicine_id}
+                        for alt in alternatives[:3]
+                    ]
+
+        results.append(result)
+
+    if has_errors:
+        return jsonify({
+            'success': False,
+            'error': 'One or more cart lines cannot be sold. No sales were recorded.',
+            'lines': results
+        }), 400
+
+    try:
+        sales = []
+        for result, (barcode, quantity) in zip(results, requested.items()):
+            medicine = medicines[barcode]
+
+            # Update stock atomically; abandon the whole cart if another till got there first
+            if not medicine.decrement_stock(quantity):
+                db.session.rollback()
+                result.update({
+                    'success': False,
+                    'error': f'Insufficient stock. Only {medicine.stock} units available.',
+                    'available_stock': medicine.stock
+                })
+                return jsonify({
+                    'success': False,
+                    'error': 'One or more cart lines cannot be sold. No sales were recorded.',
+                    'lines': results
+                }), 400
+
+            sales.append(Sale(
+                medicine_id=medicine.medicine_id,
+                user_id=current_user.user_id,
+                quantity_sold=quantity,
+                total_price=Decimal(str(medicine.price)) * Decimal(str(quantity))
+            ))
+
+        # Insert every sale row, roll them up and commit once
+        db.session.add_all(sales)
+        db.session.flush()
+        for sale in sales:
+            SaleDailyRollup.add_sale(sale)
+            SaleUserDailyCounter.add_sale(sale)
+        stamps = [sale_stamp(sale) for sale in sales]
+        db.session.commit()
+        sales_changed(*requested, sales=stamps)
 
     except Exception as e:
         db.session.rollback()
-        if request.is_json:
-            return jsonify({'error': 'An error occurred while recording the sale.'}), 500
-        flash('An error occurred while recording the sale. Please try again.', 'danger')
-        return redirect(url_for('sales.scan'))
+        return jsonify({'error': 'An error occurred while recording the sale.'}), 500
+
+    total_amount = Decimal('0')
+    total_quantity = 0
+    for result, sale in zip(results, sales):
+        medicine = medicines[result['barcode']]
+        total_amount += sale.total_price
+        total_quantity += sale.quantity_sold
+        result.update({
+            'success': True,
+            'sale_id': sale.sale_id,
+            'unit_price': float(medicine.price),
+            'total_price': float(sale.total_price),
+            'remaining_stock': medicine.stock,
+            'low_stock': medicine.is_low_stock(),
+            'receipt_url': url_for('sales.receipt', sale_id=sale.sale_id)
+        })
+
+    return jsonify({
+        'success': True,
+        'message': f'Sale recorded successfully! {total_quantity} units across {len(sales)} medicines sold.',
+        'lines': results,
+        'receipt': {
+            'sale_ids': [sale.sale_id for sale in sales],
+            'sale_date': sales[0].sale_date.isoformat(),
+            'seller': current_user.username,
+            'total_lines': len(sales),
+            'total_quantity': total_quantity,
+            'total_amount': float(total_amount)
+        }
+    }), 200
 
 
 @sales_bp.route('/receipt/<int:sale_id>')
@@ -270,17 +652,23 @@ def receipt(sale_id):
 def sales_history():
     """View sales history"""
 
-    page = request.args.get('page', 1, type=int)
     per_page = 20
+    query = Sale.query
 
     # Staff can only see their own sales, Admin can see all
-    if current_user.role == 'Admin':
-        sales = Sale.query.order_by(Sale.sale_date.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+    user_id = None if current_user.role == 'Admin' else current_user.user_id
+    if user_id is not None:
+        query = query.filter(Sale.user_id == user_id)
+
+    try:
+        sales = keyset_paginate(
+            query, Sale.sale_date, Sale.sale_id, per_page,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            total=SaleUserDailyCounter.total_transactions(user_id)
         )
-    else:
-        sales = Sale.query.filter_by(user_id=current_user.user_id).order_by(
-            Sale.sale_date.desc()
-        ).paginate(page=page, per_page=per_page, error_out=False)
+    except ValueError:
+        flash('Invalid page link; showing the latest sales.', 'warning')
+        return redirect(url_for('sales.sales_history'))
 
     return render_template('shared/sales_history.html', sales=sales)
@@ -7,6 +7,8 @@ let isScanning = false;
 let lastDetectedBarcode = null;
 let lastDetectionTime = 0;
 const DETECTION_COOLDOWN = 2000; // 2 seconds cooldown between detections
+const SALE_REQUEST_TIMEOUT = 4000; // Abort a sale request after 4 seconds
+const SALE_MAX_ATTEMPTS = 4; // Retries are safe because each sale carries an idempotency key
 
 // Audio feedback
 const beepSound = new Audio('data:audio/wav;base64,UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUXrTp66hVFApGn+DyvmwhBSuBzvLZiDcIF2i58OScTgwOUavm8LNlHAU2kdvyy30tBSN2x+/ekUALFV6069+oVhQKRp7f8r5sIQUrlM7y2Ic3CBZpuezjm08MDFCr5O+zZRsFN5Ha8sp9LQUjdsXv3pFAChVetOvfqFYUCkae3++9bCAFKpPO8tiHNwgWabns45lPDAhPq+Xvs2UbBzaR2/LKfS0FI3bF79+RQAoVXrPr4KhWFApGnt/vvWwgBSqTzvLYhzcIFmm57OOZTwsJT6vl77NlGwc2kdvyynyuBCN2xe/fkUAKFV607N+oVhQLRp7f771sIAUqk87y2Ic3CBZpuevsm08LCU+r5e6yZRsHNpHa88l8rgQjdsXv35FAChVetOzfp1YUC0ae3++9bCAFKpPO8tiHNwgWabns45lPCwlPq+XusmUbBzaR2vPJfK4EI3bF79+RQAoUXrTs4KdWFAtGnt/vvWwgBSqTzvLYhzcIFmm57OOZTwsIT6vl7rJlGwc2kdryyny');
@@ -108,10 +110,96 @@ function handleBarcodeDetection(result) {
     // Display result
     displayBarcodeResult(code);
 
-    // Fetch medicine details
+    // Selling on scan records the sale in the same request as the lookup
+    const quickSellToggle = document.getElementById('quick-sell-toggle');
+    if (quickSellToggle && quickSellToggle.checked) {
+        quickSell(code);
+        return;
+    }
+
+    // Fetch medicine details so the sale can be reviewed before it is recorded
     fetchMedicineDetails(code);
 }
 
+// Resolve the barcode and record the sale in one round trip
+function quickSell(barcode) {
+    const quantityInput = document.getElementById('scan-quantity');
+    const quantity = quantityInput ? parseInt(quantityInput.value) : 1;
+
+    if (!quantity || quantity < 1) {
+        alert('Invalid quantity');
+        return;
+    }
+
+    postSaleWithRetry('/scan/sell', {
+        barcode: barcode,
+        quantity: quantity
+    }, generateIdempotencyKey())
+        .then(response => response.json())
+        .then(data => {
+            const resultDiv = document.getElementById('barcode-result');
+            let alertDiv;
+
+            // Server strings (names, messages) are only ever set as text
+            if (data.success) {
+                alertDiv = createAlert('alert-success', 'bi-check-circle', 'Sale Recorded!');
+                alertDiv.appendChild(createTextElement('p', 'mb-1', data.message));
+                const details = createTextElement('p', 'mb-2', '');
+                details.appendChild(createTextElement('small', '',
+                    `${data.medicine.manufacturer} · ₹${data.total_price.toFixed(2)} · ${data.remaining_stock} remaining`));
+                alertDiv.appendChild(details);
+                if (data.low_stock) {
+                    const warning = createTextElement('p', 'mb-2', ` Stock is low (${data.remaining_stock} remaining)`);
+                    warning.prepend(createTextElement('strong', '', 'Warning:'));
+                    alertDiv.appendChild(warning);
+                }
+                const receipt = createTextElement('a', 'btn btn-primary btn-sm', ' View Receipt');
+                receipt.href = data.receipt_url;
+                receipt.prepend(createTextElement('i', 'bi bi-receipt', ''));
+                alertDiv.appendChild(receipt);
+                lastDetectedBarcode = null;
+            } else {
+                alertDiv = createAlert('alert-danger', 'bi-x-circle', 'Sale Not Recorded');
+                alertDiv.appendChild(createTextElement('p', 'mb-0', data.error || 'Sale failed'));
+                const alternatives = data.alternatives || [];
+                if (alternatives.length) {
+                    const heading = createTextElement('p', 'mb-0 mt-2', '');
+                    heading.appendChild(createTextElement('strong', '', 'Alternatives:'));
+                    const list = createTextElement('ul', 'mb-0', '');
+                    alternatives.forEach(alt => {
+                        list.appendChild(createTextElement('li', '', `${alt.name} (${alt.stock} in stock)`));
+                    });
+                    alertDiv.append(heading, list);
+                }
+            }
+
+            resultDiv.replaceChildren(alertDiv);
+        })
+        .catch(error => {
+            console.error('Error recording sale:', error);
+            alert('Error recording sale: ' + error.message);
+        });
+}
+
+// Create an element holding plain text
+function createTextElement(tag, className, text) {
+    const element = document.createElement(tag);
+    if (className) {
+        element.className = className;
+    }
+    element.textContent = text;
+    return element;
+}
+
+// Create an alert box with an icon heading
+function createAlert(alertClass, iconClass, title) {
+    const alertDiv = createTextElement('div', `alert ${alertClass}`, '');
+    const heading = createTextElement('h5', '', ` ${title}`);
+    heading.prepend(createTextElement('i', `bi ${iconClass}`, ''));
+    alertDiv.appendChild(heading);
+    return alertDiv;
+}
+
 // Display barcode result
 function displayBarcodeResult(barcode) {
     const resultDiv = document.getElementById('barcode-result');
@@ -212,6 +300,47 @@ function showSaleConfirmation(medicine, barcode) {
     modal.show();
 }
 
+// Generate a unique idempotency key for a sale
+function generateIdempotencyKey() {
+    if (window.crypto && window.crypto.randomUUID) {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// POST JSON with a short timeout, retrying network failures with the same idempotency key
+function postSaleWithRetry(url, payload, idempotencyKey, attempt = 1) {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), SALE_REQUEST_TIMEOUT);
+
+    return fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': idempotencyKey,
+        },
+        body: JSON.stringify(payload),
+        signal: controller.signal
+    })
+        .then(response => {
+            clearTimeout(timer);
+            if (response.status >= 500 && attempt < SALE_MAX_ATTEMPTS) {
+                throw new TypeError(`Server error (${response.status})`);
+            }
+            return response;
+        })
+        .catch(error => {
+            clearTimeout(timer);
+            const retryable = error.name === 'AbortError' || error instanceof TypeError;
+            if (retryable && attempt < SALE_MAX_ATTEMPTS) {
+                const backoff = 250 * Math.pow(2, attempt - 1);
+                return new Promise(resolve => setTimeout(resolve, backoff))
+                    .then(() => postSaleWithRetry(url, payload, idempotencyKey, attempt + 1));
+            }
+            throw error;
+        });
+}
+
 // Confirm and record sale
 function confirmSale() {
     const barcode = document.getElementById('confirm-sale-btn').dataset.barcode;
@@ -222,17 +351,11 @@ function confirmSale() {
         return;
     }
 
-    // Send sale request
-    fetch('/sell/barcode', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            barcode: barcode,
-            quantity: quantity
-        })
-    })
+    // Send sale request; every retry reuses the same key so the sale is recorded once
+    postSaleWithRetry('/scan/sell', {
+        barcode: barcode,
+        quantity: quantity
+    }, generateIdempotencyKey())
         .then(response => response.json())
         .then(data => {
             if (data.success) {
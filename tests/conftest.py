@@ -10,6 +10,10 @@ from models import db
 from models.user import User
 from models.medicine import Medicine, AlternativeMedicine
 from models.sale import Sale
+from utils.cache import barcode_cache, dashboard_cache, report_cache, filter_options_cache
+from utils.insights import insights_snapshot
+from utils.catalog import catalog_snapshot
+from utils.alternatives import alternatives_graph
 from datetime import date, timedelta
 from decimal import Decimal
 
@@ -51,6 +55,13 @@ def db_session(app):
         db.session.remove()
         db.drop_all()
         db.create_all()
+        barcode_cache.clear()
+        dashboard_cache.clear()
+        report_cache.clear()
+        filter_options_cache.clear()
+        insights_snapshot.clear()
+        catalog_snapshot.clear()
+        alternatives_graph.clear()
         yield db
         # Cleanup
         db.session.remove()
@@ -145,6 +156,24 @@ def expired_medicine(db_session):
     return medicine
 
 
+@pytest.fixture
+def make_sale(db_session):
+    """Factory that adds a flushed sale of a medicine by a user, optionally dated in the past"""
+    def make(user, medicine, quantity=1, sale_date=None):
+        sale = Sale(
+            medicine_id=medicine.medicine_id,
+            user_id=user.user_id,
+            quantity_sold=quantity,
+            total_price=medicine.price * quantity
+        )
+        if sale_date is not None:
+            sale.sale_date = sale_date
+        db_session.session.add(sale)
+        db_session.session.flush()
+        return sale
+    return make
+
+
 @pytest.fixture
 def authenticated_admin_client(client, admin_user):
     """Create an authenticated admin client"""
@@ -0,0 +1,160 @@
+"""
+Concurrency tests for the sale path
+"""
+import random
+import threading
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from app import create_app
+from config import TestingConfig
+from models import db
+from models.user import User
+from models.medicine import Medicine
+from models.sale import Sale
+from utils.group_commit import GroupCommitter, GroupCommitError, group_committer
+
+
+THREADS = 8
+SALES_PER_THREAD = 20
+INITIAL_STOCK = 100
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """Create an application backed by a SQLite file so each thread gets its own connection"""
+
+    class FileDatabaseConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "concurrency.db"}'
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+    app = create_app(FileDatabaseConfig)
+
+    with app.app_context():
+        user = User(username='till', email='till@test.com', password='till1234', role='Staff')
+        medicine = Medicine(
+            name='Fast Mover',
+            manufacturer='Test Manufacturer',
+            category='Fever',
+            quantity=INITIAL_STOCK,
+            price=Decimal('10.00'),
+            expiry_date=date.today() + timedelta(days=365),
+            stock=INITIAL_STOCK,
+            reorder_level=10,
+            barcode='5555555555555'
+        )
+        db.session.add_all([user, medicine])
+        db.session.commit()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+def run_tills(app):
+    """Sell the fast mover from several threads at once and return the accepted quantities and statuses"""
+    with app.app_context():
+        user_id = User.query.filter_by(username='till').first().user_id
+
+    accepted = []
+    statuses = []
+    lock = threading.Lock()
+
+    def till():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+
+        for _ in range(SALES_PER_THREAD):
+            quantity = random.randint(1, 3)
+            response = client.post('/sell/barcode', json={
+                'barcode': '5555555555555',
+                'quantity': quantity
+            })
+            with lock:
+                statuses.append(response.status_code)
+                if response.status_code == 200:
+                    accepted.append(quantity)
+
+    threads = [threading.Thread(target=till) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return accepted, statuses
+
+
+def assert_no_oversell(app, accepted, statuses):
+    """Assert stock never went negative and every accepted sale was recorded"""
+    with app.app_context():
+        medicine = Medicine.query.filter_by(barcode='5555555555555').first()
+        sold = db.session.query(db.func.sum(Sale.quantity_sold)).scalar() or 0
+
+        assert set(statuses) <= {200, 400}
+        assert medicine.stock >= 0
+        assert Sale.query.count() == len(accepted)
+        assert sold == sum(accepted)
+        assert medicine.stock == INITIAL_STOCK - sold
+
+
+class TestConcurrentSales:
+    """Stress tests for the atomic stock decrement"""
+
+    def test_concurrent_tills_never_oversell(self, file_app):
+        """Test concurrent barcode sales never drive stock negative or lose a sale"""
+        accepted, statuses = run_tills(file_app)
+        assert_no_oversell(file_app, accepted, statuses)
+
+    def test_group_commit_never_oversells(self, file_app):
+        """Test group commit merges concurrent sales without losing or overselling any"""
+        file_app.config['SALE_GROUP_COMMIT'] = True
+        group_committer.init_app(file_app)
+        try:
+            accepted, statuses = run_tills(file_app)
+        finally:
+            group_committer.stop()
+            file_app.config['SALE_GROUP_COMMIT'] = False
+            group_committer.init_app(file_app)
+
+        assert_no_oversell(file_app, accepted, statuses)
+        assert group_committer.batches < group_committer.operations
+
+    def test_group_commit_timeout_cancels_queued_operation(self, file_app):
+        """Test a timed-out operation never runs, while one already running still reports its result"""
+        committer = GroupCommitter()
+        committer.init_app(file_app)
+        committer.timeout = 0.05
+        committer.max_batch = 1
+
+        started = threading.Event()
+        release = threading.Event()
+        ran = []
+        results = []
+
+        def slow():
+            started.set()
+            release.wait(5)
+            ran.append('slow')
+            return 'slow'
+
+        def queued():
+            ran.append('queued')
+            return 'queued'
+
+        thread = threading.Thread(target=lambda: results.append(committer.submit(slow)))
+        thread.start()
+        started.wait(5)
+        try:
+            with pytest.raises(GroupCommitError):
+                committer.submit(queued)
+        finally:
+            release.set()
+            thread.join()
+            committer.stop()
+
+        assert results == ['slow']
+        assert ran == ['slow']
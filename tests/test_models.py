@@ -4,9 +4,10 @@ Unit tests for database models
 import pytest
 from datetime import date, timedelta
 from decimal import Decimal
+from types import SimpleNamespace
 from models.user import User
 from models.medicine import Medicine, AlternativeMedicine
-from models.sale import Sale
+from models.sale import Sale, SaleDailyRollup, SaleUserDailyCounter, increment_totals
 
 
 class TestUserModel:
@@ -240,3 +241,131 @@ class TestSaleModel:
 
         season = sale.get_season()
         assert season in ['Winter', 'Spring', 'Summer', 'Monsoon']
+
+    def test_season_case_matches_get_season_for_month(self, db_session):
+        """Test the SQL season expression agrees with get_season_for_month()"""
+        from sqlalchemy import literal
+
+        for month in range(1, 13):
+            season = db_session.session.query(Sale.season_case(literal(date(2024, month, 15)))).scalar()
+            assert season == Sale.get_season_for_month(month)
+
+
+class TestSaleDailyRollupModel:
+    """Test cases for SaleDailyRollup model"""
+
+    def test_add_sale_accumulates_per_day(self, db_session, admin_user, sample_medicine, make_sale):
+        """Test add_sale() inserts the first row of the day and updates it afterwards"""
+        for quantity in (2, 3):
+            SaleDailyRollup.add_sale(make_sale(admin_user, sample_medicine, quantity))
+        db_session.session.commit()
+
+        rollup = SaleDailyRollup.query.one()
+        assert rollup.medicine_id == sample_medicine.medicine_id
+        assert rollup.user_id == admin_user.user_id
+        assert rollup.quantity == 5
+        assert rollup.revenue == Decimal('250.00')
+        assert rollup.transaction_count == 2
+
+    def test_add_sale_without_native_upsert(self, db_session, admin_user, sample_medicine, make_sale, monkeypatch):
+        """Test add_sale() falls back to update-then-insert on databases without an upsert"""
+        monkeypatch.setattr(db_session.engine.dialect, 'name', 'oracle')
+        for quantity in (2, 3):
+            SaleDailyRollup.add_sale(make_sale(admin_user, sample_medicine, quantity))
+        db_session.session.commit()
+
+        rollup = SaleDailyRollup.query.one()
+        assert rollup.quantity == 5
+        assert rollup.revenue == Decimal('250.00')
+        assert rollup.transaction_count == 2
+
+    def test_increment_totals_adds_to_row_inserted_concurrently(self, db_session, admin_user, sample_medicine,
+                                                                 monkeypatch):
+        """Test increment_totals() adds to a row inserted between its update and its insert"""
+        key = {'day': date.today(), 'medicine_id': sample_medicine.medicine_id, 'user_id': admin_user.user_id}
+        db_session.session.add(SaleDailyRollup(quantity=1, revenue=Decimal('50'), transaction_count=1, **key))
+        db_session.session.flush()
+
+        # The first update runs before the other transaction's row exists
+        execute = db_session.session.execute
+        calls = []
+
+        def racing_execute(statement, *args, **kwargs):
+            calls.append(statement)
+            if len(calls) == 1:
+                return SimpleNamespace(rowcount=0)
+            return execute(statement, *args, **kwargs)
+
+        monkeypatch.setattr(db_session.session, 'execute', racing_execute)
+        increment_totals(SaleDailyRollup, key, {'quantity': 2, 'revenue': Decimal('100'), 'transaction_count': 1})
+        monkeypatch.undo()
+        db_session.session.commit()
+
+        rollup = SaleDailyRollup.query.one()
+        assert len(calls) == 3
+        assert rollup.quantity == 3
+        assert rollup.transaction_count == 2
+
+    def test_rebuild_matches_sales(self, db_session, admin_user, staff_user, sample_medicine, make_sale):
+        """Test rebuild() recomputes rollup rows from the sale table"""
+        make_sale(admin_user, sample_medicine, 4)
+        make_sale(staff_user, sample_medicine, 1)
+        make_sale(staff_user, sample_medicine, 2)
+        db_session.session.commit()
+
+        assert SaleDailyRollup.rebuild() == 2
+        db_session.session.commit()
+
+        staff_rollup = SaleDailyRollup.query.filter_by(user_id=staff_user.user_id).one()
+        assert staff_rollup.day == Sale.query.first().sale_date.date()
+        assert staff_rollup.quantity == 3
+        assert staff_rollup.revenue == Decimal('150.00')
+        assert staff_rollup.transaction_count == 2
+
+    def test_backfill_fills_empty_rollup_once(self, db_session, admin_user, sample_medicine, make_sale):
+        """Test backfill() rebuilds an empty rollup from existing sales and then leaves it alone"""
+        make_sale(admin_user, sample_medicine, 4)
+        db_session.session.commit()
+
+        assert SaleDailyRollup.backfill() == 1
+        db_session.session.commit()
+        assert SaleDailyRollup.query.one().quantity == 4
+        assert SaleDailyRollup.backfill() == 0
+
+
+class TestSaleUserDailyCounterModel:
+    """Test cases for SaleUserDailyCounter model"""
+
+    def test_add_sale_accumulates_per_user(self, db_session, admin_user, staff_user, sample_medicine, make_sale):
+        """Test add_sale() keeps one counter per seller and day"""
+        for user, quantity in ((staff_user, 2), (staff_user, 1), (admin_user, 4)):
+            SaleUserDailyCounter.add_sale(make_sale(user, sample_medicine, quantity))
+        db_session.session.commit()
+
+        day = Sale.query.first().sale_date.date()
+        assert SaleUserDailyCounter.totals_for(staff_user.user_id, day) == (2, Decimal('150.00'))
+        assert SaleUserDailyCounter.totals_for(admin_user.user_id, day) == (1, Decimal('200.00'))
+        assert SaleUserDailyCounter.totals_for(staff_user.user_id, day - timedelta(days=1)) == (0, 0)
+
+    def test_rebuild_matches_sales(self, db_session, admin_user, staff_user, sample_medicine, make_sale):
+        """Test rebuild() recomputes counters from the sale table"""
+        make_sale(admin_user, sample_medicine, 4)
+        make_sale(staff_user, sample_medicine, 1)
+        make_sale(staff_user, sample_medicine, 2)
+        db_session.session.commit()
+
+        assert SaleUserDailyCounter.rebuild() == 2
+        db_session.session.commit()
+
+        day = Sale.query.first().sale_date.date()
+        assert SaleUserDailyCounter.totals_for(staff_user.user_id, day) == (2, Decimal('150.00'))
+
+    def test_backfill_fills_empty_counters_once(self, db_session, staff_user, sample_medicine, make_sale):
+        """Test backfill() rebuilds empty counters from existing sales and then leaves them alone"""
+        make_sale(staff_user, sample_medicine, 3)
+        db_session.session.commit()
+
+        assert SaleUserDailyCounter.backfill() == 1
+        db_session.session.commit()
+        assert SaleUserDailyCounter.total_transactions(staff_user.user_id) == 1
+        assert SaleUserDailyCounter.backfill() == 0
@@ -1,8 +1,26 @@
 """
 Unit tests for Flask routes
 """
+import gzip
+import io
+import time
+from datetime import datetime
+import numpy as np
 import pytest
 from flask import url_for
+from models import db
+from models.medicine import Medicine, AlternativeMedicine
+from models.sale import Sale, SaleDailyRollup, SaleUserDailyCounter
+from routes import sales as sales_routes
+from utils.alternatives import alternatives_graph
+from utils.cache import barcode_cache, dashboard_cache, report_cache, filter_options_cache
+from utils.catalog import catalog_snapshot, catalog_changed
+from utils.forecasting import last_complete_month
+from utils.insights import insights_snapshot
+from utils.reports import ReportFilters
+from utils import sales_export
+from utils.sales_export import EXPORT_FORMATS, export_query, write_columnar
+from utils.export_jobs import export_jobs
 
 
 class TestAuthRoutes:
@@ -60,3 +78,594 @@ class TestAdminRoutes:
         response = client.get('/admin/predictive-insights')
         # Should redirect to login
         assert response.status_code == 302
+
+
+class TestPredictiveInsightsSnapshot:
+    """Test cases for the snapshot-backed predictive insights page"""
+
+    def test_page_serves_latest_snapshot(self, authenticated_admin_client, sample_medicine):
+        """Test repeat loads reuse the snapshot until it is recomputed"""
+        response = authenticated_admin_client.get('/admin/predictive-insights')
+        assert response.status_code == 200
+        assert b'Recompute now' in response.data
+        _, computed_at = insights_snapshot.get()
+
+        authenticated_admin_client.get('/admin/predictive-insights')
+        assert insights_snapshot.get()[1] == computed_at
+
+        response = authenticated_admin_client.post('/admin/predictive-insights/recompute', follow_redirects=True)
+        assert response.status_code == 200
+        assert b'Predictive insights recomputed.' in response.data
+        assert insights_snapshot.get()[1] > computed_at
+
+    def test_recompute_requires_admin(self, authenticated_staff_client):
+        """Test staff cannot trigger a recompute"""
+        response = authenticated_staff_client.post('/admin/predictive-insights/recompute')
+        assert response.status_code in (302, 403)
+
+
+class TestMedicineForecastApi:
+    """Test cases for the per-medicine forecast endpoint"""
+
+    def test_forecast_endpoint(self, authenticated_admin_client, db_session, sample_medicine):
+        """Test the forecast endpoint returns history and forecast months"""
+        authenticated_admin_client.post('/sell/barcode', json={
+            'barcode': sample_medicine.barcode,
+            'quantity': 4
+        })
+        # History ends with the last complete month, so date the sale there
+        Sale.query.one().sale_date = datetime.combine(last_complete_month(), datetime.min.time())
+        db_session.session.commit()
+        SaleDailyRollup.rebuild()
+        db_session.session.commit()
+
+        response = authenticated_admin_client.get(f'/admin/api/forecast/{sample_medicine.medicine_id}?months=2')
+        assert response.status_code == 200
+
+        data = response.get_json()
+        assert data['name'] == 'Test Medicine'
+        assert data['history'][-1][1] == 4
+        assert len(data['forecast']) == 2
+
+
+class TestReportExport:
+    """Test cases for the streaming sales report export"""
+
+    def test_export_streams_rows_and_summary(self, authenticated_admin_client, sample_medicine):
+        """Test the CSV export streams every sale with its season and running totals"""
+        for quantity in (2, 3):
+            authenticated_admin_client.post('/sell/barcode', json={
+                'barcode': sample_medicine.barcode,
+                'quantity': quantity
+            })
+
+        response = authenticated_admin_client.get('/admin/reports/export')
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == 'text/csv'
+
+        lines = response.get_data(as_text=True).splitlines()
+        assert lines[0].startswith('Sale ID,Date,Time')
+        assert len([line for line in lines[1:] if line.split(',')[0].isdigit()]) == 2
+        season = Sale.query.first().get_season()
+        assert all(line.endswith(season) for line in lines[1:3])
+        assert 'Total Transactions,2' in lines
+        assert 'Total Quantity Sold,5' in lines
+        assert 'Total Revenue,₹250.00' in lines
+        assert 'Average Transaction Value,₹125.00' in lines
+
+    def test_raw_gzip_csv_export(self, authenticated_admin_client, sample_medicine):
+        """Test format=csv.gz streams compressed CSV with plain numeric columns"""
+        authenticated_admin_client.post('/sell/barcode', json={'barcode': sample_medicine.barcode, 'quantity': 2})
+
+        response = authenticated_admin_client.get('/admin/reports/export?format=csv.gz')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/gzip'
+
+        lines = gzip.decompress(response.data).decode('utf-8').splitlines()
+        assert lines[0].split(',')[:2] == ['sale_id', 'sale_date']
+        assert lines[1].split(',')[5:8] == ['2', '50.00', '100.00']
+        assert len(lines) == 2
+
+    def test_columnar_export(self, authenticated_admin_client, sample_medicine):
+        """Test format=npz returns one typed array per column"""
+        for quantity in (2, 3):
+            authenticated_admin_client.post('/sell/barcode', json={'barcode': sample_medicine.barcode, 'quantity': quantity})
+
+        response = authenticated_admin_client.get('/admin/reports/export?format=npz')
+        assert response.status_code == 200
+
+        with np.load(io.BytesIO(response.data)) as data:
+            assert sorted(data['quantity_sold'].tolist()) == [2, 3]
+            assert data['total_price'].dtype == np.float64
+            assert data['total_price'].sum() == 250.0
+            assert data['sale_date'].dtype.kind == 'M'
+            assert set(data['medicine_name']) == {'Test Medicine'}
+
+    def test_npz_export_joins_batches_of_different_widths(self, app, db_session, admin_user, sample_medicine,
+                                                          low_stock_medicine, make_sale):
+        """Test the spooled .npz export keeps every row and the widest string of each column"""
+        make_sale(admin_user, low_stock_medicine, 4)
+        make_sale(admin_user, sample_medicine, 2)
+        db_session.session.commit()
+
+        buffer = io.BytesIO()
+        filters, _ = ReportFilters.from_args({})
+        write_columnar(export_query(filters), buffer, EXPORT_FORMATS['npz'], batch_size=1)
+
+        buffer.seek(0)
+        with np.load(buffer) as data:
+            assert data['medicine_name'].tolist() == ['Test Medicine', 'Low Stock Medicine']
+            assert data['quantity_sold'].tolist() == [2, 4]
+
+    def test_unknown_format_is_rejected(self, authenticated_admin_client):
+        """Test an unknown export format returns 400"""
+        response = authenticated_admin_client.get('/admin/reports/export?format=xlsx')
+        assert response.status_code == 400
+
+
+    def test_parquet_export(self, authenticated_admin_client, sample_medicine):
+        """Test format=parquet returns one typed column per field"""
+        pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+        for quantity in (2, 3):
+            authenticated_admin_client.post('/sell/barcode', json={'barcode': sample_medicine.barcode, 'quantity': quantity})
+
+        response = authenticated_admin_client.get('/admin/reports/export?format=parquet')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/vnd.apache.parquet'
+
+        table = pyarrow_parquet.read_table(io.BytesIO(response.data))
+        assert sorted(table.column('quantity_sold').to_pylist()) == [2, 3]
+        assert sum(table.column('total_price').to_pylist()) == 250.0
+        assert set(table.column('medicine_name').to_pylist()) == {'Test Medicine'}
+
+    def test_parquet_falls_back_to_npz_without_pyarrow(self, authenticated_admin_client, sample_medicine, monkeypatch):
+        """Test format=parquet serves .npz when pyarrow is not installed"""
+        monkeypatch.setattr(sales_export, 'pyarrow', None)
+        authenticated_admin_client.post('/sell/barcode', json={'barcode': sample_medicine.barcode, 'quantity': 2})
+
+        response = authenticated_admin_client.get('/admin/reports/export?format=parquet')
+        assert response.status_code == 200
+
+        with np.load(io.BytesIO(response.data)) as data:
+            assert data['quantity_sold'].tolist() == [2]
+
+
+class TestSalesHistory:
+    """Test cases for the keyset-paginated sales history"""
+
+    def test_history_pages_with_cursors(self, authenticated_staff_client, sample_medicine):
+        """Test history shows the newest sales with a next-page cursor and the counter total"""
+        for _ in range(21):
+            authenticated_staff_client.post('/sell/barcode', json={
+                'barcode': sample_medicine.barcode,
+                'quantity': 1
+            })
+
+        response = authenticated_staff_client.get('/history')
+        html = response.get_data(as_text=True)
+        assert response.status_code == 200
+        assert 'Showing 20 of 21 sales' in html
+        assert '/history?after=' in html
+
+        response = authenticated_staff_client.get('/history?after=bogus', follow_redirects=True)
+        assert 'Invalid page link' in response.get_data(as_text=True)
+
+
+class TestReportFilterOptions:
+    """Test cases for the lazily loaded report filter options"""
+
+    def test_options_are_searchable_and_cached(self, authenticated_admin_client, sample_medicine, low_stock_medicine):
+        """Test option endpoints search labels and are invalidated by catalog changes"""
+        response = authenticated_admin_client.get('/admin/api/report-filters/medicines?q=test')
+        assert response.status_code == 200
+        labels = [option['label'] for option in response.get_json()['options']]
+        assert 'Test Medicine' in labels
+        assert all('test' in label.lower() for label in labels)
+
+        data = authenticated_admin_client.get('/admin/api/report-filters/categories?limit=1').get_json()
+        assert len(data['options']) == 1
+        assert data['has_more'] is True
+
+        users = authenticated_admin_client.get('/admin/api/report-filters/users').get_json()['options']
+        assert 'admin_test' in [option['label'] for option in users]
+
+        # Renaming a medicine through the catalog hub refreshes the cached options
+        sample_medicine.name = 'Renamed Medicine'
+        db.session.commit()
+        catalog_changed(sample_medicine.barcode)
+        data = authenticated_admin_client.get('/admin/api/report-filters/medicines?q=renamed').get_json()
+        assert [option['label'] for option in data['options']] == ['Renamed Medicine']
+
+        assert authenticated_admin_client.get('/admin/api/report-filters/passwords').status_code == 404
+
+    def test_reports_page_labels_only_selected_options(self, authenticated_admin_client, sample_medicine, low_stock_medicine):
+        """Test the reports page renders the selected filter option without the full lists"""
+        response = authenticated_admin_client.get(f'/admin/reports?medicine_id={sample_medicine.medicine_id}')
+        html = response.get_data(as_text=True)
+        assert response.status_code == 200
+        assert f'<option value="{sample_medicine.medicine_id}" selected>Test Medicine</option>' in html
+        assert low_stock_medicine.name not in html
+        assert filter_options_cache.misses == 0
+
+    def test_sales_keep_cached_options(self, authenticated_admin_client, sample_medicine):
+        """Test recording a sale does not reload the filter options"""
+        authenticated_admin_client.get('/admin/api/report-filters/medicines')
+        misses = filter_options_cache.misses
+
+        authenticated_admin_client.post('/sell/barcode', json={'barcode': sample_medicine.barcode, 'quantity': 1})
+        authenticated_admin_client.get('/admin/api/report-filters/medicines')
+        assert filter_options_cache.misses == misses
+
+
+class TestBackgroundExport:
+    """Test cases for background export jobs"""
+
+    def test_export_job_writes_compressed_file(self, authenticated_admin_client, sample_medicine, tmp_path, monkeypatch):
+        """Test an export job runs in the background, reports progress and serves a gzip download"""
+        monkeypatch.setattr(export_jobs, 'directory', str(tmp_path))
+        authenticated_admin_client.post('/sell/barcode', json={'barcode': sample_medicine.barcode, 'quantity': 2})
+
+        response = authenticated_admin_client.post('/admin/reports/exports?category=Fever')
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        # Wait on the job directly so the worker has the test database to itself
+        deadline = time.monotonic() + 10
+        while not export_jobs.get(job_id).finished and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        status = authenticated_admin_client.get(response.get_json()['status_url']).get_json()
+        assert status['status'] == 'done'
+        assert status['total_rows'] == 1
+        assert status['progress'] == 1.0
+        assert status['filters']['category'] == 'Fever'
+
+        download = authenticated_admin_client.get(status['download_url'])
+        assert download.status_code == 200
+        lines = gzip.decompress(download.data).decode('utf-8').splitlines()
+        assert lines[0].startswith('Sale ID,Date,Time')
+        assert 'Total Transactions,1' in lines
+
+        monkeypatch.setattr(export_jobs, 'retention', -1)
+        assert export_jobs.cleanup() == 1
+        assert list(tmp_path.iterdir()) == []
+        assert authenticated_admin_client.get(status['status_url']).status_code == 404
+
+
+class TestReportCache:
+    """Test cases for the sales report result cache"""
+
+    def sell(self, client, medicine, quantity=1):
+        client.post('/sell/barcode', json={'barcode': medicine.barcode, 'quantity': quantity})
+
+    def test_sales_invalidate_only_reports_that_include_them(self, authenticated_admin_client, sample_medicine):
+        """Test a sale refreshes open-ended reports but not reports of past dates"""
+        self.sell(authenticated_admin_client, sample_medicine)
+
+        authenticated_admin_client.get('/admin/reports')
+        authenticated_admin_client.get('/admin/reports?end_date=2020-01-31')
+        misses = report_cache.misses
+
+        # Same filters spelled differently are served from the cache
+        authenticated_admin_client.get('/admin/reports?category=&medicine_id=&user_id=')
+        assert report_cache.misses == misses
+
+        self.sell(authenticated_admin_client, sample_medicine, quantity=2)
+
+        authenticated_admin_client.get('/admin/reports?end_date=2020-01-31')
+        assert report_cache.misses == misses
+
+        response = authenticated_admin_client.get('/admin/reports')
+        assert report_cache.misses == misses + 2
+        assert '₹150.00' in response.get_data(as_text=True)
+
+    def test_medicine_edit_invalidates_reports_showing_it(self, authenticated_admin_client, sample_medicine):
+        """Test renaming a medicine refreshes reports that may show it and keeps the others"""
+        self.sell(authenticated_admin_client, sample_medicine)
+        authenticated_admin_client.get('/admin/reports')
+        other_medicine = f'/admin/reports?medicine_id={sample_medicine.medicine_id + 1}'
+        authenticated_admin_client.get(other_medicine)
+        misses = report_cache.misses
+
+        response = authenticated_admin_client.post(f'/medicines/edit/{sample_medicine.medicine_id}', data={
+            'name': 'Renamed Medicine',
+            'manufacturer': sample_medicine.manufacturer,
+            'category': sample_medicine.category,
+            'quantity': sample_medicine.quantity,
+            'price': '50.00',
+            'expiry_date': sample_medicine.expiry_date.isoformat(),
+            'stock': 99,
+            'reorder_level': sample_medicine.reorder_level,
+            'barcode': sample_medicine.barcode
+        })
+        assert response.status_code == 302
+
+        authenticated_admin_client.get(other_medicine)
+        assert report_cache.misses == misses
+
+        response = authenticated_admin_client.get('/admin/reports')
+        assert report_cache.misses == misses + 2
+        assert 'Renamed Medicine' in response.get_data(as_text=True)
+
+
+class TestDashboardCache:
+    """Test cases for the cached admin dashboard"""
+
+    def test_repeat_loads_are_served_from_cache(self, authenticated_admin_client, sample_medicine):
+        """Test a second dashboard load recomputes nothing"""
+        assert authenticated_admin_client.get('/admin/dashboard').status_code == 200
+        misses = dashboard_cache.misses
+
+        assert authenticated_admin_client.get('/admin/dashboard').status_code == 200
+        assert dashboard_cache.misses == misses
+        assert dashboard_cache.hits == misses
+
+    def test_sale_invalidates_dashboard(self, authenticated_admin_client, sample_medicine):
+        """Test a recorded sale shows up on the next dashboard load"""
+        response = authenticated_admin_client.get('/admin/dashboard')
+        assert b'\xe2\x82\xb9500.00' not in response.data
+
+        authenticated_admin_client.post('/sell/barcode', json={
+            'barcode': sample_medicine.barcode,
+            'quantity': 10
+        })
+
+        response = authenticated_admin_client.get('/admin/dashboard')
+        assert b'\xe2\x82\xb9500.00' in response.data
+        assert b'Test Medicine' in response.data
+
+
+class TestCartCheckout:
+    """Test cases for multi-item cart checkout"""
+
+    def test_cart_checkout_records_all_lines(self, authenticated_staff_client, sample_medicine, low_stock_medicine):
+        """Test cart checkout sells every line and returns a combined receipt"""
+        response = authenticated_staff_client.post('/sell/cart', json={
+            'lines': [
+                {'barcode': sample_medicine.barcode, 'quantity': 2},
+                {'barcode': low_stock_medicine.barcode, 'quantity': 1},
+                {'barcode': sample_medicine.barcode, 'quantity': 3}
+            ]
+        })
+        assert response.status_code == 200
+
+        data = response.get_json()
+        assert data['success'] is True
+        assert len(data['lines']) == 2
+        assert data['lines'][0]['quantity'] == 5
+        assert data['lines'][0]['remaining_stock'] == 95
+        assert data['receipt']['total_quantity'] == 6
+        assert data['receipt']['total_amount'] == 275.0
+        assert Sale.query.count() == 2
+
+    def test_cart_checkout_updates_daily_rollup(self, authenticated_staff_client, staff_user, sample_medicine):
+        """Test cart sales are added to the daily rollup in the same commit"""
+        authenticated_staff_client.post('/sell/cart', json={
+            'lines': [{'barcode': sample_medicine.barcode, 'quantity': 2}]
+        })
+        authenticated_staff_client.post('/sell/barcode', json={
+            'barcode': sample_medicine.barcode,
+            'quantity': 3
+        })
+
+        rollup = SaleDailyRollup.query.one()
+        assert rollup.user_id == staff_user.user_id
+        assert rollup.quantity == 5
+        assert rollup.transaction_count == 2
+
+    def test_checkout_updates_staff_dashboard_counters(self, authenticated_staff_client, staff_user, sample_medicine):
+        """Test both sale paths update the seller's counter shown on the staff dashboard"""
+        authenticated_staff_client.post('/sell/cart', json={
+            'lines': [{'barcode': sample_medicine.barcode, 'quantity': 2}]
+        })
+        authenticated_staff_client.post('/sell/barcode', json={
+            'barcode': sample_medicine.barcode,
+            'quantity': 3
+        })
+
+        counter = SaleUserDailyCounter.query.one()
+        assert counter.user_id == staff_user.user_id
+        assert counter.transaction_count == 2
+
+        response = authenticated_staff_client.get('/admin/staff/dashboard')
+        assert response.status_code == 200
+        assert '₹250.00' in response.get_data(as_text=True)
+
+    def test_cart_checkout_is_all_or_nothing(self, authenticated_staff_client, sample_medicine, low_stock_medicine):
+        """Test a single failing line rejects the whole cart"""
+        response = authenticated_staff_client.post('/sell/cart', json={
+            'lines': [
+                {'barcode': sample_medicine.barcode, 'quantity': 2},
+                {'barcode': low_stock_medicine.barcode, 'quantity': 50}
+            ]
+        })
+        assert response.status_code == 400
+
+        data = response.get_json()
+        assert data['success'] is False
+        assert 'error' not in data['lines'][0]
+        assert data['lines'][1]['available_stock'] == 5
+        assert Sale.query.count() == 0
+        assert Medicine.query.get(sample_medicine.medicine_id).stock == 100
+
+
+class TestBarcodeLookupCache:
+    """Test cases for the cached barcode lookup API"""
+
+    def test_sale_invalidates_cached_payload(self, authenticated_staff_client, sample_medicine):
+        """Test a sale refreshes the cached stock for its barcode"""
+        url = f'/medicines/api/barcode/{sample_medicine.barcode}'
+        assert authenticated_staff_client.get(url).get_json()['stock'] == 100
+        assert authenticated_staff_client.get(url).get_json()['stock'] == 100
+        assert barcode_cache.stats()['hits'] == 1
+
+        authenticated_staff_client.post('/sell/barcode', json={
+            'barcode': sample_medicine.barcode,
+            'quantity': 4
+        })
+
+        assert authenticated_staff_client.get(url).get_json()['stock'] == 96
+
+
+class TestIdempotentBarcodeSale:
+    """Test cases for idempotency keys on barcode sales"""
+
+    def test_retry_with_same_key_replays_sale(self, authenticated_staff_client, sample_medicine):
+        """Test a retried request returns the original sale without selling again"""
+        headers = {'Idempotency-Key': 'till-1-retry-test'}
+        payload = {'barcode': sample_medicine.barcode, 'quantity': 3}
+
+        first = authenticated_staff_client.post('/sell/barcode', json=payload, headers=headers)
+        second = authenticated_staff_client.post('/sell/barcode', json=payload, headers=headers)
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert second.headers.get('Idempotent-Replayed') == 'true'
+        assert second.get_json()['sale_id'] == first.get_json()['sale_id']
+        assert Sale.query.count() == 1
+        assert Medicine.query.get(sample_medicine.medicine_id).stock == 97
+
+    def test_purge_interval_restarts_only_on_commit(self, app, db_session, monkeypatch):
+        """Test a purge that is rolled back does not postpone the next one"""
+        monkeypatch.setattr(sales_routes, '_last_idempotency_purge', 0.0)
+
+        sales_routes.purge_idempotency_keys()
+        db_session.session.rollback()
+        assert sales_routes._last_idempotency_purge == 0.0
+
+        sales_routes.purge_idempotency_keys()
+        db_session.session.commit()
+        assert sales_routes._last_idempotency_purge > 0.0
+
+
+class TestScanAndSell:
+    """Test cases for the single round-trip scan-and-sell endpoint"""
+
+    def test_scan_and_sell_returns_medicine_and_stock(self, authenticated_staff_client, sample_medicine):
+        """Test one request records the sale and returns the medicine details"""
+        response = authenticated_staff_client.post('/scan/sell', json={
+            'barcode': sample_medicine.barcode,
+            'quantity': 2
+        })
+        assert response.status_code == 200
+
+        data = response.get_json()
+        assert data['success'] is True
+        assert data['medicine']['name'] == 'Test Medicine'
+        assert data['remaining_stock'] == 98
+        assert data['alternatives'] == []
+        assert Sale.query.count() == 1
+
+    def test_scan_and_sell_rejects_expired(self, authenticated_staff_client, expired_medicine):
+        """Test an expired medicine is not sold and its details are still returned"""
+        response = authenticated_staff_client.post('/scan/sell', json={
+            'barcode': expired_medicine.barcode
+        })
+        assert response.status_code == 400
+        assert response.get_json()['medicine']['is_expired'] is True
+        assert Sale.query.count() == 0
+
+    def test_scan_page_sells_on_scan_by_default(self, authenticated_staff_client):
+        """Test the scan page records sales in one request unless switched off"""
+        response = authenticated_staff_client.get('/scan')
+        assert response.status_code == 200
+        assert b'id="quick-sell-toggle" checked' in response.data
+        assert b'id="scan-quantity"' in response.data
+
+
+class TestSellPageCatalog:
+    """Test cases for the sell page backed by the catalog snapshot"""
+
+    def test_sale_refreshes_catalog_snapshot(self, authenticated_staff_client, sample_medicine, expired_medicine):
+        """Test the snapshot excludes unsellable medicines and picks up stock changes"""
+        response = authenticated_staff_client.get('/sell')
+        assert response.status_code == 200
+        assert catalog_snapshot.get(expired_medicine.medicine_id) is None
+        assert catalog_snapshot.get(sample_medicine.medicine_id).stock == 100
+
+        version = catalog_snapshot.version
+        response = authenticated_staff_client.post('/sell', data={
+            'medicine_id': sample_medicine.medicine_id,
+            'quantity': 7
+        })
+        assert response.status_code == 302
+        assert catalog_snapshot.version == version
+        assert catalog_snapshot.get(sample_medicine.medicine_id).stock == 93
+
+    def test_selling_out_rebuilds_catalog_snapshot(self, authenticated_staff_client, sample_medicine):
+        """Test a sale that empties the stock drops the medicine from the snapshot"""
+        assert catalog_snapshot.get(sample_medicine.medicine_id).stock == 100
+
+        version = catalog_snapshot.version
+        authenticated_staff_client.post('/scan/sell', json={'barcode': sample_medicine.barcode, 'quantity': 100})
+        assert catalog_snapshot.version > version
+        assert catalog_snapshot.get(sample_medicine.medicine_id) is None
+
+
+class TestMedicineSearchApi:
+    """Test cases for the typeahead search API"""
+
+    def test_search_matches_prefixes(self, authenticated_staff_client, sample_medicine, low_stock_medicine, expired_medicine):
+        """Test prefix search over name, manufacturer and barcode skips unsellable medicines"""
+        data = authenticated_staff_client.get('/medicines/api/search?q=low').get_json()
+        assert [r['name'] for r in data['results']] == ['Low Stock Medicine']
+
+        data = authenticated_staff_client.get('/medicines/api/search?q=test+manu').get_json()
+        assert data['total'] == 2
+
+        data = authenticated_staff_client.get('/medicines/api/search?q=123456789012').get_json()
+        assert data['total'] == 2
+        assert expired_medicine.medicine_id not in [r['medicine_id'] for r in data['results']]
+
+    def test_search_paginates(self, authenticated_staff_client, sample_medicine, low_stock_medicine):
+        """Test results are paginated"""
+        data = authenticated_staff_client.get('/medicines/api/search?per_page=1').get_json()
+        assert len(data['results']) == 1
+        assert data['has_next'] is True
+
+    def test_sell_page_renders_search_markup(self, authenticated_staff_client, sample_medicine):
+        """Test the sell page has the search box, results table and load-more button the script uses"""
+        response = authenticated_staff_client.get('/sell')
+        assert response.status_code == 200
+        html = response.get_data(as_text=True)
+        assert 'id="medicine-search"' in html
+        assert '<tbody id="medicine-results">' in html
+        assert 'id="no-results"' in html
+        assert 'id="load-more-btn"' in html
+
+
+class TestAlternativesGraph:
+    """Test cases for alternative suggestions from the in-memory graph"""
+
+    def test_out_of_stock_scan_suggests_available_alternatives(self, authenticated_staff_client, db_session,
+                                                               low_stock_medicine, sample_medicine, expired_medicine):
+        """Test suggestions skip expired targets and follow stock changes"""
+        db_session.session.add_all([
+            AlternativeMedicine(primary_medicine_id=low_stock_medicine.medicine_id,
+                                alternative_medicine_id=sample_medicine.medicine_id, priority=5),
+            AlternativeMedicine(primary_medicine_id=low_stock_medicine.medicine_id,
+                                alternative_medicine_id=expired_medicine.medicine_id, priority=9)
+        ])
+        db_session.session.commit()
+
+        response = authenticated_staff_client.post('/scan/sell', json={
+            'barcode': low_stock_medicine.barcode,
+            'quantity': 10
+        })
+        alternatives = response.get_json()['alternatives']
+        assert [alt['id'] for alt in alternatives] == [sample_medicine.medicine_id]
+        assert alternatives[0]['stock'] == 100
+
+        built_key = alternatives_graph._built_key
+        authenticated_staff_client.post('/scan/sell', json={'barcode': sample_medicine.barcode, 'quantity': 30})
+        assert alternatives_graph.available(low_stock_medicine.medicine_id)[0].medicine.stock == 70
+        assert alternatives_graph._built_key == built_key
+
+        authenticated_staff_client.post('/scan/sell', json={'barcode': sample_medicine.barcode, 'quantity': 70})
+
+        response = authenticated_staff_client.post('/scan/sell', json={
+            'barcode': low_stock_medicine.barcode,
+            'quantity': 10
+        })
+        assert response.get_json()['alternatives'] == []
@@ -0,0 +1,482 @@
+"""
+Unit tests for utility modules
+"""
+import time
+import pytest
+import numpy as np
+from datetime import date, datetime, timedelta
+from flask import Flask
+from models.medicine import Medicine
+from models.sale import Sale, SaleDailyRollup
+from utils.cache import LRUCache, BlockCache
+from utils import analytics, forecasting
+from utils.insights import InsightsSnapshot
+from utils.parallel import AnalyticsRunner, AnalyticsTaskError, check_cancelled
+from utils.pagination import keyset_paginate, keyset_batches, encode_cursor, decode_cursor
+from utils.reports import ReportFilters, SaleStamp
+from utils.rolling import rolling_sum, rolling_mean, rolling_std, ewma, moving_average_forecast
+from utils.time_buckets import month_buckets, week_buckets, day_buckets, bucket_label, range_filter
+from utils.forecasting import (
+    SeasonalForecaster, month_labels, build_demand_matrix, forecast_medicine, last_complete_month
+)
+
+
+class TestLRUCache:
+    """Test cases for the in-process LRU cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test the least recently used entry is evicted when full"""
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+        assert cache.stats()['evictions'] == 1
+
+    def test_expired_entries_are_misses(self):
+        """Test entries older than the TTL are not returned"""
+        cache = LRUCache(maxsize=10, ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+
+        assert cache.get('a') is None
+        stats = cache.stats()
+        assert stats['hits'] == 0
+        assert stats['misses'] == 1
+
+
+class TestBlockCache:
+    """Test cases for the tag-invalidated block cache"""
+
+    def test_invalidation_only_recomputes_tagged_blocks(self):
+        """Test invalidating a tag recomputes only the blocks that depend on it"""
+        cache = BlockCache(ttl=60)
+        calls = []
+
+        def compute(name):
+            return lambda: calls.append(name) or name
+
+        cache.get('sales', compute('sales'), ('sales',))
+        cache.get('stock', compute('stock'), ('catalog',))
+        cache.invalidate('sales')
+        block = cache.get('sales', compute('sales'), ('sales',))
+        cache.get('stock', compute('stock'), ('catalog',))
+
+        assert calls == ['sales', 'stock', 'sales']
+        assert block.value == 'sales'
+        assert block.computed_at is not None
+
+    def test_expired_blocks_are_recomputed(self):
+        """Test blocks older than the TTL are recomputed"""
+        cache = BlockCache(ttl=0.01)
+        calls = []
+
+        cache.get('block', lambda: calls.append(1))
+        time.sleep(0.02)
+        cache.get('block', lambda: calls.append(1))
+
+        assert len(calls) == 2
+
+
+class TestSeasonalTotals:
+    """Test cases for database-side seasonal aggregation"""
+
+    def test_seasonal_trends_match_per_sale_seasons(self, db_session, admin_user, sample_medicine, make_sale):
+        """Test grouped seasonal totals equal summing get_season() over every sale"""
+        for month, quantity in [(1, 2), (2, 1), (4, 3), (7, 5), (10, 1), (12, 4)]:
+            make_sale(admin_user, sample_medicine, quantity, sale_date=datetime(2024, month, 10, 12, 0))
+        db_session.session.commit()
+        SaleDailyRollup.rebuild()
+        db_session.session.commit()
+
+        expected = {}
+        for sale in Sale.query.all():
+            totals = expected.setdefault(sale.get_season(), [0.0, 0, 0])
+            totals[0] += float(sale.total_price)
+            totals[1] += sale.quantity_sold
+            totals[2] += 1
+
+        trends = analytics.get_seasonal_trends()
+        for season, (total_sales, total_quantity, count) in expected.items():
+            assert trends['seasonal_data'][season]['total_sales'] == total_sales
+            assert trends['seasonal_data'][season]['total_quantity'] == total_quantity
+            assert trends['seasonal_data'][season]['transaction_count'] == count
+        assert trends['highest_season'] == 'Winter'
+        assert trends['lowest_season'] == 'Monsoon'
+
+
+class TestSalesVelocity:
+    """Test cases for velocity-based stock predictions and reorder recommendations"""
+
+    def test_predictions_and_recommendations(self, db_session, admin_user, sample_medicine, low_stock_medicine,
+                                             make_sale):
+        """Test stockout predictions and reorder quantities from 30-day velocity"""
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        make_sale(admin_user, sample_medicine, 150, sale_date=yesterday)
+        make_sale(admin_user, low_stock_medicine, 30, sale_date=yesterday)
+        make_sale(admin_user, low_stock_medicine, 500, sale_date=datetime.utcnow() - timedelta(days=40))
+        db_session.session.commit()
+
+        predictions = analytics.get_stock_predictions()
+        assert [p['medicine'].name for p in predictions] == ['Low Stock Medicine', 'Test Medicine']
+        assert predictions[0]['days_until_stockout'] == 5
+        assert predictions[0]['urgency'] == 'high'
+        assert predictions[1]['daily_avg_sales'] == 5.0
+        assert predictions[1]['days_until_stockout'] == 20
+        assert predictions[1]['urgency'] == 'low'
+
+        recommendations = analytics.get_reorder_recommendations()
+        assert len(recommendations) == 1
+        assert recommendations[0]['medicine'].name == 'Test Medicine'
+        assert recommendations[0]['safety_stock'] == 150
+        assert recommendations[0]['recommended_order_quantity'] == 125
+
+
+class TestInsightsSnapshot:
+    """Test cases for the persisted predictive insights snapshot"""
+
+    def test_snapshot_survives_restart(self, app, db_session, admin_user, sample_medicine, tmp_path):
+        """Test a saved snapshot is loaded by a fresh instance without recomputing"""
+        app.config['INSIGHTS_SNAPSHOT_PATH'] = str(tmp_path / 'insights.json')
+        try:
+            snapshot = InsightsSnapshot()
+            snapshot.init_app(app)
+            payload, computed_at = snapshot.compute()
+
+            restarted = InsightsSnapshot()
+            restarted.init_app(app)
+            assert restarted.get() == (payload, computed_at)
+            assert [p.name for p in tmp_path.iterdir()] == ['insights.json']
+        finally:
+            app.config['INSIGHTS_SNAPSHOT_PATH'] = None
+
+    def test_sales_trigger_background_refresh(self, app, db_session):
+        """Test enough new sales start a refresh"""
+        snapshot = InsightsSnapshot()
+        snapshot.init_app(app)
+        snapshot.refresh_after_sales = 3
+        started = []
+        snapshot.refresh_async = lambda: started.append(True)
+
+        snapshot.sales_recorded(2)
+        assert started == []
+        snapshot.sales_recorded(1)
+        assert started == [True]
+
+    def test_scheduler_starts_with_first_request(self):
+        """Test the scheduler thread is not started by creating the app, only by serving it"""
+        flask_app = Flask(__name__)
+        flask_app.config.update(INSIGHTS_SCHEDULER=True, INSIGHTS_REFRESH_INTERVAL=3600)
+        flask_app.add_url_rule('/', 'index', lambda: 'ok')
+        snapshot = InsightsSnapshot()
+        snapshot.init_app(flask_app)
+        try:
+            assert snapshot._scheduler is None
+            flask_app.test_client().get('/')
+            assert snapshot._scheduler.is_alive()
+        finally:
+            snapshot.stop()
+
+
+class TestSeasonalForecaster:
+    """Test cases for the vectorized per-SKU forecaster"""
+
+    def test_month_labels_cross_year_boundary(self):
+        """Test month labels roll over into the previous year"""
+        assert month_labels(datetime(2025, 2, 14), 4) == ['2024-11', '2024-12', '2025-01', '2025-02']
+
+    def test_forecasts_flat_and_seasonal_series(self):
+        """Test a flat series stays flat and a winter peak is forecast again"""
+        periods = month_labels(datetime(2025, 11, 1), 36)
+        months = np.array([int(p[5:7]) for p in periods])
+        flat = np.full(36, 10)
+        winter_peak = np.where(np.isin(months, [12, 1, 2]), 40, 10)
+
+        future, forecast = SeasonalForecaster().fit(np.vstack([flat, winter_peak]), periods).forecast(3)
+
+        assert future == ['2025-12', '2026-01', '2026-02']
+        np.testing.assert_allclose(forecast[0], 10)
+        assert (forecast[1] > 30).all()
+
+    def test_demand_matrix_and_medicine_forecast(self, db_session, admin_user, sample_medicine, make_sale):
+        """Test monthly demand is read from the rollup and forecast per medicine"""
+        sale = make_sale(admin_user, sample_medicine, 7,
+                         sale_date=datetime.combine(last_complete_month(), datetime.min.time()))
+        SaleDailyRollup.add_sale(sale)
+        db_session.session.commit()
+
+        demand = build_demand_matrix(months=12, end=sale.sale_date.date())
+        assert demand.medicine_ids.tolist() == [sample_medicine.medicine_id]
+        assert demand.values[0, -1] == 7
+        assert demand.values[0, :-1].sum() == 0
+
+        forecast = forecast_medicine(sample_medicine.medicine_id, months_ahead=2)
+        assert len(forecast['forecast']) == 2
+        assert forecast_medicine(sample_medicine.medicine_id + 1000) is None
+
+    def test_history_ends_at_last_complete_month(self, db_session, admin_user, sample_medicine, make_sale,
+                                                 monkeypatch):
+        """Test sales in the current, partial month are left out of the forecast history"""
+        class MidJune(date):
+            @classmethod
+            def today(cls):
+                return cls(2025, 6, 15)
+
+        monkeypatch.setattr(forecasting, 'date', MidJune)
+        for sale_date, quantity in [(datetime(2025, 5, 20), 9), (datetime(2025, 6, 10), 2)]:
+            make_sale(admin_user, sample_medicine, quantity, sale_date=sale_date)
+        db_session.session.commit()
+        SaleDailyRollup.rebuild()
+        db_session.session.commit()
+
+        forecast = forecast_medicine(sample_medicine.medicine_id, months_ahead=1)
+        assert forecast['history'][-1] == ('2025-05', 9)
+        assert sum(units for _, units in forecast['history']) == 9
+        assert forecast['forecast'][0][0] == '2025-06'
+
+
+class TestTimeBuckets:
+    """Test cases for calendar time buckets"""
+
+    def test_month_buckets_are_calendar_months(self):
+        """Test month buckets follow calendar boundaries, including leap February"""
+        buckets = month_buckets(3, end=datetime(2024, 3, 15))
+
+        assert [b.label for b in buckets] == ['2024-01', '2024-02', '2024-03']
+        assert buckets[1].start == datetime(2024, 2, 1)
+        assert buckets[1].end == datetime(2024, 3, 1)
+        assert buckets[-1].end == datetime(2024, 4, 1)
+
+    def test_week_and_day_buckets(self):
+        """Test ISO week and day buckets end with the period containing end"""
+        weeks = week_buckets(2, end=datetime(2024, 1, 3))
+        assert [w.label for w in weeks] == ['2023-W52', '2024-W01']
+        assert weeks[-1].start == datetime(2024, 1, 1)
+
+        days = day_buckets(2, end=datetime(2024, 3, 1))
+        assert [d.label for d in days] == ['2024-02-29', '2024-03-01']
+
+    def test_grouping_on_datetime_boundaries(self, db_session, admin_user, sample_medicine, make_sale):
+        """Test sales just either side of a month boundary land in the right bucket"""
+        from models import db
+
+        for sale_date in [datetime(2024, 1, 31, 23, 59, 59), datetime(2024, 2, 1, 0, 0), datetime(2023, 12, 31, 12, 0)]:
+            make_sale(admin_user, sample_medicine, sale_date=sale_date)
+        db_session.session.commit()
+
+        buckets = month_buckets(2, end=datetime(2024, 2, 10))
+        rows = db.session.query(
+            bucket_label(Sale.sale_date, buckets).label('month'),
+            db.func.count(Sale.sale_id)
+        ).filter(range_filter(Sale.sale_date, buckets)).group_by('month').order_by('month').all()
+
+        assert [tuple(row) for row in rows] == [('2024-01', 1), ('2024-02', 1)]
+
+
+class TestRollingStats:
+    """Test cases for array-based rolling-window statistics"""
+
+    def test_rolling_statistics_match_naive_windows(self):
+        """Test rolling sum, mean and std agree with per-window computation for many series"""
+        values = np.random.default_rng(0).uniform(0, 100, size=(5, 20))
+        window = 4
+
+        sums = rolling_sum(values, window)
+        means = rolling_mean(values, window)
+        stds = rolling_std(values, window)
+
+        assert np.isnan(sums[:, :window - 1]).all()
+        for i in range(window - 1, values.shape[1]):
+            chunk = values[:, i - window + 1:i + 1]
+            np.testing.assert_allclose(sums[:, i], chunk.sum(axis=1))
+            np.testing.assert_allclose(means[:, i], chunk.mean(axis=1))
+            np.testing.assert_allclose(stds[:, i], chunk.std(axis=1), atol=1e-9)
+
+    def test_ewma(self):
+        """Test the exponentially weighted average is seeded with the first value"""
+        np.testing.assert_allclose(ewma([10, 20, 20], alpha=0.5), [10, 15, 17.5])
+
+    def test_window_longer_than_series_is_all_nan(self):
+        """Test a window longer than the series gives no values instead of a shorter window"""
+        assert np.isnan(rolling_mean([1, 2], 3)).all()
+        with pytest.raises(ValueError):
+            rolling_sum([1, 2], 0)
+
+    def test_moving_average_forecast_feeds_back_predictions(self):
+        """Test each forecast is the mean of the window including earlier forecasts"""
+        np.testing.assert_allclose(moving_average_forecast([5, 10, 20, 30], 3, 3), [20, 70 / 3, 220 / 9])
+        np.testing.assert_allclose(moving_average_forecast([[1, 3], [2, 2]], 2, 2), [[2, 2.5], [2, 2]])
+        with pytest.raises(ValueError):
+            moving_average_forecast([1, 2], 3, 1)
+
+    def test_analytics_wrappers(self):
+        """Test calculate_moving_average and predict_next_period keep their behaviour"""
+        data = [('2024-01', 10), ('2024-02', 20), ('2024-03', 30), ('2024-04', 40)]
+
+        assert analytics.calculate_moving_average(data, 3) == [
+            ('2024-01', 10), ('2024-02', 20), ('2024-03', 20.0), ('2024-04', 30.0)
+        ]
+        assert analytics.calculate_moving_average(data[:2], 3) == data[:2]
+        assert analytics.predict_next_period(data, 3) == 30.0
+        assert analytics.predict_next_period(data[:2], 3) == 15.0
+        assert analytics.predict_next_period([], 3) == 0
+
+
+class TestAnalyticsRunner:
+    """Test cases for running independent analytics tasks in parallel"""
+
+    def make_runner(self, app, workers=3):
+        runner = AnalyticsRunner()
+        runner.init_app(app)
+        runner.workers = workers
+        return runner
+
+    def test_tasks_run_concurrently_with_timings(self, app, db_session):
+        """Test a run takes as long as its slowest task and reports each task's timing"""
+        runner = self.make_runner(app)
+        try:
+            run = runner.run({
+                'first': lambda: time.sleep(0.2) or 1,
+                'second': lambda: time.sleep(0.2) or 2,
+                'sales': lambda: db_session.session.query(Sale).count() + 5
+            })
+        finally:
+            runner.shutdown()
+
+        assert run['first'] == 1
+        assert run['second'] == 2
+        assert run['sales'] == 5
+        assert set(run.timings) == {'first', 'second', 'sales'}
+        assert run.timings['first'] >= 0.2
+        assert run.elapsed < 0.35
+
+    def test_failures_and_timeouts_are_reported(self, app):
+        """Test failing and slow tasks raise AnalyticsTaskError naming them"""
+        runner = self.make_runner(app)
+        try:
+            with pytest.raises(AnalyticsTaskError) as excinfo:
+                runner.run({
+                    'ok': lambda: 1,
+                    'broken': lambda: 1 / 0,
+                    'slow': lambda: time.sleep(0.5)
+                }, timeout=0.1)
+        finally:
+            runner.shutdown()
+
+        assert set(excinfo.value.failures) == {'broken', 'slow'}
+        assert 'timed out' in excinfo.value.failures['slow']
+        assert 'ok' in excinfo.value.timings
+
+    def test_timed_out_task_frees_its_worker(self, app):
+        """Test tasks queued behind a slow task get their own timeout and still run"""
+        def slow():
+            while True:
+                check_cancelled()
+                time.sleep(0.01)
+
+        runner = self.make_runner(app, workers=1)
+        try:
+            started = time.perf_counter()
+            with pytest.raises(AnalyticsTaskError) as excinfo:
+                runner.run({'slow': slow, 'first': lambda: 1, 'second': lambda: 2}, timeout=0.2)
+            elapsed = time.perf_counter() - started
+        finally:
+            runner.shutdown()
+
+        assert set(excinfo.value.failures) == {'slow'}
+        assert set(excinfo.value.timings) == {'first', 'second'}
+        assert elapsed < 0.6
+
+
+class TestKeysetPagination:
+    """Test cases for keyset pagination over (sale_date, sale_id)"""
+
+    @pytest.fixture
+    def expected(self, db_session, admin_user, sample_medicine, make_sale):
+        """Add seven sales and return their IDs newest first"""
+        # Pairs of sales share a timestamp so the sale_id tie-break is exercised
+        base = datetime(2024, 3, 1, 12, 0)
+        for i in range(7):
+            make_sale(admin_user, sample_medicine, sale_date=base + timedelta(minutes=i // 2))
+        db_session.session.commit()
+        return [s.sale_id for s in Sale.query.order_by(Sale.sale_date.desc(), Sale.sale_id.desc())]
+
+    def test_walks_forward_and_back_without_gaps(self, expected):
+        """Test next and previous tokens visit every sale exactly once, newest first"""
+
+        pages = [keyset_paginate(Sale.query, Sale.sale_date, Sale.sale_id, 3, total=7)]
+        while pages[-1].has_next:
+            pages.append(keyset_paginate(Sale.query, Sale.sale_date, Sale.sale_id, 3, after=pages[-1].next_cursor))
+
+        assert [s.sale_id for page in pages for s in page.items] == expected
+        assert [len(page.items) for page in pages] == [3, 3, 1]
+        assert not pages[0].has_prev
+        assert pages[0].total == 7
+
+        back = keyset_paginate(Sale.query, Sale.sale_date, Sale.sale_id, 3, before=pages[2].prev_cursor)
+        assert [s.sale_id for s in back.items] == [s.sale_id for s in pages[1].items]
+        assert back.has_prev and back.has_next
+
+        first = keyset_paginate(Sale.query, Sale.sale_date, Sale.sale_id, 3, before=back.prev_cursor)
+        assert [s.sale_id for s in first.items] == [s.sale_id for s in pages[0].items]
+        assert not first.has_prev
+
+    def test_batches_cover_every_row_while_sales_commit(self, db_session, admin_user, sample_medicine, make_sale,
+                                                         expected):
+        """Test keyset batches visit each sale once, newest first, with commits between batches"""
+
+        seen = []
+        sizes = []
+        for batch in keyset_batches(Sale.query, Sale.sale_date, Sale.sale_id, 3):
+            seen.extend(s.sale_id for s in batch)
+            sizes.append(len(batch))
+            # A newer sale committed mid-export lands above the cursor and is skipped
+            make_sale(admin_user, sample_medicine)
+            db_session.session.commit()
+
+        assert seen == expected
+        assert sizes == [3, 3, 1]
+
+    def test_batches_do_not_commit_the_session(self, db_session, admin_user, sample_medicine, make_sale, expected):
+        """Test keyset batches end each read by rolling back rather than committing"""
+        sample_medicine.stock = 1
+        list(keyset_batches(Sale.query, Sale.sale_date, Sale.sale_id, 3))
+
+        assert db_session.session.get(Medicine, sample_medicine.medicine_id).stock == 100
+
+    def test_cursor_round_trip(self):
+        """Test cursors decode to the encoded key and malformed ones are rejected"""
+        key = (datetime(2024, 3, 1, 12, 30, 15, 250), 42)
+        assert decode_cursor(encode_cursor(*key)) == key
+        with pytest.raises(ValueError):
+            decode_cursor('not-a-cursor')
+
+
+class TestReportFilters:
+    """Test cases for normalized sales report filters"""
+
+    def test_equivalent_arguments_normalize_to_one_key(self):
+        """Test blank and differently spelled arguments give equal filters"""
+        first, errors = ReportFilters.from_args({'start_date': '2024-03-01', 'medicine_id': '7', 'category': ''})
+        second, _ = ReportFilters.from_args({'medicine_id': '07', 'start_date': ' 2024-03-01 ', 'user_id': 'x'})
+
+        assert errors == []
+        assert first == second
+        assert hash(first) == hash(second)
+        assert first.as_args()['medicine_id'] == '7'
+
+        _, errors = ReportFilters.from_args({'end_date': '03/01/2024'})
+        assert errors == ['Invalid end date format']
+
+    def test_may_include_uses_half_open_date_range(self):
+        """Test sale matching covers the whole end date and respects IDs"""
+        filters, _ = ReportFilters.from_args({'start_date': '2024-03-01', 'end_date': '2024-03-31', 'user_id': '2'})
+
+        assert filters.may_include(SaleStamp(datetime(2024, 3, 31, 23, 59), 1, 2, 1))
+        assert not filters.may_include(SaleStamp(datetime(2024, 4, 1), 1, 2, 1))
+        assert not filters.may_include(SaleStamp(datetime(2024, 2, 29, 23, 59), 1, 2, 1))
+        assert not filters.may_include(SaleStamp(datetime(2024, 3, 15), 1, 3, 1))
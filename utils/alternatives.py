@@ -0,0 +1,119 @@
+"""
+In-memory alternative-medicine graph with batched availability filtering
+"""
+import threading
+import time
+from collections import namedtuple, defaultdict
+from datetime import date
+from models import db
+from models.medicine import Medicine, AlternativeMedicine
+from utils.catalog import CatalogItem, catalog_snapshot
+
+
+AlternativeEdge = namedtuple('AlternativeEdge', ['medicine', 'reason', 'priority'])
+
+
+class AlternativesGraph:
+    """
+    All alternative mappings with the stock and expiry of their targets
+
+    The graph is loaded with one joined query and rebuilt when the mappings
+    change, when the catalog version changes (medicine edits or sell-outs),
+    when the date rolls over, or when it is older than max_age seconds. Stock
+    for sellable targets is read from the catalog snapshot, which tracks
+    ordinary sales in place, so a sale does not reload the graph.
+    """
+
+    def __init__(self, max_age=30):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._mapping_version = 0
+        self._built_key = None
+        self._built_at = 0.0
+        self._edges = {}
+
+    def configure(self, max_age=None):
+        """Update the maximum graph age in seconds"""
+        if max_age is not None:
+            self.max_age = max_age
+
+    def bump(self):
+        """Mark the graph stale after an alternative mapping change"""
+        with self._lock:
+            self._mapping_version += 1
+
+    def clear(self):
+        """Drop the loaded graph so the next access reloads it"""
+        with self._lock:
+            self._mapping_version += 1
+            self._edges = {}
+
+    def _ensure_current(self):
+        """Reload the graph if stale and return the primary -> edges mapping"""
+        with self._lock:
+            key = (self._mapping_version, catalog_snapshot.version, date.today())
+            if key == self._built_key and time.monotonic() - self._built_at <= self.max_age:
+                return self._edges
+
+            rows = db.session.query(
+                AlternativeMedicine.primary_medicine_id,
+                AlternativeMedicine.reason,
+                AlternativeMedicine.priority,
+                Medicine.medicine_id,
+                Medicine.name,
+                Medicine.manufacturer,
+                Medicine.category,
+                Medicine.price,
+                Medicine.stock,
+                Medicine.reorder_level,
+                Medicine.expiry_date,
+                Medicine.barcode
+            ).join(
+                Medicine,
+                Medicine.medicine_id == AlternativeMedicine.alternative_medicine_id
+            ).order_by(
+                AlternativeMedicine.primary_medicine_id,
+                AlternativeMedicine.priority.desc()
+            ).all()
+
+            edges = defaultdict(list)
+            for row in rows:
+                edges[row.primary_medicine_id].append(AlternativeEdge(
+                    medicine=CatalogItem(
+                        medicine_id=row.medicine_id,
+                        name=row.name,
+                        manufacturer=row.manufacturer,
+                        category=row.category,
+                        price=row.price,
+                        stock=row.stock,
+                        reorder_level=row.reorder_level,
+                        expiry_date=row.expiry_date,
+                        barcode=row.barcode
+                    ),
+                    reason=row.reason,
+                    priority=row.priority
+                ))
+
+            self._edges = dict(edges)
+            self._built_key = key
+            self._built_at = time.monotonic()
+            return self._edges
+
+    def alternatives(self, medicine_id):
+        """Get every alternative for a medicine, highest priority first"""
+        return [
+            edge._replace(medicine=catalog_snapshot.get(edge.medicine.medicine_id) or edge.medicine)
+            for edge in self._ensure_current().get(medicine_id, [])
+        ]
+
+    def available(self, medicine_id, limit=None):
+        """Get alternatives that are in stock and not expired, highest priority first"""
+        today = date.today()
+        available = [
+            edge for edge in self.alternatives(medicine_id)
+            if edge.medicine.stock > 0 and edge.medicine.expiry_date >= today
+        ]
+        return available[:limit] if limit is not None else available
+
+
+alternatives_graph = AlternativesGraph()
@@ -2,11 +2,15 @@
 Analytics utility functions for predictive insights and forecasting
 """
 from datetime import datetime, timedelta
-from collections import defaultdict
+import numpy as np
 from models import db
-from models.sale import Sale
+from models.sale import Sale, SaleDailyRollup
 from models.medicine import Medicine
 from sqlalchemy import func
+from utils.parallel import check_cancelled
+from utils.velocity import load_sales_velocity
+from utils.rolling import rolling_mean, moving_average_forecast
+from utils.time_buckets import month_buckets, following_month_buckets, bucket_label, range_filter
 
 
 def calculate_moving_average(sales_data, window_size=3):
@@ -23,19 +27,13 @@ def calculate_moving_average(sales_data, window_size=3):
     if len(sales_data) < window_size:
         return sales_data
 
-    moving_averages = []
+    means = rolling_mean([val for _, val in sales_data], window_size)
 
-    for i in range(len(sales_data)):
-        if i < window_size - 1:
-            # Not enough data points yet
-            moving_averages.append((sales_data[i][0], sales_data[i][1]))
-        else:
-            # Calculate average of last window_size values
-            window = [sales_data[j][1] for j in range(i - window_size + 1, i + 1)]
-            avg = sum(window) / window_size
-            moving_averages.append((sales_data[i][0], avg))
-
-    return moving_averages
+    # Not enough data points yet for the first window_size - 1 periods
+    return [
+        (period, val if i < window_size - 1 else float(means[i]))
+        for i, (period, val) in enumerate(sales_data)
+    ]
 
 
 def predict_next_period(sales_data, window_size=3):
@@ -49,14 +47,41 @@ def predict_next_period(sales_data, window_size=3):
     Returns:
         Predicted value for next period
     """
-    if len(sales_data) < window_size:
-        if len(sales_data) > 0:
-            return sum(val for _, val in sales_data) / len(sales_data)
+    if not sales_data:
         return 0
 
-    # Use last window_size values
-    recent_values = [val for _, val in sales_data[-window_size:]]
-    return sum(recent_values) / len(recent_values)
+    # Average of the last window_size values, or of everything if there are fewer
+    return float(rolling_mean([val for _, val in sales_data], min(window_size, len(sales_data)))[-1])
+
+
+def get_seasonal_totals():
+    """
+    Get sales totals per season, aggregated in the database
+
+    Returns:
+        Dictionary of season -> total_sales, total_quantity and transaction_count,
+        for seasons that have sales
+    """
+    season = Sale.season_case(SaleDailyRollup.day).label('season')
+
+    seasonal_data = db.session.query(
+        season,
+        func.sum(SaleDailyRollup.revenue).label('total_sales'),
+        func.sum(SaleDailyRollup.quantity).label('total_quantity'),
+        func.sum(SaleDailyRollup.transaction_count).label('transaction_count')
+    ).group_by(season).all()
+
+    totals = {
+        season: {
+            'total_sales': float(total_sales),
+            'total_quantity': int(total_quantity),
+            'transaction_count': int(count)
+        }
+        for season, total_sales, total_quantity, count in seasonal_data
+    }
+
+    # Keep the calendar order of seasons
+    return {season: totals[season] for season in ['Winter', 'Spring', 'Summer', 'Monsoon'] if season in totals}
 
 
 def get_seasonal_trends():
@@ -66,19 +91,9 @@ def get_seasonal_trends():
     Returns:
         Dictionary with seasonal data and predictions
     """
-    # Get all sales
-    sales = Sale.query.all()
-
-    # Group by season
-    seasonal_sales = defaultdict(float)
-    seasonal_quantity = defaultdict(int)
-    seasonal_count = defaultdict(int)
-
-    for sale in sales:
-        season = sale.get_season()
-        seasonal_sales[season] += float(sale.total_price)
-        seasonal_quantity[season] += sale.quantity_sold
-        seasonal_count[season] += 1
+    # Group by season in the database
+    seasonal_totals = get_seasonal_totals()
+    seasonal_sales = {season: totals['total_sales'] for season, totals in seasonal_totals.items()}
 
     # Calculate current season
     current_month = datetime.now().month
@@ -87,12 +102,13 @@ def get_seasonal_trends():
     # Calculate averages
     seasonal_avg = {}
     for season in ['Winter', 'Spring', 'Summer', 'Monsoon']:
-        if seasonal_count[season] > 0:
+        if season in seasonal_totals:
+            totals = seasonal_totals[season]
             seasonal_avg[season] = {
-                'total_sales': seasonal_sales[season],
-                'avg_per_transaction': seasonal_sales[season] / seasonal_count[season],
-                'total_quantity': seasonal_quantity[season],
-                'transaction_count': seasonal_count[season]
+                'total_sales': totals['total_sales'],
+                'avg_per_transaction': totals['total_sales'] / totals['transaction_count'],
+                'total_quantity': totals['total_quantity'],
+                'transaction_count': totals['transaction_count']
             }
         else:
             seasonal_avg[season] = {
@@ -117,13 +133,13 @@ def get_category_trends():
     Returns:
         Dictionary with category sales data
     """
-    # Query category-wise sales
+    # Query category-wise sales from the daily rollup
     category_data = db.session.query(
         Medicine.category,
-        func.sum(Sale.total_price).label('total_sales'),
-        func.sum(Sale.quantity_sold).label('total_quantity'),
-        func.count(Sale.sale_id).label('transaction_count')
-    ).join(Sale).group_by(Medicine.category).all()
+        func.sum(SaleDailyRollup.revenue).label('total_sales'),
+        func.sum(SaleDailyRollup.quantity).label('total_quantity'),
+        func.sum(SaleDailyRollup.transaction_count).label('transaction_count')
+    ).join(SaleDailyRollup).group_by(Medicine.category).all()
 
     category_trends = {}
     for category, total_sales, total_quantity, count in category_data:
@@ -139,7 +155,7 @@ def get_category_trends():
 
 def get_monthly_sales_data(months=12):
     """
-    Get monthly sales data for the last N months
+    Get monthly sales data for the last N calendar months, including the current one
 
     Args:
         months: Number of months to retrieve (default: 12)
@@ -147,13 +163,13 @@ def get_monthly_sales_data(months=12):
     Returns:
         List of tuples (month_label, total_sales)
     """
-    start_date = datetime.now() - timedelta(days=months * 30)
+    buckets = month_buckets(months)
 
     monthly_data = db.session.query(
-        func.strftime('%Y-%m', Sale.sale_date).label('month'),
-        func.sum(Sale.total_price).label('total_sales')
+        bucket_label(SaleDailyRollup.day, buckets).label('month'),
+        func.sum(SaleDailyRollup.revenue).label('total_sales')
     ).filter(
-        Sale.sale_date >= start_date
+        range_filter(SaleDailyRollup.day, buckets)
     ).group_by('month').order_by('month').all()
 
     return [(month, float(total_sales)) for month, total_sales in monthly_data]
@@ -171,12 +187,12 @@ def get_top_medicines_by_revenue(limit=10):
     """
     top_medicines = db.session.query(
         Medicine.name,
-        func.sum(Sale.total_price).label('revenue'),
-        func.sum(Sale.quantity_sold).label('quantity')
-    ).join(Sale).group_by(
+        func.sum(SaleDailyRollup.revenue).label('revenue'),
+        func.sum(SaleDailyRollup.quantity).label('quantity')
+    ).join(SaleDailyRollup).group_by(
         Medicine.medicine_id
     ).order_by(
-        func.sum(Sale.total_price).desc()
+        func.sum(SaleDailyRollup.revenue).desc()
     ).limit(limit).all()
 
     return [(name, float(revenue), int(quantity)) for name, revenue, quantity in top_medicines]
@@ -189,50 +205,29 @@ def get_stock_predictions():
     Returns:
         List of medicines with predicted stockout dates
     """
-    predictions = []
+    velocity = load_sales_velocity(window_days=30)
+    days_until_stockout = velocity.days_until_stockout()
 
-    # Get medicines with sales history
-    medicines_with_sales = db.session.query(
-        Medicine.medicine_id
-    ).join(Sale).distinct().all()
-
-    medicine_ids = [m[0] for m in medicines_with_sales]
-
-    for medicine_id in medicine_ids:
-        medicine = Medicine.query.get(medicine_id)
-        if not medicine or medicine.stock <= 0:
-            continue
-
-        # Get sales in last 30 days
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_sales = db.session.query(
-            func.sum(Sale.quantity_sold)
-        ).filter(
-            Sale.medicine_id == medicine_id,
-            Sale.sale_date >= thirty_days_ago
-        ).scalar()
-
-        if recent_sales and recent_sales > 0:
-            # Calculate daily average
-            daily_avg = recent_sales / 30.0
-
-            # Predict days until stockout
-            if daily_avg > 0:
-                days_until_stockout = medicine.stock / daily_avg
-
-                if days_until_stockout <= 30:  # Alert if less than 30 days
-                    predicted_date = datetime.now() + timedelta(days=days_until_stockout)
-                    predictions.append({
-                        'medicine': medicine,
-                        'current_stock': medicine.stock,
-                        'daily_avg_sales': round(daily_avg, 2),
-                        'days_until_stockout': int(days_until_stockout),
-                        'predicted_stockout_date': predicted_date.date(),
-                        'urgency': 'high' if days_until_stockout <= 7 else 'medium' if days_until_stockout <= 14 else 'low'
-                    })
+    # Alert on medicines still in stock that will run out within 30 days
+    alert = (velocity.stock > 0) & (velocity.daily_avg > 0) & (days_until_stockout <= 30)
+    indices = np.flatnonzero(alert)
 
     # Sort by urgency
-    predictions.sort(key=lambda x: x['days_until_stockout'])
+    indices = indices[np.argsort(days_until_stockout[indices].astype(np.int64), kind='stable')]
+
+    now = datetime.now()
+    predictions = []
+    for i in indices:
+        check_cancelled()
+        days = float(days_until_stockout[i])
+        predictions.append({
+            'medicine': velocity.medicines[i],
+            'current_stock': int(velocity.stock[i]),
+            'daily_avg_sales': round(float(velocity.daily_avg[i]), 2),
+            'days_until_stockout': int(days),
+            'predicted_stockout_date': (now + timedelta(days=days)).date(),
+            'urgency': 'high' if days <= 7 else 'medium' if days <= 14 else 'low'
+        })
 
     return predictions
 
@@ -261,27 +256,17 @@ def generate_forecast_data(months_ahead=3):
     ma_window = min(3, len(monthly_sales))
     moving_avg = calculate_moving_average(monthly_sales, ma_window)
 
-    # Predict next months
-    forecast = []
-    last_values = [val for _, val in monthly_sales[-ma_window:]]
-
-    for i in range(months_ahead):
-        # Simple moving average prediction
-        predicted_value = sum(last_values) / len(last_values)
+    # Predict next months, each from the moving average of the values before it
+    predictions = moving_average_forecast([val for _, val in monthly_sales], ma_window, months_ahead)
+    forecast = [
+        (bucket.label, float(predicted_value))
+        for bucket, predicted_value in zip(following_month_buckets(months_ahead, datetime.now()), predictions)
+    ]
 
-        # Generate month label
-        future_date = datetime.now() + timedelta(days=30 * (i + 1))
-        month_label = future_date.strftime('%Y-%m')
-
-        forecast.append((month_label, predicted_value))
-
-        # Update last_values for next prediction
-        last_values = last_values[1:] + [predicted_value]
-
-    # Determine trend
+    # Determine trend from the first and last full moving-average windows
     if len(monthly_sales) >= 2:
-        recent_avg = sum(val for _, val in monthly_sales[-3:]) / min(3, len(monthly_sales))
-        older_avg = sum(val for _, val in monthly_sales[:3]) / min(3, len(monthly_sales))
+        recent_avg = moving_avg[-1][1]
+        older_avg = moving_avg[ma_window - 1][1]
 
         if recent_avg > older_avg * 1.1:
             trend = 'growing'
@@ -307,45 +292,34 @@ def get_reorder_recommendations():
     Returns:
         List of medicines that should be reordered
     """
-    recommendations = []
+    velocity = load_sales_velocity(window_days=30)
 
-    # Get all medicines
-    medicines = Medicine.query.all()
-
-    for medicine in medicines:
-        # Skip if already low stock (covered by low stock alerts)
-        if medicine.stock <= medicine.reorder_level:
-            continue
-
-        # Get sales in last 30 days
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_sales = db.session.query(
-            func.sum(Sale.quantity_sold)
-        ).filter(
-            Sale.medicine_id == medicine.medicine_id,
-            Sale.sale_date >= thirty_days_ago
-        ).scalar() or 0
-
-        if recent_sales > 0:
-            daily_avg = recent_sales / 30.0
-
-            # Calculate safety stock (30 days worth)
-            safety_stock = daily_avg * 30
-
-            # Recommend if current stock is less than safety stock
-            if medicine.stock < safety_stock:
-                recommended_order = int(safety_stock - medicine.stock + (daily_avg * 15))  # Add 15 days buffer
-
-                recommendations.append({
-                    'medicine': medicine,
-                    'current_stock': medicine.stock,
-                    'safety_stock': int(safety_stock),
-                    'recommended_order_quantity': recommended_order,
-                    'daily_avg_sales': round(daily_avg, 2),
-                    'reason': f'Stock below 30-day safety level ({int(safety_stock)} units)'
-                })
+    # Calculate safety stock (30 days worth) and order quantity (15 days buffer)
+    safety_stock = velocity.safety_stock(days=30)
+    recommended_order = velocity.recommended_order(safety_days=30, buffer_days=15)
+
+    # Skip low stock medicines (covered by low stock alerts) and recommend
+    # when current stock is less than safety stock
+    recommend = (
+        (velocity.stock > velocity.reorder_level)
+        & (velocity.quantity > 0)
+        & (velocity.stock < safety_stock)
+    )
+    indices = np.flatnonzero(recommend)
 
     # Sort by urgency (lower stock percentage)
-    recommendations.sort(key=lambda x: x['current_stock'] / x['safety_stock'] if x['safety_stock'] > 0 else 1)
+    indices = indices[np.argsort(velocity.stock[indices] / safety_stock[indices], kind='stable')]
+
+    recommendations = []
+    for i in indices:
+        check_cancelled()
+        recommendations.append({
+            'medicine': velocity.medicines[i],
+            'current_stock': int(velocity.stock[i]),
+            'safety_stock': int(safety_stock[i]),
+            'recommended_order_quantity': int(recommended_order[i]),
+            'daily_avg_sales': round(float(velocity.daily_avg[i]), 2),
+            'reason': f'Stock below 30-day safety level ({int(safety_stock[i])} units)'
+        })
 
     return recommendations
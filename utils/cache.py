@@ -0,0 +1,263 @@
+"""
+In-process caching utilities
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple, defaultdict
+from datetime import datetime
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with a per-entry time to live
+
+    Entries are evicted when the cache grows past maxsize (least recently
+    used first) or when they are older than ttl seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxsize=None, ttl=None):
+        """Update size and TTL limits, dropping any entries that no longer fit"""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entry if full"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        """Remove the given keys from the cache"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry and reset statistics"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return hit/miss statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+CachedBlock = namedtuple('CachedBlock', ['value', 'computed_at'])
+
+
+class BlockCache:
+    """
+    Thread-safe cache of computed page blocks, invalidated by tag
+
+    Each block is stored with the wall-clock time it was computed and the
+    versions of the tags it depends on. A block is recomputed once it is
+    older than ttl seconds or after any of its tags has been invalidated.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._blocks = {}
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, ttl=None):
+        """Update the block TTL in seconds"""
+        if ttl is not None:
+            self.ttl = ttl
+
+    def _tag_versions(self, tags):
+        return tuple(self._versions[tag] for tag in tags)
+
+    def get(self, name, compute, tags=()):
+        """
+        Return the cached block, recomputing it with compute() if stale
+
+        Returns:
+            CachedBlock of (value, computed_at)
+        """
+        with self._lock:
+            entry = self._blocks.get(name)
+            versions = self._tag_versions(tags)
+            if entry is not None:
+                block, stored_at, stored_versions = entry
+                if stored_versions == versions and time.monotonic() - stored_at <= self.ttl:
+                    self.hits += 1
+                    return block
+            self.misses += 1
+
+        # Compute outside the lock; an invalidation meanwhile leaves the result stale
+        block = CachedBlock(compute(), datetime.now())
+
+        with self._lock:
+            self._blocks[name] = (block, time.monotonic(), versions)
+        return block
+
+    def invalidate(self, *tags):
+        """Mark every block depending on any of the given tags stale"""
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] += 1
+
+    def clear(self):
+        """Remove every block and reset statistics"""
+        with self._lock:
+            self._blocks.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class ReportCache:
+    """
+    Thread-safe LRU cache of sales report results, one entry per filter set
+
+    Each entry holds the parts computed so far for its filters (the summary,
+    each page visited), so paging through a report reuses its totals. Entries
+    expire after ttl seconds and are dropped as soon as a sale is recorded
+    that the filters may include, or a medicine they may show is edited;
+    other reports stay cached.
+    """
+
+    def __init__(self, maxsize=64, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize=None, ttl=None):
+        """Update size and TTL limits, dropping any entries that no longer fit"""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, filters, part, compute):
+        """
+        Return one cached part of the report for filters, computing it if missing
+
+        Args:
+            filters: Hashable filter set with may_include(sale) and
+                may_include_medicine(medicine_id) methods
+            part: Key of the part within the report, e.g. 'summary'
+            compute: Callable producing the part
+        """
+        with self._lock:
+            entry = self._entries.get(filters)
+            if entry is not None and time.monotonic() - entry['stored_at'] > self.ttl:
+                entry = None
+            if entry is None:
+                entry = {'stored_at': time.monotonic(), 'parts': {}}
+                self._entries[filters] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(filters)
+
+            if part in entry['parts']:
+                self.hits += 1
+                return entry['parts'][part]
+            self.misses += 1
+
+        value = compute()
+
+        # Keep the result only if the entry was not invalidated while computing
+        with self._lock:
+            if self._entries.get(filters) is entry:
+                entry['parts'][part] = value
+        return value
+
+    def sales_recorded(self, sales):
+        """Drop every report that may include any of the given sales"""
+        sales = list(sales)
+        with self._lock:
+            stale = [
+                filters for filters in self._entries
+                if any(filters.may_include(sale) for sale in sales)
+            ]
+            for filters in stale:
+                del self._entries[filters]
+
+    def medicines_changed(self, medicine_ids):
+        """Drop every report that may show any of the given medicines"""
+        medicine_ids = list(medicine_ids)
+        with self._lock:
+            stale = [
+                filters for filters in self._entries
+                if any(filters.may_include_medicine(medicine_id) for medicine_id in medicine_ids)
+            ]
+            for filters in stale:
+                del self._entries[filters]
+
+    def clear(self):
+        """Remove every entry and reset statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Barcode -> medicine payload cache used by the scanner API
+barcode_cache = LRUCache()
+
+# Computed admin dashboard blocks
+dashboard_cache = BlockCache()
+
+# Sales report summaries and pages, keyed by normalized filters
+report_cache = ReportCache()
+
+# Report filter dropdown options (medicines, sellers, categories)
+filter_options_cache = BlockCache(ttl=600)
@@ -0,0 +1,257 @@
+"""
+Versioned in-memory snapshot of the sellable medicine catalog
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple, defaultdict
+from datetime import date, timedelta
+from models.medicine import Medicine
+from utils.cache import barcode_cache, dashboard_cache, report_cache, filter_options_cache
+from utils.insights import insights_snapshot
+
+
+class CatalogItem(namedtuple('CatalogItem', [
+    'medicine_id', 'name', 'manufacturer', 'category', 'price',
+    'stock', 'reorder_level', 'expiry_date', 'barcode'
+])):
+    """Read-only view of a sellable medicine, safe to share between requests"""
+
+    __slots__ = ()
+
+    def is_low_stock(self):
+        """Check if medicine stock is below reorder level"""
+        return self.stock <= self.reorder_level
+
+    def is_expired(self):
+        """Check if medicine has expired"""
+        return self.expiry_date < date.today()
+
+    def is_expiring_soon(self, days=30):
+        """Check if medicine is expiring within specified days"""
+        return self.expiry_date <= date.today() + timedelta(days=days)
+
+
+_SnapshotState = namedtuple('_SnapshotState', ['items', 'by_id', 'positions', 'prefix_keys', 'prefix_ids'])
+_EMPTY_STATE = _SnapshotState(items=(), by_id={}, positions={}, prefix_keys=[], prefix_ids=[])
+
+
+class CatalogSnapshot:
+    """
+    Shared snapshot of sellable medicines (in stock and not expired)
+
+    The snapshot is rebuilt lazily when the catalog version changes, when the
+    date rolls over, or when it is older than max_age seconds. The age limit
+    bounds staleness from changes made by other worker processes. Sales only
+    bump the version when they sell a medicine out; otherwise the sold units
+    are taken off the snapshot entries in place.
+    """
+
+    def __init__(self, max_age=30):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = 0
+        self._built_version = None
+        self._built_on = None
+        self._built_at = 0.0
+        self._state = _EMPTY_STATE
+
+    @property
+    def version(self):
+        """Current catalog version counter"""
+        return self._version
+
+    def configure(self, max_age=None):
+        """Update the maximum snapshot age in seconds"""
+        if max_age is not None:
+            self.max_age = max_age
+
+    def bump(self):
+        """Mark the snapshot stale after a change to the sellable medicines"""
+        with self._lock:
+            self._version += 1
+
+    def clear(self):
+        """Drop the built snapshot so the next access reloads it"""
+        with self._lock:
+            self._version += 1
+            self._state = _EMPTY_STATE
+
+    def _is_current(self):
+        return (
+            self._built_version == self._version
+            and self._built_on == date.today()
+            and time.monotonic() - self._built_at <= self.max_age
+        )
+
+    def _ensure_current(self):
+        """Rebuild the snapshot if stale and return its state tuple"""
+        with self._lock:
+            if self._is_current():
+                return self._state
+
+            version = self._version
+            today = date.today()
+            medicines = Medicine.query.filter(
+                Medicine.stock > 0,
+                Medicine.expiry_date > today
+            ).order_by(Medicine.name).all()
+
+            items = tuple(
+                CatalogItem(
+                    medicine_id=m.medicine_id,
+                    name=m.name,
+                    manufacturer=m.manufacturer,
+                    category=m.category,
+                    price=m.price,
+                    stock=m.stock,
+                    reorder_level=m.reorder_level,
+                    expiry_date=m.expiry_date,
+                    barcode=m.barcode
+                )
+                for m in medicines
+            )
+            prefix_keys, prefix_ids = _build_prefix_index(items)
+
+            # Swap in the whole state at once so readers never see a mix
+            self._state = _SnapshotState(
+                items=items,
+                by_id={item.medicine_id: item for item in items},
+                positions={item.medicine_id: i for i, item in enumerate(items)},
+                prefix_keys=prefix_keys,
+                prefix_ids=prefix_ids
+            )
+            self._built_version = version
+            self._built_on = today
+            self._built_at = time.monotonic()
+            return self._state
+
+    def stock_sold(self, sold):
+        """
+        Take sold units off the snapshot entries without reloading it
+
+        sold maps medicine IDs to the units sold. Selling a medicine out
+        changes which medicines are sellable, so that marks the snapshot stale
+        instead. Medicines outside the snapshot are skipped, since a sale
+        cannot make them sellable.
+        """
+        with self._lock:
+            if not self._is_current():
+                return
+
+            state = self._state
+            updated = {}
+            for medicine_id, quantity in sold.items():
+                item = state.by_id.get(medicine_id)
+                if item is None:
+                    continue
+                if item.stock <= quantity:
+                    self._version += 1
+                    return
+                updated[medicine_id] = item._replace(stock=item.stock - quantity)
+
+            if not updated:
+                return
+
+            # Names and barcodes are unchanged, so positions and the prefix index carry over
+            items = list(state.items)
+            for medicine_id, item in updated.items():
+                items[state.positions[medicine_id]] = item
+            self._state = state._replace(items=tuple(items), by_id={**state.by_id, **updated})
+
+    def search(self, query, page=1, per_page=20):
+        """
+        Search sellable medicines by name, manufacturer or barcode prefix
+
+        Every whitespace-separated term in the query must prefix-match one of
+        the indexed terms. Results are ordered by name.
+
+        Returns:
+            Tuple (items on the requested page, total number of matches)
+        """
+        state = self._ensure_current()
+
+        terms = query.lower().split()
+        if not terms:
+            matched = state.items
+        else:
+            ids = _prefix_matches(state, terms[0])
+            for term in terms[1:]:
+                if not ids:
+                    break
+                ids &= _prefix_matches(state, term)
+            matched = [state.items[position] for position in sorted(state.positions[i] for i in ids)]
+
+        start = (page - 1) * per_page
+        return matched[start:start + per_page], len(matched)
+
+    def items(self):
+        """Get all sellable medicines ordered by name"""
+        return self._ensure_current().items
+
+    def get(self, medicine_id):
+        """Get a sellable medicine by ID, or None if it is not sellable"""
+        return self._ensure_current().by_id.get(medicine_id)
+
+
+def _build_prefix_index(items):
+    """Build sorted parallel (term, medicine_id) lists over name, manufacturer and barcode"""
+    entries = set()
+    for item in items:
+        for text in (item.name, item.manufacturer):
+            text = text.lower()
+            entries.add((text, item.medicine_id))
+            for word in text.split():
+                entries.add((word, item.medicine_id))
+        entries.add((item.barcode, item.medicine_id))
+
+    entries = sorted(entries)
+    return [term for term, _ in entries], [medicine_id for _, medicine_id in entries]
+
+
+def _prefix_matches(state, prefix):
+    """Get IDs of medicines with an indexed term starting with prefix"""
+    matches = set()
+    start = bisect.bisect_left(state.prefix_keys, prefix)
+    for i in range(start, len(state.prefix_keys)):
+        if not state.prefix_keys[i].startswith(prefix):
+            break
+        matches.add(state.prefix_ids[i])
+    return matches
+
+
+catalog_snapshot = CatalogSnapshot()
+
+
+def catalog_changed(*barcodes):
+    """Invalidate cached catalog data after a medicine is added, edited or deleted"""
+    barcode_cache.invalidate(*barcodes)
+    catalog_snapshot.bump()
+    dashboard_cache.invalidate('catalog')
+    filter_options_cache.invalidate('catalog')
+
+
+def medicine_edited(medicine_id, *barcodes):
+    """Invalidate cached catalog data and the reports showing a medicine after it is edited or deleted"""
+    catalog_changed(*barcodes)
+    report_cache.medicines_changed([medicine_id])
+
+
+def sales_changed(*barcodes, sales=()):
+    """
+    Invalidate cached catalog and sales data after sales are recorded
+
+    sales holds the recorded sales (or SaleStamps), so only reports whose
+    filters may include them are invalidated, and their quantities are taken
+    off the catalog snapshot in place.
+    """
+    sold = defaultdict(int)
+    for sale in sales:
+        sold[sale.medicine_id] += sale.quantity_sold
+
+    barcode_cache.invalidate(*barcodes)
+    catalog_snapshot.stock_sold(sold)
+    dashboard_cache.invalidate('catalog')
+    dashboard_cache.invalidate('sales')
+    report_cache.sales_recorded(sales)
+    insights_snapshot.sales_recorded(len(barcodes))
@@ -0,0 +1,253 @@
+"""
+Background sales report export jobs, written to an export directory
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from models import db
+from utils.cache import report_cache
+from utils.reports import ReportFilters, report_summary
+from utils.sales_export import EXPORT_FORMATS, export_query, write_export
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ExportJob:
+    """State of one export job, mirrored to a JSON file next to its output"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, job_id, user_id, filters, export_format=EXPORT_FORMATS['csv'], status=QUEUED,
+                 rows_written=0, total_rows=None, created_at=None, finished_at=None, filename=None, error=None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.filters = filters
+        self.export_format = export_format
+        self.status = status
+        self.rows_written = rows_written
+        self.total_rows = total_rows
+        self.created_at = created_at or datetime.now()
+        self.finished_at = finished_at
+        self.filename = filename
+        self.error = error
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def progress(self):
+        """Fraction of rows written, between 0 and 1"""
+        if self.status == self.DONE:
+            return 1.0
+        if not self.total_rows:
+            return 0.0
+        return min(self.rows_written / self.total_rows, 1.0)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'user_id': self.user_id,
+            'filters': self.filters.as_args(),
+            'format': self.export_format.name,
+            'status': self.status,
+            'rows_written': self.rows_written,
+            'total_rows': self.total_rows,
+            'progress': round(self.progress, 4),
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'filename': self.filename,
+            'error': self.error
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        filters, _ = ReportFilters.from_args(data['filters'])
+        return cls(
+            job_id=data['job_id'],
+            user_id=data['user_id'],
+            filters=filters,
+            export_format=EXPORT_FORMATS[data['format']],
+            status=data['status'],
+            rows_written=data['rows_written'],
+            total_rows=data['total_rows'],
+            created_at=datetime.fromisoformat(data['created_at']),
+            finished_at=datetime.fromisoformat(data['finished_at']) if data['finished_at'] else None,
+            filename=data['filename'],
+            error=data['error']
+        )
+
+
+class ExportJobManager:
+    """
+    Runs report exports on a small local thread pool, off the request path
+
+    Each job writes its file to the export directory (the report CSV is
+    gzip-compressed, see sales_export.write_export) and keeps
+    its state in a JSON file beside it, so any web process can report progress
+    and serve the download. Files older than the retention period are removed
+    by cleanup(), which runs whenever a job is submitted.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.directory = None
+        self.workers = 2
+        self.retention = 24 * 3600
+        self.batch_size = 1000
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def init_app(self, app):
+        """Configure from the application's EXPORT_* settings"""
+        self.shutdown()
+        self.app = app
+        self.workers = app.config.get('EXPORT_WORKERS', 2)
+        self.retention = app.config.get('EXPORT_RETENTION', 24 * 3600)
+        self.batch_size = app.config.get('EXPORT_BATCH_SIZE', 1000)
+
+        # Relative paths live in the instance folder, like the SQLite database
+        directory = app.config.get('EXPORT_DIR') or 'exports'
+        self.directory = os.path.join(app.instance_path, directory)
+        with self._lock:
+            self._jobs.clear()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export')
+            return self._executor
+
+    def _state_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def file_path(self, job):
+        """Path of a job's output file"""
+        return os.path.join(self.directory, job.filename)
+
+    def _save(self, job):
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Swap the state file in atomically so pollers never read half of it
+        path = self._state_path(job.job_id)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def submit(self, filters, user_id, export_format=EXPORT_FORMATS['csv']):
+        """Queue an export of the report for filters and return its ExportJob"""
+        self.cleanup()
+
+        job_id = uuid.uuid4().hex
+        job = ExportJob(job_id, user_id, filters, export_format)
+        extension = 'csv.gz' if export_format.name == 'csv' else export_format.extension
+        job.filename = f'sales_report_{job.created_at.strftime("%Y%m%d_%H%M%S")}_{job_id[:8]}.{extension}'
+        with self._lock:
+            self._jobs[job_id] = job
+        self._save(job)
+
+        self._pool().submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """Return the job with job_id, from this process or the export directory, or None"""
+        if not _JOB_ID.match(job_id or ''):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+
+        try:
+            with open(self._state_path(job_id), encoding='utf-8') as f:
+                return ExportJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _run(self, job):
+        with self.app.app_context():
+            tmp_path = f'{self.file_path(job)}.tmp'
+            try:
+                job.status = ExportJob.RUNNING
+                summary = report_cache.get(job.filters, 'summary', lambda: report_summary(job.filters))
+                job.total_rows = summary['total_transactions']
+                self._save(job)
+
+                def progress(rows):
+                    job.rows_written = rows
+                    self._save(job)
+
+                with open(tmp_path, 'wb') as f:
+                    write_export(export_query(job.filters), f, job.export_format, self.batch_size, progress=progress)
+                os.replace(tmp_path, self.file_path(job))
+                job.status = ExportJob.DONE
+
+            except Exception:
+                self.app.logger.exception('Export job %s failed', job.job_id)
+                job.status = ExportJob.FAILED
+                job.error = 'The export could not be completed.'
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            finally:
+                db.session.remove()
+                job.finished_at = datetime.now()
+                self._save(job)
+
+    def cleanup(self):
+        """
+        Delete jobs, and their files, that finished more than the retention period ago
+
+        Unfinished jobs left behind by a stopped process are removed once
+        they are older than the retention period.
+
+        Returns:
+            Number of jobs removed
+        """
+        if not self.directory or not os.path.isdir(self.directory):
+            return 0
+
+        cutoff = time.time() - self.retention
+        removed = 0
+        for name in os.listdir(self.directory):
+            job_id, ext = os.path.splitext(name)
+            if ext != '.json':
+                continue
+            job = self.get(job_id)
+            if job is None:
+                continue
+
+            with self._lock:
+                running_here = job.job_id in self._jobs and not job.finished
+            reference = job.finished_at or job.created_at
+            if running_here or reference.timestamp() > cutoff:
+                continue
+
+            for path in (self.file_path(job), f'{self.file_path(job)}.tmp', self._state_path(job.job_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+            removed += 1
+        return removed
+
+    def shutdown(self):
+        """Stop the pool threads once running exports finish"""
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+export_jobs = ExportJobManager()
@@ -0,0 +1,204 @@
+"""
+Catalog-wide per-SKU demand forecasting with seasonal exponential smoothing
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+import numpy as np
+from models import db
+from models.sale import Sale, SaleDailyRollup
+from sqlalchemy import func
+from utils.time_buckets import month_buckets, following_month_buckets, bucket_label, range_filter
+
+SEASONS = ['Winter', 'Spring', 'Summer', 'Monsoon']
+
+DemandMatrix = namedtuple('DemandMatrix', ['medicine_ids', 'periods', 'values'])
+
+
+def month_labels(end, count):
+    """Return count consecutive 'YYYY-MM' labels ending with the month of end"""
+    return [bucket.label for bucket in month_buckets(count, end)]
+
+
+def season_indices(periods):
+    """Map 'YYYY-MM' period labels to indices into SEASONS, using Sale.get_season_for_month"""
+    return np.array(
+        [SEASONS.index(Sale.get_season_for_month(int(period[5:7]))) for period in periods],
+        dtype=np.int64
+    )
+
+
+def last_complete_month(today=None):
+    """Last day of the latest calendar month that has ended (the month before today's)"""
+    today = today or date.today()
+    return today.replace(day=1) - timedelta(days=1)
+
+
+def build_demand_matrix(months=24, end=None, medicine_ids=None):
+    """
+    Build a (medicine x month) matrix of units sold from the daily rollup
+
+    The current month is left out by default: part way through it, its sales
+    would look like a slump to the forecaster.
+
+    Args:
+        months: Number of calendar months of history
+        end: Date in the last month (default: the last complete month)
+        medicine_ids: Restrict the matrix to these medicines (default: all with sales)
+
+    Returns:
+        DemandMatrix of medicine IDs, period labels and an int array of shape (medicines, months)
+    """
+    buckets = month_buckets(months, end or last_complete_month())
+    periods = [bucket.label for bucket in buckets]
+
+    query = db.session.query(
+        SaleDailyRollup.medicine_id,
+        bucket_label(SaleDailyRollup.day, buckets).label('month'),
+        func.sum(SaleDailyRollup.quantity)
+    ).filter(
+        range_filter(SaleDailyRollup.day, buckets)
+    )
+    if medicine_ids is not None:
+        query = query.filter(SaleDailyRollup.medicine_id.in_(medicine_ids))
+    rows = query.group_by(SaleDailyRollup.medicine_id, 'month').all()
+
+    medicine_ids = np.array(sorted({medicine_id for medicine_id, _, _ in rows}), dtype=np.int64)
+    values = np.zeros((len(medicine_ids), months), dtype=np.int64)
+    if rows:
+        period_index = {period: i for i, period in enumerate(periods)}
+        row_ids, row_months, quantities = zip(*rows)
+        values[
+            np.searchsorted(medicine_ids, row_ids),
+            [period_index[m] for m in row_months]
+        ] = quantities
+
+    return DemandMatrix(medicine_ids, periods, values)
+
+
+class SeasonalForecaster:
+    """
+    Additive Holt-Winters smoothing over monthly demand, for many series at once
+
+    Seasonality is one factor per season (see SEASONS) rather than per month,
+    so a year of history is enough to estimate it. The loop runs over periods;
+    each step updates level, trend and season for every series with array maths.
+    """
+
+    def __init__(self, alpha=0.3, beta=0.1, gamma=0.2):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.level = None
+        self.trend = None
+        self.seasonal = None
+        self.periods = None
+
+    def fit(self, values, periods):
+        """
+        Fit level, trend and seasonal factors to a (series x periods) array
+
+        Returns:
+            self
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 2:
+            raise ValueError('values must be a (series x periods) array')
+        series, count = values.shape
+        seasons = season_indices(periods)
+
+        # Start from the first year's mean, the mean change between the first
+        # two years, and each season's offset from the overall mean
+        first_year = values[:, :min(count, 12)]
+        level = first_year.mean(axis=1)
+        if count >= 24:
+            trend = (values[:, 12:24].mean(axis=1) - level) / 12.0
+        else:
+            trend = np.zeros(series)
+
+        overall = values.mean(axis=1, keepdims=True)
+        seasonal = np.zeros((series, len(SEASONS)))
+        for s in range(len(SEASONS)):
+            in_season = seasons == s
+            if in_season.any():
+                seasonal[:, s] = values[:, in_season].mean(axis=1) - overall[:, 0]
+
+        for t in range(count):
+            s = seasons[t]
+            observed = values[:, t]
+            previous_level = level
+            level = self.alpha * (observed - seasonal[:, s]) + (1 - self.alpha) * (level + trend)
+            trend = self.beta * (level - previous_level) + (1 - self.beta) * trend
+            seasonal[:, s] = self.gamma * (observed - level) + (1 - self.gamma) * seasonal[:, s]
+
+        self.level = level
+        self.trend = trend
+        self.seasonal = seasonal
+        self.periods = list(periods)
+        return self
+
+    def forecast(self, horizon=3):
+        """
+        Forecast the next horizon periods for every series
+
+        Returns:
+            (future period labels, float array of shape (series, horizon)), clipped at zero
+        """
+        if self.level is None:
+            raise RuntimeError('fit() must be called before forecast()')
+
+        # Labels for the horizon months following the last fitted period
+        last = self.periods[-1]
+        future = [
+            bucket.label
+            for bucket in following_month_buckets(horizon, date(int(last[:4]), int(last[5:7]), 1))
+        ]
+        steps = np.arange(1, horizon + 1)
+        forecast = (
+            self.level[:, None]
+            + self.trend[:, None] * steps[None, :]
+            + self.seasonal[:, season_indices(future)]
+        )
+        return future, np.clip(forecast, 0, None)
+
+
+class CatalogForecast:
+    """Forecast demand for every medicine with sales, looked up per medicine"""
+
+    def __init__(self, demand, future_periods, forecast):
+        self.demand = demand
+        self.future_periods = future_periods
+        self.forecast = forecast
+        self._rows = {int(medicine_id): i for i, medicine_id in enumerate(demand.medicine_ids)}
+
+    def for_medicine(self, medicine_id):
+        """
+        Get history and forecast for one medicine
+
+        Returns:
+            Dictionary with 'history' and 'forecast' lists of (month_label, units),
+            or None if the medicine has no sales in the history window
+        """
+        row = self._rows.get(medicine_id)
+        if row is None:
+            return None
+        return {
+            'history': list(zip(self.demand.periods, self.demand.values[row].tolist())),
+            'forecast': list(zip(self.future_periods, np.round(self.forecast[row], 2).tolist()))
+        }
+
+
+def forecast_catalog(months_ahead=3, history_months=24, medicine_ids=None, **smoothing):
+    """
+    Forecast monthly units sold for every medicine with one query and one vectorized fit
+
+    Returns:
+        CatalogForecast
+    """
+    demand = build_demand_matrix(months=history_months, medicine_ids=medicine_ids)
+    future, forecast = SeasonalForecaster(**smoothing).fit(demand.values, demand.periods).forecast(months_ahead)
+    return CatalogForecast(demand, future, forecast)
+
+
+def forecast_medicine(medicine_id, months_ahead=3, history_months=24):
+    """Forecast monthly units sold for a single medicine (see CatalogForecast.for_medicine)"""
+    return forecast_catalog(months_ahead, history_months, medicine_ids=[medicine_id]).for_medicine(medicine_id)
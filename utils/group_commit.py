@@ -0,0 +1,183 @@
+"""
+Group commit: merge concurrent sale writes into a single database transaction
+"""
+import queue
+import threading
+import time
+from models import db
+
+
+class GroupCommitError(Exception):
+    """Raised when a group-committed operation could not be completed"""
+
+
+class _Job:
+    """A single operation waiting for its batch to commit"""
+
+    QUEUED = 'queued'
+    CLAIMED = 'claimed'
+    CANCELLED = 'cancelled'
+
+    __slots__ = ('operation', 'result', 'error', 'done', 'state')
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.state = self.QUEUED
+
+
+class GroupCommitter:
+    """
+    Runs write operations submitted by concurrent requests on one worker thread
+
+    Operations arriving within window seconds of the first one in a batch are
+    executed in the same transaction and committed together, so a burst of
+    sales pays for one fsync instead of one each. Every submitter still gets
+    its own result or exception.
+
+    An operation that raises rolls back the batch, which is then replayed
+    without it. This keeps requests isolated without relying on SAVEPOINTs,
+    which pysqlite does not support reliably.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.window = 0.005
+        self.max_batch = 64
+        self.timeout = 10
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+
+    def init_app(self, app):
+        """Configure from the application's SALE_GROUP_COMMIT* settings"""
+        self.app = app
+        self.enabled = app.config.get('SALE_GROUP_COMMIT', False)
+        self.window = app.config.get('SALE_GROUP_COMMIT_WINDOW_MS', 5) / 1000.0
+        self.max_batch = app.config.get('SALE_GROUP_COMMIT_MAX_BATCH', 64)
+        self.timeout = app.config.get('SALE_GROUP_COMMIT_TIMEOUT', 10)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sale-group-commit', daemon=True)
+                self._thread.start()
+
+    def submit(self, operation):
+        """
+        Run operation in the next group transaction and wait for it to commit
+
+        The operation runs on the worker thread inside an application context,
+        so it must not touch request-bound objects and should return plain
+        values rather than ORM instances.
+
+        If the worker has not picked the operation up within the timeout it is
+        cancelled and never runs. Once a batch has claimed it, this waits for
+        the batch to finish, so a timeout never hides a committed operation.
+
+        Returns:
+            The value returned by operation, once its batch has committed
+
+        Raises:
+            GroupCommitError: if the operation was cancelled before it ran
+        """
+        self._ensure_worker()
+
+        job = _Job(operation)
+        self._queue.put(job)
+
+        if not job.done.wait(self.timeout):
+            with self._lock:
+                if job.state == _Job.QUEUED:
+                    job.state = _Job.CANCELLED
+            if job.state == _Job.CANCELLED:
+                raise GroupCommitError('Timed out waiting for the group commit.')
+            job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def stop(self):
+        """Stop the worker thread after it drains queued operations"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            batch = [job]
+            stopping = False
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+
+            self._commit_batch(batch)
+            if stopping:
+                return
+
+    def _commit_batch(self, batch):
+        # Claim the jobs whose submitters are still waiting; the rest timed out
+        with self._lock:
+            pending = [job for job in batch if job.state == _Job.QUEUED]
+            for job in pending:
+                job.state = _Job.CLAIMED
+
+        with self.app.app_context():
+            try:
+                while pending:
+                    failed = None
+                    for job in pending:
+                        try:
+                            job.result = job.operation()
+                        except Exception as e:
+                            failed = job
+                            job.error = e
+                            break
+
+                    if failed is None:
+                        break
+
+                    # Undo the whole batch and replay it without the failed operation
+                    db.session.rollback()
+                    pending.remove(failed)
+
+                if pending:
+                    db.session.commit()
+                    self.batches += 1
+                    self.operations += len(pending)
+
+            except Exception as e:
+                db.session.rollback()
+                for job in pending:
+                    job.result = None
+                    job.error = e
+
+            finally:
+                db.session.remove()
+                for job in batch:
+                    job.done.set()
+
+
+group_committer = GroupCommitter()
@@ -0,0 +1,245 @@
+"""
+Background-computed predictive insights snapshot, persisted as JSON
+"""
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from models import db
+from utils import analytics
+from utils.parallel import analytics_runner
+
+
+def medicine_ref(medicine):
+    """Reduce a medicine to the fields the insights page shows"""
+    return {'medicine_id': medicine.medicine_id, 'name': medicine.name}
+
+
+def _stock_predictions():
+    return [
+        dict(
+            prediction,
+            medicine=medicine_ref(prediction['medicine']),
+            predicted_stockout_date=prediction['predicted_stockout_date'].isoformat()
+        )
+        for prediction in analytics.get_stock_predictions()
+    ]
+
+
+def _reorder_recommendations():
+    return [
+        dict(recommendation, medicine=medicine_ref(recommendation['medicine']))
+        for recommendation in analytics.get_reorder_recommendations()
+    ]
+
+
+# Independent computations behind the predictive insights page, keyed by template variable
+INSIGHTS_TASKS = {
+    'seasonal_data': analytics.get_seasonal_trends,
+    'category_trends': analytics.get_category_trends,
+    'forecast_data': lambda: analytics.generate_forecast_data(months_ahead=3),
+    'stock_predictions': _stock_predictions,
+    'reorder_recommendations': _reorder_recommendations,
+    'top_medicines': lambda: analytics.get_top_medicines_by_revenue(limit=10),
+    'monthly_sales': lambda: analytics.get_monthly_sales_data(months=12)
+}
+
+
+def build_insights_payload():
+    """
+    Run the predictive analytics in parallel and return the page context as JSON-serializable data
+
+    Returns:
+        (dictionary of template variables for the predictive insights page,
+         dictionary of seconds each computation took)
+    """
+    run = analytics_runner.run(INSIGHTS_TASKS)
+    return run.values, run.timings
+
+
+class InsightsSnapshot:
+    """
+    Latest predictive insights payload, recomputed off the request path
+
+    The snapshot is recomputed by a background thread every refresh_interval
+    seconds and after refresh_after_sales new sales, and is written to path
+    so it survives restarts. Requests only ever read the latest snapshot.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.path = None
+        self.refresh_interval = 900
+        self.refresh_after_sales = 50
+        self._lock = threading.Lock()
+        self._payload = None
+        self._computed_at = None
+        self.timings = {}
+        self._sales_since = 0
+        self._refreshing = False
+        self._stop = threading.Event()
+        self._scheduler = None
+
+    def init_app(self, app):
+        """Configure from the application's INSIGHTS_* settings and load the saved snapshot"""
+        self.stop()
+        self.app = app
+        self.refresh_interval = app.config.get('INSIGHTS_REFRESH_INTERVAL', 900)
+        self.refresh_after_sales = app.config.get('INSIGHTS_REFRESH_AFTER_SALES', 50)
+
+        # Relative paths live in the instance folder, like the SQLite database
+        path = app.config.get('INSIGHTS_SNAPSHOT_PATH')
+        self.path = os.path.join(app.instance_path, path) if path else None
+
+        self.clear()
+        self._load()
+
+        # Only a process that serves requests runs the scheduler, not CLI commands
+        if app.config.get('INSIGHTS_SCHEDULER', False):
+            app.before_request(self.start_scheduler)
+
+    def start_scheduler(self):
+        """Start the periodic refresh thread unless it is already running"""
+        with self._lock:
+            if self._scheduler is not None:
+                return
+            self._stop.clear()
+            self._scheduler = threading.Thread(target=self._run, name='insights-scheduler', daemon=True)
+            self._scheduler.start()
+
+    def clear(self):
+        """Forget the in-memory snapshot"""
+        with self._lock:
+            self._payload = None
+            self._computed_at = None
+            self._sales_since = 0
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+            computed_at = datetime.fromisoformat(saved['computed_at'])
+            payload = saved['payload']
+        except (OSError, ValueError, KeyError) as e:
+            self.app.logger.warning('Ignoring unreadable insights snapshot %s: %s', self.path, e)
+            return
+
+        with self._lock:
+            self._payload = payload
+            self._computed_at = computed_at
+
+    def _save(self, payload, computed_at):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # Write to a temporary file of our own and swap it in, so readers never
+        # see a partial snapshot and concurrent writers never share a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'computed_at': computed_at.isoformat(), 'payload': payload}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def compute(self):
+        """Recompute the snapshot now, save it and return (payload, computed_at)"""
+        with self.app.app_context():
+            try:
+                with self._lock:
+                    sales_seen = self._sales_since
+
+                payload, timings = build_insights_payload()
+                self.app.logger.info('Predictive insights computed: %s', ', '.join(
+                    f'{name} {seconds:.3f}s' for name, seconds in timings.items()
+                ))
+
+                # Round-trip through JSON so fresh and reloaded snapshots look the same
+                payload = json.loads(json.dumps(payload))
+                computed_at = datetime.now()
+                self._save(payload, computed_at)
+
+                with self._lock:
+                    self._payload = payload
+                    self._computed_at = computed_at
+                    self.timings = timings
+                    self._sales_since = max(self._sales_since - sales_seen, 0)
+                return payload, computed_at
+            finally:
+                db.session.remove()
+
+    def get(self):
+        """
+        Return the latest (payload, computed_at), computing it first if there is none
+
+        A snapshot older than the refresh interval is still returned, and a
+        background refresh is started for the next request.
+        """
+        with self._lock:
+            payload, computed_at = self._payload, self._computed_at
+
+        if payload is None:
+            return self.compute()
+
+        if self.age_seconds() > self.refresh_interval:
+            self.refresh_async()
+        return payload, computed_at
+
+    def age_seconds(self):
+        """Seconds since the snapshot was computed, or None if there is none"""
+        with self._lock:
+            computed_at = self._computed_at
+        if computed_at is None:
+            return None
+        return (datetime.now() - computed_at).total_seconds()
+
+    def refresh_async(self):
+        """Start a background recompute unless one is already running"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        threading.Thread(target=self._refresh, name='insights-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self.compute()
+        except Exception:
+            self.app.logger.exception('Predictive insights refresh failed')
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def sales_recorded(self, count=1):
+        """Count new sales and refresh early once enough have accumulated"""
+        if not self.refresh_after_sales:
+            return
+        with self._lock:
+            self._sales_since += count
+            due = self._sales_since >= self.refresh_after_sales
+        if due:
+            self.refresh_async()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            age = self.age_seconds()
+            if age is None or age >= self.refresh_interval:
+                self.refresh_async()
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        self._stop.set()
+        with self._lock:
+            scheduler = self._scheduler
+            self._scheduler = None
+        if scheduler is not None and scheduler.is_alive():
+            scheduler.join()
+
+
+insights_snapshot = InsightsSnapshot()
@@ -0,0 +1,144 @@
+"""
+Keyset (cursor) pagination for newest-first listings of sales
+
+Pages are located by the (sale_date, sale_id) of the row at their edge rather
+than an OFFSET, so fetching any page is one range scan of the composite
+(sale_date, sale_id) index however deep it is.
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sale_date, sale_id):
+    """Encode a row's (sale_date, sale_id) as an opaque URL-safe token"""
+    raw = f'{sale_date.isoformat()}|{sale_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a token from encode_cursor
+
+    Raises:
+        ValueError: if the token is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        sale_date, sale_id = raw.split('|')
+        return datetime.fromisoformat(sale_date), int(sale_id)
+    except (ValueError, UnicodeDecodeError, TypeError) as e:
+        raise ValueError(f'Invalid page cursor: {token!r}') from e
+
+
+class KeysetPage:
+    """One page of rows with tokens for the pages either side of it"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _older_than(date_column, id_column, sale_date, sale_id):
+    # Expanded row comparison; the leading range keeps it an index range scan
+    return and_(
+        date_column <= sale_date,
+        or_(date_column < sale_date, id_column < sale_id)
+    )
+
+
+def _newer_than(date_column, id_column, sale_date, sale_id):
+    return and_(
+        date_column >= sale_date,
+        or_(date_column > sale_date, id_column > sale_id)
+    )
+
+
+def keyset_paginate(query, date_column, id_column, per_page, after=None, before=None, total=None):
+    """
+    Fetch one newest-first page of query
+
+    Args:
+        query: Filtered query whose rows expose the date and ID columns by name
+        date_column, id_column: Sale.sale_date and Sale.sale_id (or equivalents)
+        per_page: Rows per page
+        after: Token of the last row of the previous page, to move forward
+        before: Token of the first row of the next page, to move back
+        total: Optional row count to show, computed by the caller (e.g. from counters)
+
+    Returns:
+        KeysetPage
+
+    Raises:
+        ValueError: if a token is malformed
+    """
+    backwards = before is not None and after is None
+    if backwards:
+        query = query.filter(_newer_than(date_column, id_column, *decode_cursor(before)))
+        query = query.order_by(date_column.asc(), id_column.asc())
+    else:
+        if after is not None:
+            query = query.filter(_older_than(date_column, id_column, *decode_cursor(after)))
+        query = query.order_by(date_column.desc(), id_column.desc())
+
+    # One extra row tells whether there is another page in this direction
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor(row):
+        return encode_cursor(getattr(row, date_column.key), getattr(row, id_column.key))
+
+    if not rows:
+        return KeysetPage([], total=total)
+
+    if backwards:
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after is not None, more
+
+    return KeysetPage(
+        rows,
+        next_cursor=cursor(rows[-1]) if has_next else None,
+        prev_cursor=cursor(rows[0]) if has_prev else None,
+        total=total
+    )
+
+
+def keyset_batches(query, date_column, id_column, batch_size):
+    """
+    Yield every row of query newest first, in lists of up to batch_size rows
+
+    Each batch is a separate query that continues after the last row of the
+    previous one, and the session's read transaction is rolled back before
+    the batch is handed over. No cursor stays open while the caller works
+    through the rows, so a long export never holds a read lock (on SQLite,
+    the SHARED lock that stops writers committing) for its whole duration.
+    The query's session should have no pending changes, since they are
+    discarded rather than committed.
+    """
+    last = None
+    while True:
+        batch_query = query
+        if last is not None:
+            batch_query = batch_query.filter(_older_than(date_column, id_column, *last))
+        rows = batch_query.order_by(date_column.desc(), id_column.desc()).limit(batch_size).all()
+        query.session.rollback()
+
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last = getattr(rows[-1], date_column.key), getattr(rows[-1], id_column.key)
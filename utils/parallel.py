@@ -0,0 +1,186 @@
+"""
+Run independent analytics computations concurrently on a thread pool
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from models import db
+
+# State of the analytics task running on each pool thread
+_current = threading.local()
+
+
+class AnalyticsTaskError(Exception):
+    """Raised when one or more analytics tasks failed or timed out"""
+
+    def __init__(self, failures, timings):
+        self.failures = failures
+        self.timings = timings
+        super().__init__('Analytics tasks failed: ' + ', '.join(
+            f'{name} ({error})' for name, error in failures.items()
+        ))
+
+
+class AnalyticsTaskTimeout(Exception):
+    """Raised inside an analytics task that ran past its timeout or was cancelled"""
+
+
+def check_cancelled():
+    """
+    Stop the analytics task running on this thread if it has timed out
+
+    Long-running tasks call this between steps, so a task that overruns
+    gives its pool thread back instead of holding up the tasks queued behind
+    it. Outside an AnalyticsRunner task it does nothing.
+
+    Raises:
+        AnalyticsTaskTimeout: if the current task is past its deadline or cancelled
+    """
+    state = getattr(_current, 'state', None)
+    if state is not None and state.expired():
+        raise AnalyticsTaskTimeout('cancelled after timing out')
+
+
+class _TaskState:
+    """Deadline and cancellation flag of one submitted task"""
+
+    __slots__ = ('timeout', 'deadline', 'cancelled')
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.deadline = None
+        self.cancelled = threading.Event()
+
+    def start(self):
+        self.deadline = time.monotonic() + self.timeout
+
+    def expired(self):
+        return self.cancelled.is_set() or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+
+class AnalyticsRun:
+    """Results and wall-clock seconds of each task in one run, keyed by task name"""
+
+    def __init__(self, values, timings, elapsed):
+        self.values = values
+        self.timings = timings
+        self.elapsed = elapsed
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+
+class AnalyticsRunner:
+    """
+    Runs named, independent analytics tasks in parallel
+
+    Each task runs on a pool thread inside its own application context, so it
+    gets its own database session, which is removed when the task finishes.
+    Tasks must only read: nothing is committed. A run takes as long as its
+    slowest task rather than the sum of all of them.
+
+    Each task's timeout counts from when it starts running, so tasks queued
+    behind a slow one still get their full time. A task that times out is
+    cancelled: it stops at its next check_cancelled() call, or never starts
+    if it is still queued.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = 4
+        self.timeout = 60
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure from the application's ANALYTICS_* settings"""
+        self.shutdown()
+        self.app = app
+        self.workers = app.config.get('ANALYTICS_WORKERS', 4)
+        self.timeout = app.config.get('ANALYTICS_TASK_TIMEOUT', 60)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analytics')
+            return self._executor
+
+    def _call(self, task, state):
+        if state.cancelled.is_set():
+            raise AnalyticsTaskTimeout('cancelled before it started')
+
+        with self.app.app_context():
+            state.start()
+            _current.state = state
+            started = time.perf_counter()
+            try:
+                return task(), time.perf_counter() - started
+            finally:
+                _current.state = None
+                db.session.remove()
+
+    def run(self, tasks, timeout=None):
+        """
+        Run every task concurrently and wait for all of them
+
+        Args:
+            tasks: Dictionary of task name to a callable taking no arguments
+            timeout: Seconds each task may run (default: ANALYTICS_TASK_TIMEOUT)
+
+        Returns:
+            AnalyticsRun with each task's return value and timing
+
+        Raises:
+            AnalyticsTaskError: if any task raised or did not finish in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        pool = self._pool()
+        states = {name: _TaskState(timeout) for name in tasks}
+        pending = {name: pool.submit(self._call, task, states[name]) for name, task in tasks.items()}
+
+        # Tasks still queued once every task could have used its full timeout
+        # one after another are given up on, in case a task never checks in
+        give_up = time.monotonic() + timeout * len(tasks)
+
+        values = {}
+        timings = {}
+        failures = {}
+        while pending:
+            now = time.monotonic()
+            deadlines = [states[name].deadline for name in pending if states[name].deadline is not None]
+            wait(pending.values(), timeout=max(min(deadlines + [now + timeout, give_up]) - now, 0),
+                 return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for name, future in list(pending.items()):
+                state = states[name]
+                if future.done():
+                    try:
+                        values[name], timings[name] = future.result()
+                    except AnalyticsTaskTimeout:
+                        failures[name] = f'timed out after {timeout}s'
+                    except Exception as e:
+                        failures[name] = repr(e)
+                elif (state.deadline is not None and now >= state.deadline) or now >= give_up:
+                    state.cancelled.set()
+                    future.cancel()
+                    failures[name] = f'timed out after {timeout}s'
+                else:
+                    continue
+                del pending[name]
+
+        if failures:
+            raise AnalyticsTaskError(failures, timings)
+        return AnalyticsRun(values, timings, time.perf_counter() - started)
+
+    def shutdown(self):
+        """Stop the pool threads once their current tasks finish"""
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+analytics_runner = AnalyticsRunner()
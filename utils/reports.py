@@ -0,0 +1,228 @@
+"""
+Normalized sales report filters shared by the reports page, its cache and the export
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import db
+from models.medicine import Medicine
+from models.sale import Sale
+from models.user import User
+from utils.cache import filter_options_cache
+
+
+class ReportFilters(namedtuple('ReportFilters', ['start_date', 'end_date', 'category', 'medicine_id', 'user_id'])):
+    """
+    Canonical report filters: dates as date objects (end inclusive), IDs as ints,
+    and None for anything not filtered on
+
+    Equal filter sets compare and hash equal however they were spelled in the
+    query string, so the tuple itself is the cache key.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Parse report filters from request arguments
+
+        Returns:
+            (ReportFilters, list of messages about values that were ignored)
+        """
+        errors = []
+
+        def parse_date(name, label):
+            value = args.get(name, '').strip()
+            if not value:
+                return None
+            try:
+                return datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                errors.append(f'Invalid {label} date format')
+                return None
+
+        def parse_id(name):
+            try:
+                return int(args.get(name, ''))
+            except ValueError:
+                return None
+
+        filters = cls(
+            start_date=parse_date('start_date', 'start'),
+            end_date=parse_date('end_date', 'end'),
+            category=args.get('category', '').strip() or None,
+            medicine_id=parse_id('medicine_id'),
+            user_id=parse_id('user_id')
+        )
+        return filters, errors
+
+    @property
+    def start(self):
+        """Inclusive lower bound on sale_date, or None"""
+        if self.start_date is None:
+            return None
+        return datetime.combine(self.start_date, datetime.min.time())
+
+    @property
+    def end(self):
+        """Exclusive upper bound on sale_date (the day after end_date), or None"""
+        if self.end_date is None:
+            return None
+        return datetime.combine(self.end_date + timedelta(days=1), datetime.min.time())
+
+    def apply(self, query):
+        """Filter a query over Sale joined with Medicine using half-open date ranges"""
+        if self.start is not None:
+            query = query.filter(Sale.sale_date >= self.start)
+        if self.end is not None:
+            query = query.filter(Sale.sale_date < self.end)
+        if self.category is not None:
+            query = query.filter(Medicine.category == self.category)
+        if self.medicine_id is not None:
+            query = query.filter(Sale.medicine_id == self.medicine_id)
+        if self.user_id is not None:
+            query = query.filter(Sale.user_id == self.user_id)
+        return query
+
+    def may_include(self, sale):
+        """
+        Check whether a sale could appear in this report
+
+        Category is not checked, so a sale of another category may match;
+        callers use this to invalidate, where a false positive only costs a
+        recompute.
+        """
+        if self.start is not None and sale.sale_date < self.start:
+            return False
+        if self.end is not None and sale.sale_date >= self.end:
+            return False
+        if self.medicine_id is not None and sale.medicine_id != self.medicine_id:
+            return False
+        if self.user_id is not None and sale.user_id != self.user_id:
+            return False
+        return True
+
+    def may_include_medicine(self, medicine_id):
+        """Check whether sales of a medicine could appear in this report, whatever its category"""
+        return self.medicine_id is None or self.medicine_id == medicine_id
+
+    def as_args(self):
+        """Query string arguments for links and the filter form (empty strings when unset)"""
+        return {
+            'start_date': self.start_date.isoformat() if self.start_date else '',
+            'end_date': self.end_date.isoformat() if self.end_date else '',
+            'category': self.category or '',
+            'medicine_id': str(self.medicine_id) if self.medicine_id is not None else '',
+            'user_id': str(self.user_id) if self.user_id is not None else ''
+        }
+
+
+def report_query(filters, *columns):
+    """Query Sale joined with Medicine and User, restricted to the report filters"""
+    return filters.apply(db.session.query(*columns).join(Medicine).join(User))
+
+
+def report_summary(filters):
+    """Summary statistics over every sale matching the report filters"""
+    result = report_query(
+        filters,
+        func.count(Sale.sale_id).label('total_transactions'),
+        func.sum(Sale.quantity_sold).label('total_quantity'),
+        func.sum(Sale.total_price).label('total_revenue'),
+        func.avg(Sale.total_price).label('avg_transaction_value')
+    ).first()
+    return {
+        'total_transactions': result.total_transactions or 0,
+        'total_quantity': result.total_quantity or 0,
+        'total_revenue': float(result.total_revenue or 0),
+        'avg_transaction_value': float(result.avg_transaction_value or 0)
+    }
+
+
+SaleStamp = namedtuple('SaleStamp', ['sale_date', 'medicine_id', 'user_id', 'quantity_sold'])
+
+
+def sale_stamp(sale):
+    """Reduce a sale to the fields cache invalidation looks at"""
+    return SaleStamp(sale.sale_date, sale.medicine_id, sale.user_id, sale.quantity_sold)
+
+
+def _medicine_options():
+    rows = db.session.query(Medicine.medicine_id, Medicine.name).order_by(Medicine.name).all()
+    return [{'value': str(medicine_id), 'label': name} for medicine_id, name in rows]
+
+
+def _user_options():
+    rows = db.session.query(User.user_id, User.username).order_by(User.username).all()
+    return [{'value': str(user_id), 'label': username} for user_id, username in rows]
+
+
+def _category_options():
+    rows = db.session.query(Medicine.category).distinct().order_by(Medicine.category).all()
+    return [{'value': category, 'label': category} for category, in rows]
+
+
+# Report filter dropdowns: option loader and the cache tags that invalidate it
+FILTER_OPTION_SOURCES = {
+    'medicines': (_medicine_options, ('catalog',)),
+    'users': (_user_options, ('users',)),
+    'categories': (_category_options, ('catalog',))
+}
+
+
+def filter_options(kind):
+    """
+    Get every option of one report filter dropdown from the cache
+
+    Returns:
+        (list of {'value', 'label'} dicts sorted by label, dict of label by value)
+
+    Raises:
+        KeyError: if kind is not a filter in FILTER_OPTION_SOURCES
+    """
+    load, tags = FILTER_OPTION_SOURCES[kind]
+
+    def compute():
+        options = load()
+        return options, {option['value']: option['label'] for option in options}
+
+    return filter_options_cache.get(f'filter_options:{kind}', compute, tags).value
+
+
+def search_filter_options(kind, query='', limit=50):
+    """
+    Find options whose label contains query (case-insensitive), in label order
+
+    Returns:
+        (up to limit matching options, whether more matched)
+    """
+    options, _ = filter_options(kind)
+    query = query.strip().lower()
+    if query:
+        options = [option for option in options if query in option['label'].lower()]
+    return options[:limit], len(options) > limit
+
+
+# Selected-option labels: the ID and label columns of filters whose values are primary keys
+FILTER_OPTION_LABELS = {
+    'medicines': (Medicine.medicine_id, Medicine.name),
+    'users': (User.user_id, User.username)
+}
+
+
+def filter_option_label(kind, value):
+    """
+    Label of the selected option of a filter, or None if nothing or an unknown value is selected
+
+    Looks up the one selected row by primary key instead of loading the
+    whole option list.
+    """
+    if not value:
+        return None
+    id_column, label_column = FILTER_OPTION_LABELS[kind]
+    try:
+        key = int(value)
+    except ValueError:
+        return None
+    return db.session.query(label_column).filter(id_column == key).scalar()
@@ -0,0 +1,108 @@
+"""
+Rolling-window statistics over arrays of series
+
+Every function takes a 1-D series or a 2-D (series x periods) array and works
+along the last axis in a single pass, so the cost is O(n) whatever the window
+size. Positions without a full window are NaN.
+"""
+import numpy as np
+
+
+def _as_array(values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim not in (1, 2):
+        raise ValueError('values must be a 1-D series or a (series x periods) array')
+    return values
+
+
+def _check_window(window):
+    if window < 1:
+        raise ValueError('window must be at least 1')
+    return window
+
+
+def _window_sums(values, window):
+    """Sums of each full window from one cumulative sum; position i covers [i - window + 1, i]"""
+    cumulative = np.cumsum(values, axis=-1)
+    sums = np.full(values.shape, np.nan)
+    if window <= values.shape[-1]:
+        sums[..., window - 1] = cumulative[..., window - 1]
+        sums[..., window:] = cumulative[..., window:] - cumulative[..., :-window]
+    return sums
+
+
+def rolling_sum(values, window):
+    """Sum over each trailing window"""
+    values = _as_array(values)
+    if values.shape[-1] == 0:
+        return values.copy()
+    return _window_sums(values, _check_window(window))
+
+
+def rolling_mean(values, window):
+    """Simple moving average over each trailing window"""
+    values = _as_array(values)
+    if values.shape[-1] == 0:
+        return values.copy()
+    window = _check_window(window)
+    return _window_sums(values, window) / window
+
+
+def rolling_std(values, window, ddof=0):
+    """Standard deviation over each trailing window, from running sums of values and squares"""
+    values = _as_array(values)
+    if values.shape[-1] == 0:
+        return values.copy()
+    window = _check_window(window)
+    if window - ddof <= 0:
+        raise ValueError('window must be larger than ddof')
+
+    sums = _window_sums(values, window)
+    squares = _window_sums(values * values, window)
+    variance = (squares - sums * sums / window) / (window - ddof)
+
+    # Cancellation can leave tiny negative variances for constant windows
+    return np.sqrt(np.clip(variance, 0, None))
+
+
+def ewma(values, alpha):
+    """
+    Exponentially weighted moving average, seeded with the first value
+
+    Each step is one array operation across every series.
+    """
+    values = _as_array(values)
+    if not 0 < alpha <= 1:
+        raise ValueError('alpha must be in (0, 1]')
+
+    averages = np.empty_like(values)
+    if values.shape[-1] == 0:
+        return averages
+    averages[..., 0] = values[..., 0]
+    for t in range(1, values.shape[-1]):
+        averages[..., t] = alpha * values[..., t] + (1 - alpha) * averages[..., t - 1]
+    return averages
+
+
+def moving_average_forecast(values, window, steps):
+    """
+    Forecast steps periods ahead by repeatedly appending the mean of the last window values
+
+    Each forecast joins the window for the next one. A running window sum
+    makes each step one array operation across every series.
+
+    Returns:
+        Array with the last axis replaced by the steps forecasts
+    """
+    values = _as_array(values)
+    window = _check_window(window)
+    if window > values.shape[-1]:
+        raise ValueError('window must not be longer than the series')
+
+    extended = np.empty(values.shape[:-1] + (window + steps,))
+    extended[..., :window] = values[..., -window:]
+    total = extended[..., :window].sum(axis=-1)
+    for t in range(steps):
+        extended[..., window + t] = total / window
+        total = total + extended[..., window + t] - extended[..., t]
+    return extended[..., window:]
@@ -0,0 +1,323 @@
+"""
+Streaming sales report export in report CSV, raw gzip CSV and columnar formats
+"""
+import csv
+import gzip
+import io
+import tempfile
+import zipfile
+import zlib
+from collections import namedtuple
+from decimal import Decimal
+import numpy as np
+from models.medicine import Medicine
+from models.sale import Sale
+from models.user import User
+from utils.pagination import keyset_batches
+from utils.reports import report_query
+
+CSV_HEADER = [
+    'Sale ID',
+    'Date',
+    'Time',
+    'Medicine Name',
+    'Category',
+    'Manufacturer',
+    'Quantity Sold',
+    'Unit Price',
+    'Total Price',
+    'Seller',
+    'Season'
+]
+
+
+# Machine-readable columns: ISO timestamps and plain numbers, no summary rows
+DATA_COLUMNS = [
+    'sale_id',
+    'sale_date',
+    'medicine_name',
+    'category',
+    'manufacturer',
+    'quantity_sold',
+    'unit_price',
+    'total_price',
+    'seller',
+    'season'
+]
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet is optional; columnar exports fall back to .npz
+    pyarrow = None
+
+ExportFormat = namedtuple('ExportFormat', ['name', 'extension', 'mimetype'])
+
+EXPORT_FORMATS = {
+    'csv': ExportFormat('csv', 'csv', 'text/csv'),
+    'csv.gz': ExportFormat('csv.gz', 'csv.gz', 'application/gzip'),
+    'parquet': ExportFormat('parquet', 'parquet', 'application/vnd.apache.parquet'),
+    'npz': ExportFormat('npz', 'npz', 'application/octet-stream')
+}
+
+
+def resolve_format(name):
+    """
+    Map a requested format name to an ExportFormat
+
+    'columnar' (and 'parquet' when pyarrow is not installed) resolve to the
+    best available columnar format.
+
+    Raises:
+        ValueError: if the format is unknown
+    """
+    name = (name or 'csv').lower()
+    if name == 'columnar' or (name == 'parquet' and pyarrow is None):
+        name = 'parquet' if pyarrow is not None else 'npz'
+    if name not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {name}')
+    return EXPORT_FORMATS[name]
+
+
+class ExportSummary:
+    """Running totals over exported sale rows, so the summary needs no second pass"""
+
+    def __init__(self):
+        self.transactions = 0
+        self.quantity = 0
+        self.revenue = Decimal('0')
+
+    def add(self, sale):
+        self.transactions += 1
+        self.quantity += sale.quantity_sold
+        self.revenue += Decimal(sale.total_price)
+
+    def rows(self):
+        """Summary rows written after the data"""
+        rows = [
+            [],
+            ['SUMMARY'],
+            ['Total Transactions', self.transactions],
+            ['Total Quantity Sold', self.quantity],
+            ['Total Revenue', f'₹{float(self.revenue):.2f}']
+        ]
+        if self.transactions > 0:
+            rows.append(['Average Transaction Value', f'₹{float(self.revenue) / self.transactions:.2f}'])
+        return rows
+
+
+def export_query(filters):
+    """Rows of the sales report export for the given filters, unordered (they are read in keyset batches)"""
+    return report_query(
+        filters,
+        Sale.sale_id,
+        Sale.sale_date,
+        Medicine.name.label('medicine_name'),
+        Medicine.category,
+        Medicine.manufacturer,
+        Sale.quantity_sold,
+        Medicine.price.label('unit_price'),
+        Sale.total_price,
+        User.username.label('seller_name')
+    )
+
+
+def csv_row(sale):
+    """Format one export query row, taking the season from its sale date"""
+    return [
+        sale.sale_id,
+        sale.sale_date.strftime('%Y-%m-%d'),
+        sale.sale_date.strftime('%H:%M:%S'),
+        sale.medicine_name,
+        sale.category,
+        sale.manufacturer,
+        sale.quantity_sold,
+        f'₹{float(sale.unit_price):.2f}',
+        f'₹{float(sale.total_price):.2f}',
+        sale.seller_name,
+        Sale.get_season_for_month(sale.sale_date.month)
+    ]
+
+
+def stream_csv(query, batch_size=1000, progress=None):
+    """
+    Yield the sales report as CSV text chunks
+
+    The header is yielded straight away, then one chunk per batch of up to
+    batch_size rows (see _batches), so memory use does not grow with the
+    export. The summary is built from running totals and yielded last.
+    progress, if given, is called with the number of rows written after each
+    chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(CSV_HEADER)
+    yield take()
+
+    summary = ExportSummary()
+    for batch in _batches(query, batch_size, progress):
+        for sale in batch:
+            writer.writerow(csv_row(sale))
+            summary.add(sale)
+        yield take()
+
+    writer.writerows(summary.rows())
+    yield take()
+
+
+def data_row(sale):
+    """Format one export query row with raw values for the machine-readable formats"""
+    return [
+        sale.sale_id,
+        sale.sale_date.isoformat(sep=' ', timespec='seconds'),
+        sale.medicine_name,
+        sale.category,
+        sale.manufacturer,
+        sale.quantity_sold,
+        sale.unit_price,
+        sale.total_price,
+        sale.seller_name,
+        Sale.get_season_for_month(sale.sale_date.month)
+    ]
+
+
+def _batches(query, batch_size, progress):
+    """
+    Yield the export rows newest first in lists of up to batch_size, reporting progress after each
+
+    Rows are read in keyset batches on (sale_date, sale_id), each in its own
+    short transaction, so tills can keep committing sales while a download
+    or export job is still writing.
+    """
+    written = 0
+    for batch in keyset_batches(query, Sale.sale_date, Sale.sale_id, batch_size):
+        yield batch
+        written += len(batch)
+        if progress is not None:
+            progress(written)
+    if progress is not None:
+        progress(written)
+
+
+def stream_csv_gz(query, batch_size=1000, progress=None):
+    """
+    Yield the raw data CSV as gzip-compressed byte chunks
+
+    One compressed chunk is produced per batch; each is flushed so a client
+    can decompress the download as it arrives.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    writer.writerow(DATA_COLUMNS)
+    yield take()
+
+    for batch in _batches(query, batch_size, progress):
+        writer.writerows(data_row(sale) for sale in batch)
+        yield take()
+
+    yield compressor.flush()
+
+
+def _column_arrays(batch):
+    """Turn a batch of rows into one typed NumPy array per data column"""
+    return {
+        'sale_id': np.array([sale.sale_id for sale in batch], dtype=np.int64),
+        'sale_date': np.array([sale.sale_date for sale in batch], dtype='datetime64[us]'),
+        'medicine_name': np.array([sale.medicine_name for sale in batch], dtype=str),
+        'category': np.array([sale.category for sale in batch], dtype=str),
+        'manufacturer': np.array([sale.manufacturer for sale in batch], dtype=str),
+        'quantity_sold': np.array([sale.quantity_sold for sale in batch], dtype=np.int64),
+        'unit_price': np.array([sale.unit_price for sale in batch], dtype=np.float64),
+        'total_price': np.array([sale.total_price for sale in batch], dtype=np.float64),
+        'seller': np.array([sale.seller_name for sale in batch], dtype=str),
+        'season': np.array([Sale.get_season_for_month(sale.sale_date.month) for sale in batch], dtype=str)
+    }
+
+
+def _write_npz(query, fileobj, batch_size, progress):
+    """
+    Write the raw data columns as a compressed .npz, holding one batch in memory at a time
+
+    A .npy member needs its row count and string width in its header, so
+    each batch's column arrays are first spooled to one temporary file per
+    column. Each column is then streamed into the archive a batch at a time,
+    cast to the column's final dtype.
+    """
+    spools = {column: tempfile.TemporaryFile() for column in DATA_COLUMNS}
+    try:
+        dtypes = {column: values.dtype for column, values in _column_arrays([]).items()}
+        rows = 0
+        chunks = 0
+        for batch in _batches(query, batch_size, progress):
+            for column, values in _column_arrays(batch).items():
+                np.lib.format.write_array(spools[column], values)
+                dtypes[column] = np.result_type(dtypes[column], values.dtype)
+            rows += len(batch)
+            chunks += 1
+
+        with zipfile.ZipFile(fileobj, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for column, spool in spools.items():
+                spool.seek(0)
+                with archive.open(f'{column}.npy', mode='w', force_zip64=True) as member:
+                    np.lib.format.write_array_header_1_0(member, {
+                        'descr': np.lib.format.dtype_to_descr(dtypes[column]),
+                        'fortran_order': False,
+                        'shape': (rows,)
+                    })
+                    for _ in range(chunks):
+                        member.write(np.lib.format.read_array(spool).astype(dtypes[column]).tobytes())
+    finally:
+        for spool in spools.values():
+            spool.close()
+
+
+def write_columnar(query, fileobj, export_format, batch_size=1000, progress=None):
+    """
+    Write the raw data columns to a binary file object as Parquet or .npz
+
+    Parquet is written one row group per batch. The .npz archive holds one
+    array per column and is built from temporary files (see _write_npz), so
+    neither format keeps more than a batch of rows in memory.
+    """
+    if export_format.name == 'parquet':
+        writer = None
+        for batch in _batches(query, batch_size, progress):
+            table = pyarrow.table(_column_arrays(batch))
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(fileobj, table.schema, compression='snappy')
+            writer.write_table(table)
+        if writer is None:
+            empty = _column_arrays([])
+            writer = pyarrow.parquet.ParquetWriter(fileobj, pyarrow.table(empty).schema)
+        writer.close()
+        return
+
+    _write_npz(query, fileobj, batch_size, progress)
+
+
+def write_export(query, fileobj, export_format, batch_size=1000, progress=None):
+    """Write an export in export_format to a binary file object; report CSV is gzip-compressed"""
+    if export_format.name == 'csv':
+        with gzip.GzipFile(fileobj=fileobj, mode='wb') as f:
+            for chunk in stream_csv(query, batch_size, progress=progress):
+                f.write(chunk.encode('utf-8'))
+    elif export_format.name == 'csv.gz':
+        for chunk in stream_csv_gz(query, batch_size, progress=progress):
+            fileobj.write(chunk)
+    else:
+        write_columnar(query, fileobj, export_format, batch_size, progress=progress)
@@ -0,0 +1,95 @@
+"""
+Dialect-portable calendar time buckets for analytics queries
+
+Buckets are computed in Python as half-open [start, end) ranges, so queries
+filter with plain range predicates on an indexed date or datetime column and
+group with a CASE over those ranges instead of per-row date functions.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, case, Date
+
+Bucket = namedtuple('Bucket', ['label', 'start', 'end'])
+
+
+def _as_date(value):
+    if value is None:
+        return date.today()
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _month_start(index):
+    """First day of the month with the given absolute index (year * 12 + month - 1)"""
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_buckets(count, end=None):
+    """
+    Calendar months, oldest first, ending with the month containing end
+
+    Labels are 'YYYY-MM'.
+    """
+    end = _as_date(end)
+    last = end.year * 12 + end.month - 1
+    buckets = []
+    for index in range(last - count + 1, last + 1):
+        start = _month_start(index)
+        buckets.append(Bucket(start.strftime('%Y-%m'), start, _month_start(index + 1)))
+    return buckets
+
+
+def following_month_buckets(count, after):
+    """Calendar months, oldest first, starting with the month after the one containing after"""
+    after = _as_date(after)
+    index = after.year * 12 + after.month - 1 + count
+    return month_buckets(count, end=_month_start(index))
+
+
+def week_buckets(count, end=None):
+    """
+    ISO weeks (Monday to Sunday), oldest first, ending with the week containing end
+
+    Labels are 'YYYY-Www' using the ISO year.
+    """
+    end = _as_date(end)
+    last_monday = datetime.combine(end - timedelta(days=end.weekday()), datetime.min.time())
+    buckets = []
+    for weeks_back in range(count - 1, -1, -1):
+        start = last_monday - timedelta(weeks=weeks_back)
+        iso_year, iso_week, _ = start.isocalendar()
+        buckets.append(Bucket(f'{iso_year}-W{iso_week:02d}', start, start + timedelta(weeks=1)))
+    return buckets
+
+
+def day_buckets(count, end=None):
+    """Calendar days, oldest first, ending with end. Labels are 'YYYY-MM-DD'."""
+    end = datetime.combine(_as_date(end), datetime.min.time())
+    buckets = []
+    for days_back in range(count - 1, -1, -1):
+        start = end - timedelta(days=days_back)
+        buckets.append(Bucket(start.strftime('%Y-%m-%d'), start, start + timedelta(days=1)))
+    return buckets
+
+
+def _bound(column, value):
+    """Compare Date columns with dates and DateTime columns with datetimes"""
+    return value.date() if isinstance(column.type, Date) else value
+
+
+def range_filter(column, buckets):
+    """Half-open range predicate covering every bucket"""
+    return and_(
+        column >= _bound(column, buckets[0].start),
+        column < _bound(column, buckets[-1].end)
+    )
+
+
+def bucket_label(column, buckets):
+    """
+    CASE expression giving the label of the bucket each row falls in
+
+    Buckets are contiguous and ordered, so each branch only tests the upper
+    bound. Use together with range_filter() so rows before the first bucket
+    are excluded.
+    """
+    return case(*[(column < _bound(column, b.end), b.label) for b in buckets])
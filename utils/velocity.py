@@ -0,0 +1,73 @@
+"""
+Vectorized sales-velocity engine for stock predictions and reorder recommendations
+"""
+from datetime import datetime, timedelta
+import numpy as np
+from models import db
+from models.sale import Sale
+from models.medicine import Medicine
+from sqlalchemy import func
+
+
+class SalesVelocity:
+    """
+    Recent sales velocity for every medicine in the catalog, as parallel arrays
+
+    Index i of each array describes medicines[i]. All derived figures are
+    computed with array operations over the whole catalog at once.
+    """
+
+    def __init__(self, medicines, quantities, window_days=30):
+        self.medicines = medicines
+        self.window_days = window_days
+        self.stock = np.array([m.stock for m in medicines], dtype=np.int64)
+        self.reorder_level = np.array([m.reorder_level for m in medicines], dtype=np.int64)
+        self.quantity = np.asarray(quantities, dtype=np.int64)
+        self.daily_avg = self.quantity / float(window_days)
+
+    def __len__(self):
+        return len(self.medicines)
+
+    def days_until_stockout(self):
+        """Days of stock left at the current velocity (infinite for medicines that are not selling)"""
+        days = np.full(len(self), np.inf)
+        np.divide(self.stock, self.daily_avg, out=days, where=self.daily_avg > 0)
+        return days
+
+    def safety_stock(self, days=30):
+        """Units needed to cover the given number of days at the current velocity"""
+        return self.daily_avg * days
+
+    def recommended_order(self, safety_days=30, buffer_days=15):
+        """Units to order to refill safety stock plus a buffer"""
+        return (self.safety_stock(safety_days) - self.stock + self.daily_avg * buffer_days).astype(np.int64)
+
+
+def load_sales_velocity(window_days=30):
+    """
+    Load per-medicine sales quantities for the last window_days with one grouped query
+
+    Returns:
+        SalesVelocity covering every medicine, including those with no recent sales
+    """
+    since = datetime.now() - timedelta(days=window_days)
+
+    recent = db.session.query(
+        Sale.medicine_id,
+        func.sum(Sale.quantity_sold).label('quantity')
+    ).filter(
+        Sale.sale_date >= since
+    ).group_by(Sale.medicine_id).subquery()
+
+    rows = db.session.query(
+        Medicine,
+        func.coalesce(recent.c.quantity, 0)
+    ).outerjoin(
+        recent, recent.c.medicine_id == Medicine.medicine_id
+    ).order_by(Medicine.medicine_id).all()
+
+    return SalesVelocity(
+        [medicine for medicine, _ in rows],
+        [quantity for _, quantity in rows],
+        window_days=window_days
+    )